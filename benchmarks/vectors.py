@@ -0,0 +1,101 @@
+"""A micro-benchmark of the vector operations done in a frame of the canvas, comparing
+Vec2 to the list-based Vector class that it replaced.
+
+Run it from the root of the repository: python -m benchmarks.vectors"""
+
+from __future__ import annotations
+from typing import *
+
+import random
+
+from math import sqrt
+from timeit import repeat
+
+from grafatko.utilities import Vec2
+
+
+class ListVector:
+    """The previous vector class (its components stored in a list), for comparison."""
+
+    def __init__(self, *args):
+        self.values = list(args)
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __neg__(self):
+        return ListVector(*iter(-component for component in self))
+
+    def __add__(self, other: ListVector):
+        return ListVector(*iter(u + v for u, v in zip(self, other)))
+
+    __iadd__ = __add__
+
+    def __sub__(self, other: ListVector):
+        return self + (-other)
+
+    __isub__ = __sub__
+
+    def __mul__(self, other):
+        if type(other) in (int, float, complex):
+            return ListVector(*iter(component * other for component in self))
+        else:
+            return sum(u * v for u, v in zip(self, other))
+
+    __rmul__ = __imul__ = __mul__
+
+    def __truediv__(self, other):
+        return ListVector(*iter(component / other for component in self))
+
+    def magnitude(self):
+        return sqrt(sum(component ** 2 for component in self))
+
+    def unit(self):
+        return self / self.magnitude()
+
+    def distance(self, other: ListVector):
+        return (other - self).magnitude()
+
+
+def frame(vector: type, positions: list, edges: list, mouse) -> int:
+    """The vector operations of a frame: the tips of the vertices (where the arrowheads
+    start), the forces of the vertices on their nodes and the nodes under the mouse."""
+    radius, length = 1, 6
+
+    forces = [vector(0, 0) for _ in positions]
+    for i, j in edges:
+        p1, p2 = positions[i], positions[j]
+
+        direction = (p2 - p1).unit()
+        tip = p2 - direction * radius
+        start = p1 + direction * radius
+
+        force = direction * ((p1.distance(p2) - length) / 3)
+        forces[i] += force
+        forces[j] -= force
+
+        tip - start
+
+    return sum(1 for p in positions if p.distance(mouse) < radius)
+
+
+def main(nodes: int = 1000, vertices: int = 2000, repetitions: int = 20):
+    rng = random.Random(0)
+    coordinates = [(rng.random() * 100, rng.random() * 100) for _ in range(nodes)]
+    edges = [tuple(rng.sample(range(nodes), 2)) for _ in range(vertices)]
+
+    print(f"a frame of {nodes} nodes and {vertices} vertices:")
+
+    for vector in (ListVector, Vec2):
+        positions = [vector(x, y) for x, y in coordinates]
+        mouse = vector(50, 50)
+
+        times = repeat(
+            lambda: frame(vector, positions, edges, mouse), number=1, repeat=repetitions
+        )
+
+        print(f"{vector.__name__:>10}: {min(times) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
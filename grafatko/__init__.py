@@ -4,8 +4,6 @@ import webbrowser
 import argparse
 from importlib.machinery import SourceFileLoader
 from functools import partial
-from random import random
-from math import pi
 
 from PyQt5.QtWidgets import *
 from PyQt5.QtGui import *
@@ -14,6 +12,9 @@ from qtmodern import styles
 
 from grafatko.controls import *
 from grafatko.graph import *
+from grafatko.forces import *
+from grafatko.layout import *
+from grafatko.snapshot import *
 
 
 class Canvas(QWidget):
@@ -25,16 +26,14 @@ class Canvas(QWidget):
     # whether the forces are enabled/disabled
     forces: bool = True
 
-    # _ because the lambda gets self as the first argument
-    repulsion = lambda _, distance: (1 / distance) ** 2
-    attraction = lambda _, distance: -(distance - 6) / 3
-    tree = lambda _, v: v * 0.3
-    gravity = lambda _: Vector(0, 0.1)
-
     # the radius around which to check if the node moved when shift-selecting nodes
     mouse_toggle_radius = 0.1
 
-    def __init__(self, line_edit, parent, update_ui_callback):
+    # file dialog filters of the formats that the graph can be exported to
+    text_filter = "Text edge list (*)"
+    snapshot_filter = "Binary snapshot (*.grafatko)"
+
+    def __init__(self, line_edit, parent, update_ui_callback, engine=None):
         super().__init__(parent)
         # GRAPH
         self.graph = DrawableGraph(
@@ -44,6 +43,13 @@ class Canvas(QWidget):
         # CANVAS STUFF
         self.transformation = Transformation(self)
 
+        # the simulation of the forces acting on the nodes (runs in a worker thread)
+        self.simulation = Simulation(BarnesHutEngine() if engine is None else engine)
+        self.simulation.start()
+
+        # whether to center on the graph once the simulation calculates its layout
+        self.center_on_layout = False
+
         # MOUSE
         self.mouse = Mouse(self.transformation)
         self.setMouseTracking(True)
@@ -60,65 +66,10 @@ class Canvas(QWidget):
 
     def update(self, *args):
         """A function that gets periodically called to update the canvas."""
-        # if the graph is rooted and we want to do forces
-        root = self.graph.get_root()
-        if root is not None and self.forces:
-            distances = self.graph.get_distance_from_root()
-
-            # calculate the forces within each BFS layer from root
-            for layer in distances:
-                if len(distances[layer]) < 1:
-                    continue
-
-                pivot = Vector.average([n.get_position() for n in distances[layer]])
-
-                for node in distances[layer]:
-                    vector = Vector(0, pivot[1] - node.get_position()[1])
-                    node.add_force(self.tree(vector))
-
-            # add gravity
-            for node in self.graph.get_nodes():
-                if node is not root and self.graph.weakly_connected(node, root):
-                    node.add_force(self.gravity())
-
-        # only move the nodes when forces are enabled
+        # send the changes of the graph to the simulation (the nodes are moved to its
+        # latest positions when the canvas is painted)
         if self.forces:
-            for i, n1 in enumerate(self.graph.get_nodes()):
-                for n2 in self.graph.get_nodes()[i + 1 :]:
-                    # only apply force, if n1 and n2 are weakly connected
-                    if not self.graph.weakly_connected(n1, n2):
-                        continue
-
-                    d = n1.get_position().distance(n2.get_position())
-
-                    # if they are on top of each other, nudge one of them slightly
-                    if d == 0:
-                        n1.add_force(Vector(random(), random()))
-                        continue
-
-                    # unit vector from n1 to n2
-                    uv = (n2.get_position() - n1.get_position()).unit()
-
-                    # the size of the repel force between the two nodes
-                    fr = self.repulsion(d)
-
-                    # add a repel force to each of the nodes, in the opposite directions
-                    n1.add_force(-uv * fr)
-                    n2.add_force(uv * fr)
-
-                    # if they are also connected, add the attraction force
-                    # the direction does not matter -- it would look weird for directed
-                    if n1.is_adjacent_to(n2) or n2.is_adjacent_to(n1):
-                        fa = self.attraction(d)
-
-                        n1.add_force(-uv * fa)
-                        n2.add_force(uv * fa)
-
-                # root is special
-                if n1 is root:
-                    n1.clear_forces()
-                else:
-                    n1.evaluate_forces()
+            self.simulation.synchronize(self.graph)
 
         # if space is being pressed, center around the currently selected nodes
         # if there are none, center around their average
@@ -127,9 +78,9 @@ class Canvas(QWidget):
             pivot = None
 
             if len(sn) != 0:
-                pivot = Vector.average([n.get_position() for n in sn])
+                pivot = Vec2.average([n.get_position() for n in sn])
             elif len(self.graph.get_nodes()) != 0:
-                pivot = Vector.average(
+                pivot = Vec2.average(
                     [n.get_position() for n in self.graph.get_nodes()]
                 )
 
@@ -185,8 +136,23 @@ class Canvas(QWidget):
             else:
                 self.line_edit.setText(str(selected[0].get_weight()))
 
+    def changeEvent(self, event):
+        """Called when the state of the widget changes."""
+        # when the palette changes (like when switching the theme), the colors have to
+        # be generated from the new one
+        if event.type() == QEvent.PaletteChange:
+            Color.invalidate()
+
+        super().changeEvent(event)
+
     def paintEvent(self, event):
         """Paints the board."""
+        # move the nodes to the latest positions from the simulation (even when the
+        # forces are disabled, since it also calculates the layouts of new graphs)
+        if self.simulation.apply() and self.center_on_layout:
+            self.center_on_layout = False
+            self.center_on_graph()
+
         painter = QPainter(self)
         painter.setRenderHint(QPainter.Antialiasing, True)
         palette = self.palette()
@@ -202,8 +168,12 @@ class Canvas(QWidget):
         # transform the coordinates according to the current state of the canvas
         self.transformation.transform_painter(painter)
 
-        # draw the graph
-        self.graph.draw(painter, palette)
+        # draw the graph (only the part of it that is visible on the canvas)
+        top_left = self.transformation.apply(Vec2(0, 0))
+        bottom_right = self.transformation.apply(Vec2(self.width(), self.height()))
+
+        rect = QRectF(QPointF(*top_left), QPointF(*bottom_right))
+        self.graph.draw(painter, palette, rect)
 
     def keyReleaseEvent(self, event):
         """Called when a key press is registered."""
@@ -245,11 +215,12 @@ class Canvas(QWidget):
                 self.graph.set_root(selected[0])
 
         if key is self.keyboard.delete:
-            for node in self.graph.get_selected_nodes():
-                self.graph.remove_node(node)
+            with self.graph.batch():
+                for node in self.graph.get_selected_nodes():
+                    self.graph.remove_node(node)
 
-            for vertex in self.graph.get_selected_vertices():
-                self.graph.remove_vertex(vertex[0], vertex[1])
+                for vertex in self.graph.get_selected_vertices():
+                    self.graph.remove_vertex(vertex[0], vertex[1])
 
         elif key is self.keyboard.shift and self.mouse.left.pressed():
             self.start_shift_dragging_nodes()
@@ -361,7 +332,7 @@ class Canvas(QWidget):
                 nodes = self.graph.get_weakly_connected(
                     *self.graph.get_selected_nodes()
                 )
-                pivot = Vector.average([n.get_position() for n in selected])
+                pivot = Vec2.average([n.get_position() for n in selected])
                 self.rotate_about(nodes, delta, pivot)
 
         # zoom on canvas on not shift press
@@ -370,15 +341,17 @@ class Canvas(QWidget):
             nodes = self.graph.get_selected_nodes()
             if self.keyboard.space.pressed() and len(nodes) != 0:
                 positions = [p.get_position() for p in nodes]
-                self.transformation.zoom(Vector.average(positions), delta)
+                self.transformation.zoom(Vec2.average(positions), delta)
             else:
                 self.transformation.zoom(self.mouse.get_position(), delta)
 
-    def rotate_about(self, nodes: Sequence[DrawableNode], angle: float, pivot: Vector):
+    def rotate_about(self, nodes: Sequence[DrawableNode], angle: float, pivot: Vec2):
         """Rotate about the average of selected nodes by the angle."""
         for node in nodes:
             node.set_position(node.get_position().rotated(angle, pivot), True)
 
+        self.simulation.move(nodes)
+
     def select(self, obj: Union[DrawableNode, DrawableVertex]):
         """Select the given node/vertex."""
         # only select one when shift is not pressed
@@ -392,9 +365,31 @@ class Canvas(QWidget):
         """Get the current graph."""
         return self.graph
 
+    def get_engine(self) -> ArrayEngine:
+        """Return the engine that simulates the forces."""
+        return self.simulation.get_engine()
+
+    def set_engine(self, engine: ArrayEngine):
+        """Set the engine that simulates the forces."""
+        self.simulation.set_engine(engine)
+
+    def stop_simulation(self):
+        """Stop the simulation of the forces (when the canvas is closed)."""
+        self.simulation.stop()
+
     def set_forces(self, value: bool):
         """Enable/disable the forces that act on the nodes."""
         self.forces = value
+        self.simulation.set_running(value)
+
+    def center_on_graph(self):
+        """Center on the average of the positions of the nodes (immediately)."""
+        nodes = self.graph.get_nodes()
+
+        if len(nodes) != 0:
+            self.transformation.center(
+                Vec2.average([n.get_position() for n in nodes]), center_smoothness=1
+            )
 
     def import_graph(self):
         """Prompt a graph (from file) import."""
@@ -404,27 +399,51 @@ class Canvas(QWidget):
             return
 
         try:
-            # create the graph
-            new_graph = DrawableGraph.from_string(
-                open(path, "r").read(),
-                selected_changed=self.selected_changed,
-                animation_stopped=self.update_ui_callback,
-            )
-
-            if new_graph is not None:
-                self.graph = new_graph
-
-                # make the graph less jittery by setting the positions to a circle
-                for i, node in enumerate(self.graph.get_nodes()):
-                    node.set_position(
-                        Vector(3, 3).rotated(i * (2 * pi / len(self.graph.get_nodes())))
-                    )
+            callbacks = {
+                "selected_changed": self.selected_changed,
+                "animation_stopped": self.update_ui_callback,
+            }
+
+            # the annotations of the file (the graph handles its own, the canvas' are
+            # handled below), used for restoring the layout of the graph
+            annotations = []
+
+            # whether the layout of the graph is calculated by the simulation
+            laid_out = False
+
+            # create the graph (snapshots also contain the positions of the nodes, so
+            # nothing has to be parsed, but the graph is still built from them)
+            if is_snapshot(path):
+                self.graph = load_snapshot(path, DrawableGraph, **callbacks)
+            else:
+                new_graph = DrawableGraph.from_file(
+                    path, annotations=annotations, **callbacks
+                )
 
-            # center on it (immediately)
-            self.transformation.center(
-                Vector.average([n.get_position() for n in self.graph.get_nodes()]),
-                center_smoothness=1,
-            )
+                if new_graph is not None:
+                    self.graph = new_graph
+
+                    # calculate the initial layout of the graph, so the forces only
+                    # have to refine it (if the file doesn't contain the positions)
+                    # in the worker of the simulation, so it doesn't block the canvas
+                    if not any(parts[0] == "position" for parts in annotations):
+                        layout = MultilevelLayout(self.get_engine())
+                        self.simulation.lay_out(self.graph, layout)
+                        laid_out = True
+
+            transformations = [p for p in annotations if p[0] == "transformation"]
+            self.center_on_layout = False
+
+            if len(transformations) != 0 and len(transformations[-1]) == 4:
+                # restore the transformation the graph was exported with
+                scale, x, y = map(float, transformations[-1][1:])
+                self.transformation.scale = scale
+                self.transformation.translation = Vec2(x, y)
+            elif laid_out:
+                # the nodes are moved by the layout later (see paintEvent)
+                self.center_on_layout = True
+            else:
+                self.center_on_graph()
 
         except Exception as e:
             QMessageBox.critical(
@@ -435,18 +454,33 @@ class Canvas(QWidget):
 
     def export_graph(self):
         """Prompt a graph (from file) export."""
-        path = QFileDialog.getSaveFileName()[0]
+        path, selected_filter = QFileDialog.getSaveFileName(
+            filter=f"{self.text_filter};;{self.snapshot_filter}"
+        )
 
         if path == "":
             return
 
         try:
-            with open(path, "w") as f:
-                f.write(self.graph.to_string())
+            if selected_filter == self.snapshot_filter:
+                save_snapshot(self.graph, path)
+            else:
+                # the graph is preceded by the transformation of the canvas, so it's
+                # displayed the same way when it's imported again
+                scale = self.transformation.scale
+                x, y = self.transformation.translation
+
+                with open(path, "w") as f:
+                    f.write(f"# transformation {scale} {x} {y}\n")
+                    self.graph.to_file(f)
         except Exception as e:
-            QMessageBox.critical(
-                self, "Error!", "An error occurred when exporting the graph."
-            )
+            message = "An error occurred when exporting the graph."
+
+            # the snapshot can't store some weights, so say which
+            if isinstance(e, ValueError):
+                message += f"\n{e}"
+
+            QMessageBox.critical(self, "Error!", message)
 
             # clean-up
             os.remove(path)
@@ -465,7 +499,10 @@ class Canvas(QWidget):
         try:
             filename = os.path.basename(path)[:-3]
             cls = SourceFileLoader(filename, path).load_module()
-            getattr(cls, filename)(self.graph)
+
+            # the graph is only updated once the algorithm finishes
+            with self.graph.batch():
+                getattr(cls, filename)(self.graph)
         except AssertionError as e:
             QMessageBox.critical(self, "Error!", str(e))
         except AttributeError as e:
@@ -488,7 +525,9 @@ class Grafatko(QMainWindow):
         ## Canvas (main widget)
         self.line_edit = QLineEdit(self)
 
-        self.canvas = Canvas(self.line_edit, self, self.update_ui)
+        self.canvas = Canvas(
+            self.line_edit, self, self.update_ui, BarnesHutEngine(arguments.theta)
+        )
         self.canvas.setMinimumSize(100, 200)  # reasonable minimum size
         self.setCentralWidget(self.canvas)
 
@@ -506,7 +545,7 @@ class Grafatko(QMainWindow):
                 QAction("&Import", self, triggered=lambda: self.canvas.import_graph()),
                 QAction("&Export", self, triggered=lambda: self.canvas.export_graph()),
                 self.sep,
-                QAction("&Quit", self, triggered=exit),
+                QAction("&Quit", self, triggered=self.close),
             ]
         )
 
@@ -659,6 +698,10 @@ class Grafatko(QMainWindow):
     def keyReleaseEvent(self, event):
         self.canvas.keyReleaseEvent(event)
 
+    def closeEvent(self, event):
+        self.canvas.stop_simulation()
+        super().closeEvent(event)
+
     def clear_animations(self):
         """Clear animations and update the UI (to disable the animation buttons)."""
         self.canvas.get_graph().clear_animations()
@@ -702,6 +745,15 @@ def run():
         help="start the app in dark mode",
     )
 
+    parser.add_argument(
+        "-t",
+        "--theta",
+        dest="theta",
+        type=float,
+        default=0.9,
+        help="accuracy of the force simulation (0 is exact, larger values are faster)",
+    )
+
     app = QApplication(sys.argv)
     ex = Grafatko(parser.parse_args())
     sys.exit(app.exec_())
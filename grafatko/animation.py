@@ -106,9 +106,9 @@ class ColorAnimation(Animation, ColorGenerating):
 
         # return the interpolated color
         return QColor.fromRgb(
-            color_from.red() * (1 - v) + color_to.red() * v,
-            color_from.green() * (1 - v) + color_to.green() * v,
-            color_from.blue() * (1 - v) + color_to.blue() * v,
+            round(color_from.red() * (1 - v) + color_to.red() * v),
+            round(color_from.green() * (1 - v) + color_to.green() * v),
+            round(color_from.blue() * (1 - v) + color_to.blue() * v),
         )
 
     def get_start_value(self):
@@ -21,60 +21,123 @@ class ColorGenerating(ABC):
 
 
 class Color(ColorGenerating):
-    """A class for generating QColors, given a QPalette."""
-
-    def __init__(self, color_function: Callable[[QPalette], QColor]):
+    """A class for generating QColors, given a QPalette.
+
+    The colors are interned (the class methods return the same object for the same
+    color) and each of them only calls its color function once for each palette (told
+    apart by its cache key) and generation, so getting the color when drawing is
+    usually just an attribute lookup. Changing the generation (see invalidate) makes
+    all of them generate their color again. Colors derived from something that
+    changes over time (like an animation) are not static and call their color
+    function each time. The generated QColor objects are shared, so don't modify
+    them."""
+
+    # the interned colors (for each key describing the color)
+    interned: Dict[Hashable, Color] = {}
+
+    # incremented when the palette changes, so the colors are generated again
+    generation: int = 0
+
+    def __init__(
+        self, color_function: Callable[[QPalette], QColor], static: bool = True
+    ):
         self.color_function = color_function
+        self.static = static
+
+        # the generated color, and the generation and the cache key of the palette it
+        # was generated from
+        self.color: Optional[QColor] = None
+        self.color_generation: Optional[Tuple[int, int]] = None
+
+    @classmethod
+    def invalidate(cls):
+        """Make all colors generate their color again (even from the same palette)."""
+        cls.generation += 1
+
+    @classmethod
+    def intern(
+        cls, key: Hashable, color_function: Callable[[QPalette], QColor]
+    ) -> Color:
+        """Return the interned color with the given key (creating it, if needed)."""
+        if key not in cls.interned:
+            cls.interned[key] = Color(color_function)
+
+        return cls.interned[key]
 
     @classmethod
     def text(cls) -> Color:
         """The text color of the palette"""
-        return Color(lambda palette: palette.text().color())
+        return cls.intern("text", lambda palette: palette.text().color())
 
     @classmethod
     def background(cls) -> Color:
         """The background color of the palette."""
-        return Color(lambda palette: palette.window().color())
+        return cls.intern("background", lambda palette: palette.window().color())
 
     @classmethod
     def red(cls) -> Color:
-        return Color(lambda _: QColor.fromRgb(255, 0, 0))
+        return cls.intern("red", lambda _: QColor.fromRgb(255, 0, 0))
 
     @classmethod
     def green(cls) -> Color:
-        return Color(lambda _: QColor.fromRgb(0, 255, 0))
+        return cls.intern("green", lambda _: QColor.fromRgb(0, 255, 0))
 
     @classmethod
     def blue(cls) -> Color:
-        return Color(lambda _: QColor.fromRgb(0, 0, 255))
+        return cls.intern("blue", lambda _: QColor.fromRgb(0, 0, 255))
 
     @classmethod
     def selected(cls) -> Color:
         """The text color of things that are selected."""
-        return Color(lambda palette: palette.alternateBase().color())
+        return cls.intern("selected", lambda palette: palette.alternateBase().color())
 
     def lighter(self, coefficient: float) -> Color:
         """Return a Color object that is lighter than the current one by a coefficient."""
-        return Color(lambda palette: self.color_function(palette).lighter(coefficient))
+        function = lambda palette: self(palette).lighter(coefficient)
+
+        if not self.static:
+            return Color(function, False)
+
+        return Color.intern((self, "lighter", coefficient), function)
 
     def darker(self, coefficient: float) -> Color:
         """Return a Color object that is darker than the current one by a coefficient."""
-        return Color(lambda palette: self.color_function(palette).darker(coefficient))
+        function = lambda palette: self(palette).darker(coefficient)
+
+        if not self.static:
+            return Color(function, False)
+
+        return Color.intern((self, "darker", coefficient), function)
 
     @classmethod
     def __contrast(cls, color: QColor) -> QColor:
-        average = 255 - (color.red() + color.green() + color.blue()) / 3
+        average = 255 - round((color.red() + color.green() + color.blue()) / 3)
         return QColor.fromRgb(average, average, average)
 
     @classmethod
-    def contrast(cls, color: Color) -> Color:
+    def contrast(cls, color: ColorGenerating) -> Color:
         """Return a Color object returning a color from white to black that is in
         contrast to the given color."""
-        return Color(lambda palette: cls.__contrast(color(palette)))
+        function = lambda palette: cls.__contrast(color(palette))
+
+        if not isinstance(color, Color) or not color.static:
+            return Color(function, False)
+
+        return cls.intern((color, "contrast"), function)
 
     def __call__(self, palette: QPalette) -> QColor:
-        """Generated from the simple color function of the class."""
-        return self.color_function(palette)
+        """Generated from the simple color function of the class (only once for each
+        palette and generation, if the color is static)."""
+        if not self.static:
+            return self.color_function(palette)
+
+        generation = (Color.generation, palette.cacheKey())
+
+        if self.color_generation != generation:
+            self.color = self.color_function(palette)
+            self.color_generation = generation
+
+        return self.color
 
 
 @dataclass
@@ -92,23 +155,52 @@ class Colorable:
 
 @dataclass
 class Pen(Colorable):
-    """A (wrapper) object storing a pen object."""
+    """A (wrapper) object storing a pen object. The QPen objects are cached (for each
+    color, width and style), so the same one is returned each time and they're not
+    created for each object on each frame. They are shared, so don't modify them."""
 
     style: Qt.PenStyle = Qt.SolidLine
     width: float = 0.1
 
-    def __call__(self, palette: QPalette):
-        return QPen(self.get_color()(palette), self.width, self.style)
+    # the cached pens (cleared when it gets too large, since animations create a lot
+    # of colors that are only used once)
+    cache: ClassVar[Dict[Tuple[int, float, Qt.PenStyle], QPen]] = {}
+    cache_size: ClassVar[int] = 1024
+
+    def __call__(self, palette: QPalette) -> QPen:
+        color = self.get_color()(palette)
+        key = (color.rgba(), self.width, self.style)
+
+        if key not in Pen.cache:
+            if len(Pen.cache) >= Pen.cache_size:
+                Pen.cache.clear()
+
+            Pen.cache[key] = QPen(color, self.width, self.style)
+
+        return Pen.cache[key]
 
 
 @dataclass
 class Brush(Colorable):
-    """A (wrapper) object storing a brush object."""
+    """A (wrapper) object storing a brush object. The QBrush objects are cached the
+    same way the QPen objects of Pen are."""
 
     style: Qt.BrushStyle = Qt.SolidPattern
 
-    def __call__(self, palette: QPalette):
-        return QBrush(self.get_color()(palette), self.style)
+    cache: ClassVar[Dict[Tuple[int, Qt.BrushStyle], QBrush]] = {}
+    cache_size: ClassVar[int] = 1024
+
+    def __call__(self, palette: QPalette) -> QBrush:
+        color = self.get_color()(palette)
+        key = (color.rgba(), self.style)
+
+        if key not in Brush.cache:
+            if len(Brush.cache) >= Brush.cache_size:
+                Brush.cache.clear()
+
+            Brush.cache[key] = QBrush(color, self.style)
+
+        return Brush.cache[key]
 
     @classmethod
     def empty(cls):
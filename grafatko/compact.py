@@ -0,0 +1,655 @@
+"""A compact graph, whose nodes are integers and whose data is stored in NumPy arrays.
+
+The nodes of a compact graph are the integers 0..n-1 and all of its data is stored
+in columns (arrays with one item per node/vertex) instead of Node and Vertex objects:
+
+- nodes: positions (float64, n x 2), colors (uint16) and labels (a list)
+- vertices: from, to (int32), weights (float64) and colors (uint16)
+
+Undirected vertices are only stored once (their direction being arbitrary). To get the
+adjacent nodes, the vertices are indexed in the CSR format (for each node, the slice of
+the array of its adjacent nodes). The index is only rebuilt once enough vertices were
+added or removed since the last time, the ones in between are kept in small dicts.
+
+The graph has the same methods for querying the structure as the Graph class (like
+get_nodes, get_adjacent_nodes, get_weight or get_components), so the algorithms that
+only use those work with both. A graph with a million vertices takes about 40 MB (see
+get_nbytes), while the node and vertex objects of a Graph take over 500 MB."""
+
+from __future__ import annotations
+
+import numbers
+
+import numpy as np
+
+from grafatko.graph import *
+
+
+def check_weight(weight: Any) -> float:
+    """Return the weight as a float. Raise a ValueError if it can't be stored in a float
+    exactly (if it's not a number or if it's an integer larger than 2 ** 53)."""
+    if isinstance(weight, bool) or not isinstance(weight, numbers.Real):
+        raise ValueError(f"The weight {weight!r} is not a number.")
+
+    if isinstance(weight, numbers.Integral) and abs(weight) > 2 ** 53:
+        raise ValueError(f"The weight {weight} is too large to be stored exactly.")
+
+    return float(weight)
+
+
+def to_weight(value: float) -> Union[int, float]:
+    """Return the stored weight as it was added (integer weights are kept integers)."""
+    return int(value) if value.is_integer() else value
+
+
+class CompactGraph:
+    """A graph stored in NumPy arrays (see the module docstring)."""
+
+    # how many vertices can be changed (relative to their count) before reindexing
+    reindex_ratio = 0.125
+    reindex_minimum = 1024
+
+    def __init__(self, directed: bool = False, weighted: bool = False):
+        self.directed = directed
+        self.weighted = weighted
+
+        self.node_count = 0
+        self.vertex_count = 0
+
+        # the columns (with some capacity to grow, only the first items are used)
+        self.positions = np.zeros((0, 2))
+        self.node_colors = np.zeros(0, dtype=np.uint16)
+        self.labels: List[Optional[str]] = []
+
+        self.sources = np.zeros(0, dtype=np.int32)
+        self.targets = np.zeros(0, dtype=np.int32)
+        self.weights = np.zeros(0)
+        self.vertex_colors = np.zeros(0, dtype=np.uint16)
+
+        # color i of the colors of nodes/vertices is colors[i] (0 is the default one)
+        self.colors: List[Optional[ColorGenerating]] = [None]
+        self.color_indexes: Dict[ColorGenerating, int] = {}
+
+        # the CSR index of the first indexed vertices: the nodes adjacent to node i
+        # are adjacent[offsets[i]:offsets[i + 1]] (edges are the indexes of the
+        # vertices) and the same for the incoming nodes of directed graphs
+        self.indexed = 0
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.adjacent = np.zeros(0, dtype=np.int32)
+        self.edges = np.zeros(0, dtype=np.int32)
+        self.incoming_offsets = self.offsets
+        self.incoming = self.adjacent
+        self.incoming_edges = self.edges
+
+        # the vertices added since the last indexing (node -> adjacent node -> vertex)
+        # and the indexed ones removed since then
+        self.added: Dict[int, Dict[int, int]] = {}
+        self.added_incoming: Dict[int, Dict[int, int]] = {}
+        self.removed: Set[int] = set()
+
+        # incremented on each change of the structure (see Graph.get_version)
+        self.version = 0
+
+        self.component_ids: Optional[np.ndarray] = None
+        self.component_version: Optional[int] = None
+
+    @classmethod
+    def from_graph(cls, graph: Graph) -> CompactGraph:
+        """Return a compact copy of the graph (node i being the i-th node of it)."""
+        compact = cls(graph.is_directed(), graph.is_weighted())
+
+        nodes = graph.get_nodes()
+        indexes = graph.nodes.get_indexes()
+
+        vertices = [
+            vertex
+            for vertex in graph.get_vertices()
+            if graph.is_directed() or indexes[vertex[0]] < indexes[vertex[1]]
+        ]
+
+        compact.add_nodes([node.get_label() for node in nodes])
+
+        for i, node in enumerate(nodes):
+            if isinstance(node, DrawableNode):
+                compact.set_position(i, node.get_position())
+                compact.set_color(i, node.get_color())
+
+        compact.add_vertices(
+            [indexes[vertex[0]] for vertex in vertices],
+            [indexes[vertex[1]] for vertex in vertices],
+            [check_weight(vertex.get_weight()) for vertex in vertices],
+        )
+
+        return compact
+
+    @classmethod
+    def from_arrays(
+        cls,
+        directed: bool,
+        weighted: bool,
+        labels: List[Optional[str]],
+        sources: np.ndarray,
+        targets: np.ndarray,
+        weights: Optional[np.ndarray] = None,
+        positions: Optional[np.ndarray] = None,
+        node_colors: Optional[np.ndarray] = None,
+        vertex_colors: Optional[np.ndarray] = None,
+        colors: Sequence[ColorGenerating] = (),
+    ) -> CompactGraph:
+        """Return a compact graph with the given columns (the colors of the nodes and
+        the vertices being indexes to the given colors, starting from 1, 0 being the
+        default color). The vertices are not checked (see add_vertices)."""
+        compact = cls(directed, weighted)
+        compact.add_nodes(labels)
+        compact.add_vertices(sources, targets, weights)
+
+        compact.colors += colors
+        compact.color_indexes = {color: i + 1 for i, color in enumerate(colors)}
+
+        for column, values, count in (
+            (compact.positions, positions, compact.node_count),
+            (compact.node_colors, node_colors, compact.node_count),
+            (compact.vertex_colors, vertex_colors, compact.vertex_count),
+        ):
+            if values is not None:
+                column[:count] = values
+
+        return compact
+
+    def to_graph(self, cls: Type[Graph] = Graph, *args, **kwargs) -> Graph:
+        """Return the graph (of the given class, created with the given arguments) with
+        the nodes and the vertices of this one (the i-th node being node i)."""
+        self.__flush()
+
+        graph = cls(*args, **kwargs)
+        graph.set_directed(self.directed)
+        graph.set_weighted(self.weighted)
+
+        count = self.vertex_count
+        weights = [to_weight(weight) for weight in self.weights[:count].tolist()]
+
+        with graph.batch(), paused_collection():
+            if issubclass(cls.node_class, DrawableNode):
+                nodes = [
+                    cls.node_class(label=label, position=Vec2(x, y))
+                    for label, (x, y) in zip(
+                        self.labels, self.positions[: self.node_count].tolist()
+                    )
+                ]
+
+                for node, color in zip(nodes, self.node_colors.tolist()):
+                    if color != 0:
+                        node.set_color(self.colors[color])
+            else:
+                nodes = [cls.node_class(label=label) for label in self.labels]
+
+            graph._populate(
+                nodes,
+                zip(
+                    self.sources[:count].tolist(),
+                    self.targets[:count].tolist(),
+                    weights,
+                ),
+            )
+
+        return graph
+
+    def is_directed(self) -> bool:
+        """Return True if the graph is directed, else False."""
+        return self.directed
+
+    def is_weighted(self) -> bool:
+        """Return True if the graph is weighted and False otherwise."""
+        return self.weighted
+
+    def set_weighted(self, value: bool):
+        """Set, whether the graph is weighted or not."""
+        self.weighted = value
+
+    def get_version(self) -> int:
+        """Return the version of the structure of the graph (see Graph.get_version)."""
+        return self.version
+
+    def get_nbytes(self) -> int:
+        """Return the number of bytes taken by the arrays of the graph."""
+        arrays = [
+            self.positions,
+            self.node_colors,
+            self.sources,
+            self.targets,
+            self.weights,
+            self.vertex_colors,
+            self.offsets,
+            self.adjacent,
+            self.edges,
+        ]
+
+        if self.directed:
+            arrays += [self.incoming_offsets, self.incoming, self.incoming_edges]
+
+        return sum(array.nbytes for array in arrays)
+
+    def get_nodes(self) -> range:
+        """Return the nodes of the graph (the integers from 0 to their count)."""
+        return range(self.node_count)
+
+    def get_vertices(self) -> List[Tuple[int, int]]:
+        """Return a list of the vertices of the graph (pairs of nodes; both directions
+        of the undirected ones, like the vertices of a Graph)."""
+        self.__flush()
+
+        vertices = list(
+            zip(
+                self.sources[: self.vertex_count].tolist(),
+                self.targets[: self.vertex_count].tolist(),
+            )
+        )
+
+        if not self.directed:
+            vertices += [(j, i) for i, j in vertices]
+
+        return vertices
+
+    def get_label(self, node: int) -> Optional[str]:
+        """Return the label of the node."""
+        return self.labels[node]
+
+    def set_label(self, node: int, label: Optional[str]):
+        """Set the label of the node."""
+        self.labels[node] = label
+
+    def get_position(self, node: int) -> Vec2:
+        """Return the position of the node."""
+        return Vec2(*self.positions[node].tolist())
+
+    def set_position(self, node: int, position: Vec2):
+        """Set the position of the node."""
+        self.positions[node] = tuple(position)
+
+    def get_positions(self) -> np.ndarray:
+        """Return the positions of all of the nodes (a view, not a copy)."""
+        return self.positions[: self.node_count]
+
+    def __get_color_index(self, color: Optional[ColorGenerating]) -> int:
+        """Return the index of the color in the colors of the graph (adding it)."""
+        if color is None or color is Paintable.default_brush.get_color():
+            return 0
+
+        if color not in self.color_indexes:
+            self.color_indexes[color] = len(self.colors)
+            self.colors.append(color)
+
+        return self.color_indexes[color]
+
+    def get_color(self, node: int) -> Optional[ColorGenerating]:
+        """Return the color of the node (None if it has the default one)."""
+        return self.colors[self.node_colors[node]]
+
+    def set_color(self, node: int, color: Optional[ColorGenerating]):
+        """Set the color of the node (None for the default one)."""
+        self.node_colors[node] = self.__get_color_index(color)
+
+    def get_vertex_color(self, n1: int, n2: int) -> Optional[ColorGenerating]:
+        """Return the color of the vertex (None if it has the default one)."""
+        return self.colors[self.vertex_colors[self.__find_vertex(n1, n2)]]
+
+    def set_vertex_color(self, n1: int, n2: int, color: Optional[ColorGenerating]):
+        """Set the color of the vertex (None for the default one)."""
+        self.vertex_colors[self.__find_vertex(n1, n2)] = self.__get_color_index(color)
+
+    @staticmethod
+    def __grow(array: np.ndarray, size: int) -> np.ndarray:
+        """Return the array with a capacity of at least the given size (doubling it)."""
+        if size <= len(array):
+            return array
+
+        grown = np.zeros((max(size, 2 * len(array)),) + array.shape[1:], array.dtype)
+        grown[: len(array)] = array
+
+        return grown
+
+    def add_node(self, label: Optional[str] = None, position: Vec2 = None) -> int:
+        """Add a new node to the graph, returning it."""
+        node = self.add_nodes([label])
+
+        if position is not None:
+            self.set_position(node, position)
+
+        return node
+
+    def add_nodes(self, labels: Sequence[Optional[str]]) -> int:
+        """Add new nodes with the given labels, returning the first of them."""
+        first, count = self.node_count, len(labels)
+        self.node_count += count
+
+        self.positions = self.__grow(self.positions, self.node_count)
+        self.node_colors = self.__grow(self.node_colors, self.node_count)
+        self.labels.extend(labels)
+
+        # the removed nodes might have left their data there
+        self.positions[first : self.node_count] = 0
+        self.node_colors[first : self.node_count] = 0
+
+        # the new nodes have no vertices
+        self.offsets = np.concatenate(
+            [self.offsets, np.full(count, self.offsets[-1], np.int64)]
+        )
+
+        if self.directed:
+            self.incoming_offsets = np.concatenate(
+                [
+                    self.incoming_offsets,
+                    np.full(count, self.incoming_offsets[-1], np.int64),
+                ]
+            )
+
+        self.version += 1
+
+        return first
+
+    def remove_node(self, node: int):
+        """Remove the node (and its vertices) from the graph. The nodes after it are
+        renumbered (each of their numbers decreases by one), which takes linear time."""
+        self.__flush()
+
+        count = self.vertex_count
+        sources, targets = self.sources[:count], self.targets[:count]
+        kept = (sources != node) & (targets != node)
+
+        # renumber the nodes after the removed one
+        self.__set_vertices(
+            sources[kept] - (sources[kept] > node),
+            targets[kept] - (targets[kept] > node),
+            self.weights[:count][kept],
+            self.vertex_colors[:count][kept],
+        )
+
+        rest = slice(node + 1, self.node_count)
+        self.positions[node : self.node_count - 1] = self.positions[rest].copy()
+        self.node_colors[node : self.node_count - 1] = self.node_colors[rest].copy()
+        del self.labels[node]
+
+        self.node_count -= 1
+        self.version += 1
+
+        self.indexed = -1  # all of the vertices were just set
+        self.__reindex()
+
+    def add_vertex(self, n1: int, n2: int, weight: Union[int, float] = 1):
+        """Add a vertex from node n1 to node n2 (see Graph.add_vertex). Only does so if
+        the given vertex doesn't already exist and can be added."""
+        if (n1 == n2 and not self.directed) or self.is_adjacent(n1, n2):
+            return
+
+        vertex = self.vertex_count
+        self.__append_vertices([n1], [n2], [check_weight(weight)])
+
+        self.added.setdefault(n1, {})[n2] = vertex
+        self.added_incoming.setdefault(n2, {})[n1] = vertex
+
+        self.__changed()
+
+    def add_vertices(
+        self,
+        sources: Sequence[int],
+        targets: Sequence[int],
+        weights: Optional[Sequence[float]] = None,
+    ):
+        """Add new vertices (given by the nodes they go from and to) at once. Much
+        faster than adding them one by one, but they're not checked (like in
+        Graph._populate) and they're only indexed when they're needed."""
+        if weights is None:
+            weights = np.ones(len(sources))
+
+        self.__flush()
+        self.__append_vertices(sources, targets, weights)
+
+        self.indexed = -1  # so it doesn't match and the vertices are indexed
+        self.version += 1
+
+    def remove_vertex(self, n1: int, n2: int):
+        """Remove the vertex from node n1 to node n2 (see Graph.remove_vertex)."""
+        vertex = self.__find_vertex(n1, n2)
+
+        if vertex is None:
+            return
+
+        if vertex >= self.indexed:
+            for added, i, j in ((self.added, n1, n2), (self.added_incoming, n2, n1)):
+                if j not in added.get(i, ()):
+                    i, j = j, i
+
+                del added[i][j]
+        else:
+            self.removed.add(vertex)
+
+        self.__changed()
+
+    def toggle_vertex(self, n1: int, n2: int):
+        """Toggle a vertex between two nodes."""
+        if self.is_adjacent(n1, n2):
+            self.remove_vertex(n1, n2)
+        else:
+            self.add_vertex(n1, n2)
+
+    def __append_vertices(self, sources, targets, weights):
+        """Append the vertices to the columns (not indexing them)."""
+        start = self.vertex_count
+        self.vertex_count += len(sources)
+
+        for name in ("sources", "targets", "weights", "vertex_colors"):
+            setattr(self, name, self.__grow(getattr(self, name), self.vertex_count))
+
+        self.sources[start : self.vertex_count] = sources
+        self.targets[start : self.vertex_count] = targets
+        self.weights[start : self.vertex_count] = weights
+        self.vertex_colors[start : self.vertex_count] = 0
+
+    def __set_vertices(self, sources, targets, weights, colors):
+        """Replace the vertices of the graph (not indexing them)."""
+        self.vertex_count = 0
+        self.__append_vertices(sources, targets, weights)
+        self.vertex_colors[: self.vertex_count] = colors
+
+    def __changed(self):
+        """Called after a vertex was added or removed, to reindex them if there are
+        enough changes since the last indexing."""
+        self.version += 1
+
+        changes = self.vertex_count - self.indexed + len(self.removed)
+        if changes > max(self.reindex_minimum, self.reindex_ratio * self.indexed):
+            self.__flush()
+
+    def __flush(self):
+        """Make sure that all vertices are indexed (and none are removed)."""
+        if self.indexed != self.vertex_count or len(self.removed) != 0:
+            self.__reindex()
+
+    def __reindex(self):
+        """Drop the removed vertices from the columns and index all of them."""
+        count = self.vertex_count
+
+        if len(self.removed) != 0:
+            kept = np.ones(count, dtype=bool)
+            kept[list(self.removed)] = False
+
+            # vertices added after the indexing might have been removed too
+            added = {
+                vertex
+                for adjacent in self.added.values()
+                for vertex in adjacent.values()
+            }
+            kept[self.indexed :] = False
+            kept[list(added)] = True
+
+            self.__set_vertices(
+                self.sources[:count][kept],
+                self.targets[:count][kept],
+                self.weights[:count][kept],
+                self.vertex_colors[:count][kept],
+            )
+        elif self.indexed not in (-1, count):
+            # same as above, but only the added vertices could have been removed
+            added = sorted(
+                vertex
+                for adjacent in self.added.values()
+                for vertex in adjacent.values()
+            )
+
+            if len(added) != count - self.indexed:
+                kept = np.r_[np.arange(self.indexed), added].astype(np.int64)
+
+                self.__set_vertices(
+                    self.sources[kept],
+                    self.targets[kept],
+                    self.weights[kept],
+                    self.vertex_colors[kept],
+                )
+
+        count = self.vertex_count
+        sources, targets = self.sources[:count], self.targets[:count]
+
+        if self.directed:
+            self.offsets, self.adjacent, self.edges = self.__index(sources, targets)
+            self.incoming_offsets, self.incoming, self.incoming_edges = self.__index(
+                targets, sources
+            )
+        else:
+            self.offsets, self.adjacent, self.edges = self.__index(
+                np.concatenate([sources, targets]), np.concatenate([targets, sources])
+            )
+
+        self.indexed = count
+        self.added, self.added_incoming, self.removed = {}, {}, set()
+
+    def __index(self, sources: np.ndarray, targets: np.ndarray):
+        """Return the CSR index of the given vertices: the offsets of the nodes, the
+        adjacent nodes and the vertices going to them."""
+        order = np.argsort(sources, kind="stable").astype(np.int32)
+
+        offsets = np.zeros(self.node_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=self.node_count), out=offsets[1:])
+
+        # the undirected vertices are indexed twice (once in each direction)
+        edges = order % max(self.vertex_count, 1)
+
+        return offsets, targets[order], edges.astype(np.int32)
+
+    def __row(self, node, offsets, adjacent, edges, added) -> Dict[int, int]:
+        """Return the adjacent nodes of the node in the index (and the vertices going
+        to them), including the ones added and excluding the ones removed since."""
+        start, end = offsets[node], offsets[node + 1]
+        row = dict(zip(adjacent[start:end].tolist(), edges[start:end].tolist()))
+
+        if len(self.removed) != 0:
+            row = {n: v for n, v in row.items() if v not in self.removed}
+
+        row.update(added.get(node, ()))
+
+        if not self.directed:
+            # undirected vertices are only added in one direction
+            row.update(self.added_incoming.get(node, ()))
+
+        return row
+
+    def __adjacent(self, node: int) -> Dict[int, int]:
+        return self.__row(node, self.offsets, self.adjacent, self.edges, self.added)
+
+    def __incoming(self, node: int) -> Dict[int, int]:
+        if not self.directed:
+            return self.__adjacent(node)
+
+        return self.__row(
+            node,
+            self.incoming_offsets,
+            self.incoming,
+            self.incoming_edges,
+            self.added_incoming,
+        )
+
+    def __check_index(self):
+        """Index the vertices, if the ones added at once weren't indexed yet."""
+        if self.indexed == -1:
+            self.__reindex()
+
+    def __find_vertex(self, n1: int, n2: int) -> Optional[int]:
+        """Return the index of the vertex from n1 to n2 (or None if there isn't one)."""
+        self.__check_index()
+        return self.__adjacent(n1).get(n2)
+
+    def get_adjacent_nodes(self, node: int) -> KeysView[int]:
+        """Return the nodes that the node has a vertex to."""
+        self.__check_index()
+        return self.__adjacent(node).keys()
+
+    def get_incoming_nodes(self, node: int) -> KeysView[int]:
+        """Return the nodes that have a vertex to the node."""
+        self.__check_index()
+        return self.__incoming(node).keys()
+
+    def is_adjacent(self, n1: int, n2: int) -> bool:
+        """Return True if there is a vertex from n1 to n2, else False."""
+        return self.__find_vertex(n1, n2) is not None
+
+    def get_weight(self, n1: int, n2: int) -> Optional[Union[int, float]]:
+        """Return the weight of the vertex from n1 to n2 (None if there isn't one)."""
+        vertex = self.__find_vertex(n1, n2)
+
+        if vertex is not None:
+            return to_weight(float(self.weights[vertex]))
+
+    def set_weight(self, n1: int, n2: int, weight: Union[int, float]):
+        """Set the weight of the specified vertex (if it exists)."""
+        vertex = self.__find_vertex(n1, n2)
+
+        if vertex is not None:
+            self.weights[vertex] = check_weight(weight)
+
+    def get_component_ids(self) -> np.ndarray:
+        """Return the identifiers of the weakly connected components of the nodes (the
+        smallest node of each component)."""
+        if self.component_version == self.version:
+            return self.component_ids
+
+        self.__flush()
+
+        sources = self.sources[: self.vertex_count].astype(np.int64)
+        targets = self.targets[: self.vertex_count].astype(np.int64)
+        parent = np.arange(self.node_count)
+
+        # hook the larger root of each vertex onto the smaller one and compress the
+        # paths (all parents are roots after that), until no vertex joins two roots
+        while True:
+            p1, p2 = parent[sources], parent[targets]
+            joining = p1 != p2
+
+            if not joining.any():
+                break
+
+            lower, higher = np.minimum(p1, p2)[joining], np.maximum(p1, p2)[joining]
+            np.minimum.at(parent, higher, lower)
+
+            while True:
+                grandparent = parent[parent]
+
+                if np.array_equal(grandparent, parent):
+                    break
+
+                parent = grandparent
+
+        self.component_ids, self.component_version = parent, self.version
+
+        return parent
+
+    def get_components(self) -> List[Set[int]]:
+        """Return a list of the weakly connected components of the graph."""
+        ids = self.get_component_ids()
+        order = np.argsort(ids, kind="stable")
+        bounds = np.flatnonzero(np.diff(ids[order])) + 1
+
+        return [set(part.tolist()) for part in np.split(order, bounds) if len(part)]
+
+    def weakly_connected(self, n1: int, n2: int) -> bool:
+        """Return True if the nodes are weakly connected, else False."""
+        ids = self.get_component_ids()
+        return ids[n1] == ids[n2]
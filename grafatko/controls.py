@@ -71,9 +71,9 @@ class Mouse(PressableCollection):
     def __init__(self, transformation: Transformation):
         self.transformation = transformation  # current canvas transformation
 
-        self.position: Optional[Vector] = None
-        self.prev_position: Optional[Vector] = None
-        self.last_pressed_position: Optional[Vector] = None
+        self.position: Optional[Vec2] = None
+        self.prev_position: Optional[Vec2] = None
+        self.last_pressed_position: Optional[Vec2] = None
 
         super().__init__(
             [
@@ -85,7 +85,7 @@ class Mouse(PressableCollection):
 
     def moved_event(self, event):
         self.prev_position = self.position
-        self.position = Vector(event.pos().x(), event.pos().y())
+        self.position = Vec2(event.pos().x(), event.pos().y())
 
     def current_last_distance(self):
         """Return the distance between the current mouse pos and last pressed pos."""
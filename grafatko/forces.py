@@ -0,0 +1,1245 @@
+"""Engines that simulate the forces acting on the nodes of a graph."""
+
+from __future__ import annotations
+
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from heapq import heapify, heapreplace
+from multiprocessing import get_context
+from queue import Queue, Empty
+from threading import Thread, Lock
+from time import perf_counter
+
+import numpy as np
+
+from grafatko.graph import *
+
+
+class Integrator(ABC):
+    """A way of moving the nodes by the forces acting on them. An integrator can keep a
+    state for each component of the graph (a row of an array, like its temperature),
+    which is reset when the component changes or is moved by the user."""
+
+    @abstractmethod
+    def initial_state(self, count: int) -> np.ndarray:
+        """Return the initial states of the given number of components."""
+
+    @abstractmethod
+    def integrate(
+        self,
+        positions: np.ndarray,
+        forces: np.ndarray,
+        groups: np.ndarray,
+        state: np.ndarray,
+    ) -> np.ndarray:
+        """Return the positions of the nodes moved by the forces, updating the states of
+        their components (given by groups) in place."""
+
+
+class EulerIntegrator(Integrator):
+    """Moves the nodes by the forces acting on them. Has no state, but nodes with a lot
+    of vertices oscillate and graphs whose nodes start close to each other diverge."""
+
+    def initial_state(self, count: int) -> np.ndarray:
+        return np.zeros((count, 0))
+
+    def integrate(
+        self,
+        positions: np.ndarray,
+        forces: np.ndarray,
+        groups: np.ndarray,
+        state: np.ndarray,
+    ) -> np.ndarray:
+        return positions + forces
+
+
+class CoolingIntegrator(Integrator):
+    """Moves the nodes by the forces acting on them, but at most by the temperature of
+    their component (like in the Fruchterman–Reingold algorithm). The temperature is
+    adapted to the progress of the layout: when the energy of the component (the sum
+    of the squared forces) decreases for a few steps in a row, it heats up, otherwise
+    it cools down, so oscillations die out and the component settles."""
+
+    temperature = 1.0  # the initial (and the highest) temperature
+    cooling = 0.95  # the temperature is multiplied by this when cooling down
+    patience = 5  # the number of steps of decreasing energy needed for heating up
+
+    def initial_state(self, count: int) -> np.ndarray:
+        # the temperature, the number of steps of decreasing energy and the energy
+        state = np.empty((count, 3))
+        state[:] = self.temperature, 0, np.inf
+        return state
+
+    def integrate(
+        self,
+        positions: np.ndarray,
+        forces: np.ndarray,
+        groups: np.ndarray,
+        state: np.ndarray,
+    ) -> np.ndarray:
+        temperature, progress, energy = state.T
+
+        squared = (forces ** 2).sum(axis=1)
+        magnitudes = np.sqrt(squared)
+        limits = temperature[groups]
+
+        scale = np.ones(len(forces))
+        np.divide(limits, magnitudes, out=scale, where=magnitudes > limits)
+        positions = positions + forces * scale[:, None]
+
+        # only the components of the given nodes are updated
+        present = np.bincount(groups, minlength=len(state)) != 0
+        current = np.bincount(groups, squared, minlength=len(state))
+        decreased = present & (current < energy)
+
+        progress[present] = np.where(decreased, progress + 1, 0)[present]
+        heating = progress >= self.patience
+        progress[heating] = 0
+
+        temperature[heating] = np.minimum(
+            temperature[heating] / self.cooling, self.temperature
+        )
+        temperature[present & ~decreased] *= self.cooling
+        energy[present] = current[present]
+
+        return positions
+
+
+class ForceEngine(ABC):
+    """A base class for simulating the forces acting on the nodes of a graph. Nodes
+    repel each other (if they're weakly connected) and adjacent nodes attract each
+    other. If the graph has a root, the nodes reachable from it aren't moved by the
+    forces, but towards their place in its tree layout (see TreeLayout)."""
+
+    # _ because the lambda gets self as the first argument
+    repulsion = lambda _, distance: (1 / distance) ** 2
+    attraction = lambda _, distance: -(distance - 6) / 3
+
+    easing = 0.2  # the part of the way to their place that the nodes move each step
+
+    def __init__(self, integrator: Integrator = None, seed: Optional[int] = 0):
+        self.integrator = CoolingIntegrator() if integrator is None else integrator
+
+        # the generator of the nudges of nodes that are on top of each other, seeded so
+        # the layouts are reproducible (None to seed it differently each time)
+        self.random = np.random.default_rng(seed)
+
+    def __getstate__(self):
+        """The generator is not pickled (when sending the engine to other processes),
+        it has to be seeded there (see simulate_chunk)."""
+        return {**self.__dict__, "random": None}
+
+    def get_integrator(self) -> Integrator:
+        """Return the integrator that moves the nodes by the forces."""
+        return self.integrator
+
+    def set_integrator(self, integrator: Integrator):
+        """Set the integrator that moves the nodes by the forces."""
+        self.integrator = integrator
+
+    @abstractmethod
+    def simulate(
+        self,
+        positions: np.ndarray,
+        moving: np.ndarray,
+        structure: Structure,
+        state: np.ndarray = None,
+    ) -> np.ndarray:
+        """Simulate a single step of the forces, returning the new positions of the
+        nodes. Only the moving nodes (and never the root) are moved. The states of the
+        components for the integrator are updated in place (if given)."""
+
+    def _move(
+        self,
+        positions: np.ndarray,
+        forces: np.ndarray,
+        moving: np.ndarray,
+        structure: Structure,
+        state: np.ndarray = None,
+    ) -> np.ndarray:
+        """Return the positions of the moving nodes moved by the forces (using the
+        integrator), or towards their place if they're in the tree layout."""
+        placed = ~np.isnan(structure.targets[:, 0])
+
+        if state is None:
+            components = int(structure.groups.max(initial=-1)) + 1
+            state = self.integrator.initial_state(components)
+
+        moved = self.integrator.integrate(
+            positions, forces * (moving & ~placed)[:, None], structure.groups, state
+        )
+
+        # the places are relative to the root (which doesn't move on its own)
+        if structure.root is not None:
+            eased = moving & placed
+            places = positions[structure.root] + structure.targets[eased]
+            moved[eased] += (places - positions[eased]) * self.easing
+
+        return moved
+
+
+@dataclass
+class Structure:
+    """Arrays derived from the structure of a graph that the array engines use. The
+    nodes are identified by their index in the list of the nodes of the graph."""
+
+    groups: np.ndarray  # the component of each node
+    edges: np.ndarray  # pairs of adjacent nodes (each pair only once)
+    targets: np.ndarray  # the place of each node in the tree layout (or NaN)
+    root: Optional[int]  # the index of the root (or None)
+
+    @classmethod
+    def from_graph(cls, graph: DrawableGraph) -> Structure:
+        """Calculate the arrays of the given graph."""
+        nodes = graph.get_nodes()
+        index = {node: i for i, node in enumerate(nodes)}
+
+        # nodes from different components don't repel
+        groups = np.zeros(len(nodes), dtype=np.int64)
+        for i, component in enumerate(graph.get_components()):
+            groups[[index[node] for node in component]] = i
+
+        # each pair of adjacent nodes attracts only once (regardless of the direction)
+        pairs = set()
+        for vertex in graph.get_vertices():
+            i, j = index[vertex[0]], index[vertex[1]]
+
+            if i != j:
+                pairs.add((i, j) if i < j else (j, i))
+
+        edges = np.array(sorted(pairs), dtype=np.int64).reshape(-1, 2)
+
+        # the places of the nodes reachable from the root (relative to it)
+        targets = np.full((len(nodes), 2), np.nan)
+
+        root = graph.get_root()
+        if root is not None:
+            root = index[root]
+
+            for node, position in graph.get_tree_layout().items():
+                targets[index[node]] = position.x, position.y
+
+        return cls(groups, edges, targets, root)
+
+    def subset(self, indexes: np.ndarray) -> Structure:
+        """Return the structure of the nodes at the given indexes (which have to form
+        whole components), which are renumbered in the given order."""
+        renumbered = np.full(len(self.groups), -1, dtype=np.int64)
+        renumbered[indexes] = np.arange(len(indexes))
+
+        # vertices are within components, so either both of the nodes are kept or none
+        edges = renumbered[self.edges]
+        edges = edges[edges[:, 0] != -1]
+
+        root = None
+        if self.root is not None and renumbered[self.root] != -1:
+            root = int(renumbered[self.root])
+
+        return Structure(self.groups[indexes], edges, self.targets[indexes], root)
+
+
+class ArrayEngine(ForceEngine):
+    """An engine that keeps the positions of the nodes and the forces acting on them
+    in numpy arrays, calculating all of the forces using batched array operations.
+
+    The simulation itself (see simulate) only works with the arrays, so it can run
+    outside of the thread that owns the graph (see Simulation). The repulsion is
+    exact (all pairs of nodes of each component are compared, a block at a time)."""
+
+    # the memory of the temporary arrays of a block of the repulsion (in bytes) and
+    # roughly how much of it each compared pair of nodes takes (6 arrays of them)
+    block_memory = 32 * 2 ** 20
+    pair_memory = 48
+
+    def simulate(
+        self,
+        positions: np.ndarray,
+        moving: np.ndarray,
+        structure: Structure,
+        state: np.ndarray = None,
+    ) -> np.ndarray:
+        # nodes of the tree layout aren't moved by the forces, so they're only
+        # calculated for the components that contain some other nodes
+        free = np.isnan(structure.targets[:, 0])
+        forced = np.isin(structure.groups, structure.groups[free])
+
+        if forced.all():
+            forces = self.__forces(positions, structure)
+        else:
+            forces = np.zeros_like(positions)
+
+            if forced.any():
+                indexes = np.flatnonzero(forced)
+                subset = structure.subset(indexes)
+                forces[indexes] = self.__forces(positions[indexes], subset)
+
+        return self._move(positions, forces, moving, structure, state)
+
+    def __forces(self, positions: np.ndarray, structure: Structure) -> np.ndarray:
+        """Return the forces acting on the nodes."""
+        forces, coincident = self._repulsion(positions, structure.groups)
+
+        # if nodes are on top of each other, nudge them slightly
+        forces[coincident] += self.random.random((int(coincident.sum()), 2))
+
+        return forces + self.__attraction(positions, structure)
+
+    def _repulsion(
+        self, positions: np.ndarray, groups: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the repulsion forces acting on the nodes (given their positions and
+        components) and which of them are on top of other nodes."""
+        count = len(positions)
+
+        # the nodes are sorted by their components, so each node is only compared to
+        # the nodes of its own component (from lower to upper in the sorted order)
+        order = np.argsort(groups, kind="stable")
+        groups = groups[order]
+        x, y = positions[order, 0], positions[order, 1]
+
+        lower = np.searchsorted(groups, groups, side="left")
+        upper = np.searchsorted(groups, groups, side="right")
+
+        forces = np.zeros((count, 2))
+        coincident = np.zeros(count, dtype=bool)
+
+        # the number of pairs compared in a block, so their temporary arrays fit
+        budget = max(1, self.block_memory // self.pair_memory)
+
+        start = 0
+        while start < count:
+            # as many rows as fit, given the components that they span
+            rows, first = count - start, lower[start]
+            while True:
+                stop = start + rows
+                span = upper[stop - 1] - first
+
+                if rows * span <= budget or rows == 1:
+                    break
+
+                rows = max(1, min(rows - 1, budget // span))
+
+            block, columns = slice(start, stop), slice(first, upper[stop - 1])
+            rows = np.arange(start, stop)
+
+            # vectors from the nodes of the block to the nodes of their components
+            dx = x[None, columns] - x[block, None]
+            dy = y[None, columns] - y[block, None]
+            squared = dx * dx + dy * dy
+
+            # a node doesn't repel itself, nor nodes from other components
+            affected = groups[block, None] == groups[None, columns]
+            affected[rows - start, rows - first] = False
+
+            coincident[block] = (affected & (squared == 0)).any(axis=1)
+            affected &= squared != 0
+
+            distances = np.sqrt(np.where(affected, squared, 1))
+            magnitudes = np.where(affected, self.repulsion(distances) / distances, 0)
+
+            forces[block, 0] -= (dx * magnitudes).sum(axis=1)
+            forces[block, 1] -= (dy * magnitudes).sum(axis=1)
+
+            start = stop
+
+        # back to the original order of the nodes
+        unsorted_forces = np.empty_like(forces)
+        unsorted_forces[order] = forces
+        unsorted_coincident = np.empty_like(coincident)
+        unsorted_coincident[order] = coincident
+
+        return unsorted_forces, unsorted_coincident
+
+    def __attraction(self, positions: np.ndarray, structure: Structure) -> np.ndarray:
+        """Return the attraction forces acting on the nodes."""
+        forces = np.zeros_like(positions)
+
+        n1, n2 = structure.edges[:, 0], structure.edges[:, 1]
+
+        delta = positions[n2] - positions[n1]
+        distances = np.hypot(delta[:, 0], delta[:, 1])
+
+        # nodes on top of each other are nudged instead
+        apart = distances != 0
+        n1, n2, delta, distances = n1[apart], n2[apart], delta[apart], distances[apart]
+
+        # the attraction along the unit vector from n1 to n2
+        vectors = delta / distances[:, None] * self.attraction(distances)[:, None]
+
+        for axis in (0, 1):
+            forces[:, axis] -= np.bincount(n1, vectors[:, axis], len(positions))
+            forces[:, axis] += np.bincount(n2, vectors[:, axis], len(positions))
+
+        return forces
+
+
+class BarnesHutEngine(ArrayEngine):
+    """An engine that approximates the repulsion using a quadtree (the Barnes–Hut
+    algorithm), taking O(n log n) time instead of quadratic.
+
+    The accuracy is controlled by theta: two cells of the quadtree act as single points
+    if the sum of their widths is smaller than theta times their distance. The smaller
+    it is, the more accurate (and slower) the simulation is. With 0, only pairs of
+    single points are accepted, so the repulsion is exact (up to rounding errors)."""
+
+    def __init__(
+        self, theta: float = 0.9, integrator: Integrator = None, seed: Optional[int] = 0
+    ):
+        super().__init__(integrator, seed)
+        self.theta = theta
+
+    def get_theta(self) -> float:
+        """Return the accuracy of the approximation."""
+        return self.theta
+
+    def set_theta(self, theta: float):
+        """Set the accuracy of the approximation."""
+        self.theta = theta
+
+    def _repulsion(
+        self, positions: np.ndarray, groups: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        return QuadTree(positions, groups).repulsion(self.repulsion, self.theta)
+
+
+class QuadTree:
+    """A quadtree of points, used for approximating the repulsion between them. Each
+    point belongs to a group (like a component of a graph) and points from different
+    groups are in different trees, so they don't affect each other.
+
+    The tree is stored by levels (the cell of each point, the number of points and
+    their center of mass for each cell and the children of each cell), so it can be
+    both built and traversed for all of the points at once using numpy.
+
+    Each group has its own frame (the square that its points fit into), so the
+    resolution of the tree doesn't depend on how far apart the groups are."""
+
+    max_depth = 16
+
+    def __init__(self, positions: np.ndarray, groups: np.ndarray):
+        self.positions = positions
+
+        # renumber the groups, so they are 0, 1, 2...
+        _, groups = np.unique(groups, return_inverse=True)
+        groups = groups.reshape(-1).astype(np.int64)
+        count = int(groups.max(initial=-1)) + 1
+
+        # the square that the points of each of the groups fit into
+        lower = np.full((count, 2), np.inf)
+        upper = np.full((count, 2), -np.inf)
+        np.minimum.at(lower, groups, positions)
+        np.maximum.at(upper, groups, positions)
+
+        self.sizes = (upper - lower).max(axis=1, initial=0)
+        self.sizes[self.sizes == 0] = 1
+
+        # the coordinates of the points in a grid of the cells of the deepest level
+        cells = 2 ** self.max_depth
+        grid = (positions - lower[groups]) / self.sizes[groups, None] * cells
+        grid = np.clip(np.floor(grid).astype(np.int64), 0, cells - 1)
+
+        self.point_cells: List[np.ndarray] = []  # level -> cell of each point
+        self.counts: List[np.ndarray] = []  # level -> number of points in each cell
+        self.center_xs: List[np.ndarray] = []  # level -> center of mass of each cell
+        self.center_ys: List[np.ndarray] = []
+        self.cell_groups: List[np.ndarray] = []  # level -> group of each cell
+
+        # level -> children of each of its cells (in the CSR format)
+        self.child_offsets: List[np.ndarray] = []
+        self.children: List[np.ndarray] = []
+
+        for depth in range(self.max_depth + 1):
+            shift = self.max_depth - depth
+            x, y = grid[:, 0] >> shift, grid[:, 1] >> shift
+            keys = (((groups << depth) | x) << depth) | y
+
+            _, first, point_cells = np.unique(
+                keys, return_index=True, return_inverse=True
+            )
+            point_cells = point_cells.reshape(-1)
+
+            counts = np.bincount(point_cells)
+
+            if depth != 0:
+                parents = self.point_cells[-1][first]
+
+                previous = len(self.counts[-1])  # number of cells of the previous level
+
+                offsets = np.zeros(previous + 1, dtype=np.int64)
+                np.cumsum(np.bincount(parents, minlength=previous), out=offsets[1:])
+
+                self.child_offsets.append(offsets)
+                self.children.append(np.argsort(parents, kind="stable"))
+
+            self.point_cells.append(point_cells)
+            self.cell_groups.append(groups[first])
+            self.counts.append(counts)
+            self.center_xs.append(np.bincount(point_cells, positions[:, 0]) / counts)
+            self.center_ys.append(np.bincount(point_cells, positions[:, 1]) / counts)
+
+            # stop once every point has its own cell
+            if counts.max() == 1:
+                break
+
+    def repulsion(
+        self, function: Callable[[np.ndarray], np.ndarray], theta: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the repulsion forces acting on the points (given the size of the
+        force between two points at some distance) and which of them are on top of
+        other points (and therefore have no meaningful direction to be repelled in).
+
+        The tree is traversed by pairs of cells of the same level: if two cells are far
+        enough apart, all of the points of one are repelled from the center of mass of
+        the other by the force acting on its own center of mass. Otherwise, the pair is
+        replaced by the pairs of their children. Each pair is only visited once and
+        the forces of the cells are added to their points at the end."""
+        depths = len(self.counts)
+
+        cell_forces = [np.zeros((len(counts), 2)) for counts in self.counts]
+        coincident = np.zeros(len(self.positions), dtype=bool)
+
+        # pairs of cells that repel each other (targets <= sources), starting with the
+        # roots, where each root is paired with itself
+        targets = sources = np.arange(len(self.counts[0]))
+
+        for depth in range(depths):
+            counts = self.counts[depth]
+            x, y = self.center_xs[depth], self.center_ys[depth]
+
+            target_counts, source_counts = counts[targets], counts[sources]
+            dx, dy = x[targets] - x[sources], y[targets] - y[sources]
+            squared = dx * dx + dy * dy
+
+            same = targets == sources
+            single = (target_counts == 1) & (source_counts == 1)
+            last = depth == depths - 1
+
+            # cells far enough apart (or both with a single point) act as single points
+            width = 2 * self.sizes[self.cell_groups[depth][targets]] / 2 ** depth
+            accepted = ~same & (
+                (width * width < theta * theta * squared) | single | last
+            )
+            accepted &= squared != 0
+
+            distances = np.sqrt(squared[accepted])
+            magnitudes = function(distances) / distances
+
+            for axis, delta in enumerate((dx, dy)):
+                vectors = delta[accepted] * magnitudes
+
+                cell_forces[depth][:, axis] += np.bincount(
+                    targets[accepted], vectors * source_counts[accepted], len(counts)
+                ) - np.bincount(
+                    sources[accepted], vectors * target_counts[accepted], len(counts)
+                )
+
+            # on the last level, a cell paired with itself only contains points that are
+            # (almost) on top of each other
+            if last:
+                cells = np.zeros(len(counts), dtype=bool)
+                cells[targets[same & (target_counts > 1)]] = True
+                coincident = cells[self.point_cells[depth]]
+                break
+
+            opened = ~accepted & ~single
+            targets, sources, same = targets[opened], sources[opened], same[opened]
+
+            # replace each of the opened pairs by the pairs of their children
+            offsets = self.child_offsets[depth]
+            target_starts = offsets[targets]
+            target_sizes = offsets[targets + 1] - target_starts
+            source_starts = offsets[sources]
+            source_sizes = offsets[sources + 1] - source_starts
+
+            # the index of each new pair among the pairs of children of its pair
+            sizes = target_sizes * source_sizes
+            starts = np.cumsum(sizes) - sizes
+            indexes = np.arange(sizes.sum()) - np.repeat(starts, sizes)
+
+            target_indexes = np.repeat(target_starts, sizes)
+            source_indexes = np.repeat(source_starts, sizes)
+            source_sizes = np.repeat(source_sizes, sizes)
+
+            children = self.children[depth]
+            targets = children[target_indexes + indexes // source_sizes]
+            sources = children[source_indexes + indexes % source_sizes]
+
+            # children of a cell paired with itself are only paired once
+            kept = ~np.repeat(same, sizes) | (targets <= sources)
+            targets, sources = targets[kept], sources[kept]
+
+        # add the forces of the cells to their points
+        forces = np.zeros_like(self.positions)
+        for depth in range(depths):
+            forces += cell_forces[depth][self.point_cells[depth]]
+
+        return forces, coincident
+
+
+# the engine of a process of the pool of a simulation (see set_chunk_engine)
+chunk_engine: Optional[ArrayEngine] = None
+
+
+def set_chunk_engine(engine: ArrayEngine):
+    """Set the engine that simulates the chunks in this process (the initializer of the
+    processes of the pool), so it's only sent once, not with each of the chunks."""
+    global chunk_engine
+    chunk_engine = engine
+
+
+def simulate_chunk(
+    seed: int,
+    positions: np.ndarray,
+    moving: np.ndarray,
+    structure: Structure,
+    state: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Simulate a step of a chunk of components in another process, returning the new
+    positions and the updated states of its components (since they can't be updated
+    in place). Only the chunk's arrays are sent (with its components numbered from
+    0), and the nudges are generated from the given seed."""
+    chunk_engine.random = np.random.default_rng(seed)
+    return chunk_engine.simulate(positions, moving, structure, state), state
+
+
+class Simulation(Thread):
+    """Runs the simulation of an array engine in a worker thread, so slow steps don't
+    stall the GUI. The graph itself is only touched from the thread that owns it.
+
+    The owner sends commands to the worker (a new structure of the graph, positions of
+    nodes that were moved, a layout to calculate) and the worker publishes the
+    positions after each step to one of two buffers, swapping them afterwards, so the
+    owner always reads a complete snapshot while the worker writes the other one (see
+    synchronize and apply). The worker loop (see run) only waits for the commands and
+    calls process_commands and tick, which can also be called directly instead of
+    starting the thread (like in the tests), making the simulation deterministic.
+
+    Components whose nodes have barely moved for a while fall asleep and are not
+    simulated until one of their nodes is moved (dragged, rotated...) or the component
+    changes. When all of them are asleep, the worker only waits for commands.
+
+    The nodes of different components don't affect each other, so large graphs with
+    more of them are split into chunks of whole components that are simulated in
+    parallel by a process pool, which is shut down when the worker is stopped (see
+    stop). The components themselves are kept apart after each step, using only their
+    centroids and radii (see __separate)."""
+
+    timestep = 0.017  # the real time that a single step simulates (in seconds)
+    max_lag = 0.1  # at most this much real time is caught up on (the rest is dropped)
+
+    # the number of processes that simulate the chunks and the minimal number of awake
+    # nodes for which the simulation is split into them (a step of 5000 nodes takes
+    # around 35 ms, while sending the chunks to the processes and back takes 5-10 ms)
+    processes = os.cpu_count() or 1
+    parallel_minimum = 5000
+
+    # a component falls asleep after its nodes moved by less than this (the average of
+    # the squared distances) for the given number of consecutive steps
+    sleep_energy = 1e-4
+    sleep_steps = 30
+
+    # the space kept between the components (their nodes within the given distance
+    # from their centroids) and the part of their overlap they move apart each step
+    component_gap = 6
+    separation = 0.5
+
+    def __init__(self, engine: ArrayEngine):
+        super().__init__(daemon=True)
+
+        self.commands: Queue = Queue()
+        self.lock = Lock()  # guards the front buffer (and the information about it)
+
+        # the state of the worker thread (only used by it)
+        self.engine = engine
+        self.running = True
+        self.stopped = False
+        self.structure_id = None
+        self.structure: Optional[Structure] = None
+        self.positions: Optional[np.ndarray] = None
+        self.moving: Optional[np.ndarray] = None
+        self.back: Optional[np.ndarray] = None
+
+        self.awake: Optional[np.ndarray] = None  # whether the component is awake
+        self.calm: Optional[np.ndarray] = None  # for how many steps it barely moved
+        self.state: Optional[np.ndarray] = None  # its state for the integrator
+        self.active: Optional[np.ndarray] = None  # the nodes of the awake components
+        self.active_structure: Optional[Structure] = None
+
+        # chunks of the awake components (their indexes among the active nodes, their
+        # structures with the components numbered from 0 and the original numbers of
+        # the components) that are simulated in parallel (or None)
+        self.chunks: Optional[List[Tuple[np.ndarray, Structure, np.ndarray]]] = None
+        self.pool: Optional[ProcessPoolExecutor] = None
+
+        # the published snapshot (the id of its structure and the last command that it
+        # reflects, so the outdated ones can be ignored)
+        self.front: Optional[np.ndarray] = None
+        self.front_structure = None
+        self.front_command = 0
+        self.front_step = 0
+
+        self.published_step = 0  # the step of the last published snapshot (worker)
+        self.last_command = 0  # the last executed command (worker)
+        self.accumulated = 0.0  # the real time that wasn't simulated yet (worker)
+        self.simulating = False  # whether there was something to simulate (worker)
+
+        # the state of the owner thread (only used by it)
+        self.sent_engine = engine  # the last engine sent to the worker
+        self.graph: Optional[DrawableGraph] = None
+        self.version = None
+        self.nodes: List[DrawableNode] = []  # the nodes of the current structure
+        self.index: Dict[DrawableNode, int] = {}
+        self.sent_nodes: Dict[int, List[DrawableNode]] = {}  # of the sent structures
+        self.dragged: List[int] = []
+        self.sent_structure = 0  # the id of the last sent structure
+        self.sent_command = 0  # the id of the last sent command
+        self.required_command = 0  # the last command a snapshot has to reflect
+        self.applied_step = 0  # the step of the last applied snapshot
+
+    def __send(self, name: str, *args, required: bool = True):
+        """Send a command to the worker. If it's required, snapshots that don't
+        reflect it yet won't be applied."""
+        self.sent_command += 1
+        self.commands.put((self.sent_command, name, args))
+
+        if required:
+            self.required_command = self.sent_command
+
+    def get_engine(self) -> ArrayEngine:
+        """Return the engine that simulates the forces."""
+        return self.sent_engine
+
+    def set_engine(self, engine: ArrayEngine):
+        """Set the engine that simulates the forces (used from the next step on)."""
+        self.sent_engine = engine
+        self.__send("engine", engine, required=False)
+
+    def set_running(self, value: bool):
+        """Pause/resume the simulation. When resumed, the structure is sent again (with
+        all of the components awake), since the nodes could have been moved."""
+        self.__send("running", value)
+
+        if value:
+            self.version = None
+            self.index = {}
+
+    def stop(self):
+        """Stop the worker (called by the owner when it's closed), shutting down the
+        process pool. Waits for the worker to finish the step it's simulating."""
+        self.__send("stop", required=False)
+
+        if self.is_alive():
+            self.join()
+
+    def synchronize(self, graph: DrawableGraph):
+        """Send the changes of the graph to the worker (called by the owner of the
+        graph periodically). The structure is sent if the graph changed and the
+        positions of the dragged nodes are sent each time (since they are only moved
+        by the mouse)."""
+        if graph is not self.graph or graph.get_version() != self.version:
+            self.graph, self.version = graph, graph.get_version()
+
+            # the previous index of each of the nodes (or -1 for new nodes), so the
+            # components that didn't change can stay asleep
+            nodes = list(graph.get_nodes())
+            previous = [self.index.get(node, -1) for node in nodes]
+            previous = np.array(previous, dtype=np.int64)
+
+            self.nodes = nodes
+            self.index = {node: i for i, node in enumerate(self.nodes)}
+            self.dragged = []
+
+            # the snapshots of the previous structures can still be applied to their
+            # nodes, so the structure isn't required (if the graph keeps changing,
+            # the worker might never publish a snapshot of the latest one)
+            self.sent_structure += 1
+            self.sent_nodes[self.sent_structure] = nodes
+            self.__send(
+                "structure",
+                self.sent_structure,
+                Structure.from_graph(graph),
+                self.__get_positions(self.nodes),
+                previous,
+                required=False,
+            )
+
+        dragged = [i for i, node in enumerate(self.nodes) if node.is_dragged()]
+
+        if len(dragged) != 0 or len(self.dragged) != 0:
+            positions = self.__get_positions([self.nodes[i] for i in dragged])
+
+            # only the change of the dragged nodes has to be reflected in the snapshot
+            # (the dragged nodes themselves are not applied)
+            released = sorted(set(self.dragged) - set(dragged))
+            self.__send(
+                "drag", dragged, positions, released, required=dragged != self.dragged
+            )
+            self.dragged = dragged
+
+    def lay_out(self, graph: DrawableGraph, layout):
+        """Move the nodes of the graph to the positions calculated by the layout (an
+        object whose layout method returns the positions of a structure, like
+        MultilevelLayout) in the worker, so a slow layout doesn't stall the owner. The
+        positions are published like the ones of a step, even when not running."""
+        self.synchronize(graph)
+        self.__send("layout", layout)
+
+    def move(self, nodes: Iterable[DrawableNode]):
+        """Send the positions of nodes that were moved by the owner to the worker."""
+        indexes = [self.index[node] for node in nodes if node in self.index]
+        positions = self.__get_positions([self.nodes[i] for i in indexes])
+
+        self.__send("move", indexes, positions)
+
+    def apply(self) -> bool:
+        """Apply the latest snapshot to the nodes of the graph (called by the owner of
+        the graph), returning True if there was a new one. Dragged nodes are skipped and
+        so are the nodes that were removed since the structure of the snapshot was
+        sent (the snapshot is applied to the nodes of its structure)."""
+        with self.lock:
+            nodes = self.sent_nodes.get(self.front_structure)
+
+            if (
+                self.front_step == self.applied_step
+                or nodes is None
+                or self.front_command < self.required_command
+            ):
+                return False
+
+            self.applied_step = self.front_step
+            structure = self.front_structure
+            positions = self.front.tolist()
+
+        # the worker won't publish snapshots of the older structures anymore
+        for old in [old for old in self.sent_nodes if old < structure]:
+            del self.sent_nodes[old]
+
+        for node, (x, y) in zip(nodes, positions):
+            if node in self.index and not node.is_dragged():
+                node.set_position(Vec2(x, y))
+
+        return True
+
+    @staticmethod
+    def __get_positions(nodes: Sequence[DrawableNode]) -> np.ndarray:
+        """Return the positions of the nodes as an array."""
+        positions = [tuple(node.get_position()) for node in nodes]
+        return np.array(positions, dtype=float).reshape(-1, 2)
+
+    def __set_structure(self, structure: Structure, previous: np.ndarray):
+        """Set a new structure of the graph (given the previous index of each of its
+        nodes). A component stays asleep if it consists of the same nodes as some
+        sleeping component did, with the same number of vertices and the same root."""
+        components = int(structure.groups.max(initial=-1)) + 1
+        awake = np.ones(components, dtype=bool)
+
+        if self.structure is not None and len(self.structure.groups) * components != 0:
+            groups, old_groups = structure.groups, self.structure.groups
+            known = previous != -1
+
+            # the previous component of each of the nodes (-1 for the new ones)
+            old = np.where(known, old_groups[np.where(known, previous, 0)], -1)
+
+            # the new component has to only have nodes from a single old one...
+            lowest = np.full(components, len(old_groups))
+            highest = np.full(components, -1)
+            np.minimum.at(lowest, groups, old)
+            np.maximum.at(highest, groups, old)
+            single = (lowest == highest) & (lowest != -1)
+            old_component = np.where(single, lowest, 0)
+
+            # ...which was asleep and had the same number of nodes and vertices
+            old_count = len(self.awake)
+            sizes = np.bincount(groups, minlength=components)
+            old_sizes = np.bincount(old_groups, minlength=old_count)
+            vertices = np.bincount(groups[structure.edges[:, 0]], minlength=components)
+            old_vertices = np.bincount(
+                old_groups[self.structure.edges[:, 0]], minlength=old_count
+            )
+
+            awake = ~(
+                single
+                & ~self.awake[old_component]
+                & (sizes == old_sizes[old_component])
+                & (vertices == old_vertices[old_component])
+            )
+
+            # the components of the old and the new root wake up if the root changed
+            old_root = self.structure.root
+            new_root = None if structure.root is None else previous[structure.root]
+
+            if old_root != new_root:
+                if structure.root is not None:
+                    awake[groups[structure.root]] = True
+
+                if old_root is not None and old_root in previous:
+                    awake[groups[int(np.flatnonzero(previous == old_root)[0])]] = True
+
+        self.structure = structure
+        self.awake = awake
+        self.calm = np.zeros(components, dtype=np.int64)
+        self.state = self.engine.get_integrator().initial_state(components)
+        self.__update_active()
+
+    def __wake(self, indexes: Sequence[int]):
+        """Wake up the components of the nodes at the given indexes."""
+        if len(indexes) == 0:
+            return
+
+        components = np.unique(self.structure.groups[indexes])
+        self.calm[components] = 0
+        self.state[components] = self.engine.get_integrator().initial_state(
+            len(components)
+        )
+
+        if not self.awake[components].all():
+            self.awake[components] = True
+            self.__update_active()
+
+    def __update_active(self):
+        """Recalculate the nodes of the awake components (and their structure)."""
+        self.active = np.flatnonzero(self.awake[self.structure.groups])
+        self.active_structure = self.structure.subset(self.active)
+        self.chunks = None
+
+        groups = self.active_structure.groups
+        components = np.flatnonzero(np.bincount(groups, minlength=len(self.awake)))
+
+        if (
+            self.processes == 1
+            or len(self.active) < self.parallel_minimum
+            or len(components) == 1
+        ):
+            return
+
+        # assign the largest components to the smallest chunks first
+        sizes = np.bincount(groups)
+        chunks = [(0, i) for i in range(min(self.processes, len(components)))]
+        chunk_of = np.zeros(len(sizes), dtype=np.int64)
+
+        heapify(chunks)
+        for component in components[np.argsort(-sizes[components])].tolist():
+            size, chunk = chunks[0]
+            chunk_of[component] = chunk
+            heapreplace(chunks, (size + sizes[component], chunk))
+
+        self.chunks = []
+        for chunk in range(len(chunks)):
+            indexes = np.flatnonzero(chunk_of[groups] == chunk)
+            structure = self.active_structure.subset(indexes)
+
+            # only the states of the chunk's components are sent, so they're renumbered
+            components, renumbered = np.unique(structure.groups, return_inverse=True)
+            structure = replace(structure, groups=renumbered.reshape(-1))
+
+            self.chunks.append((indexes, structure, components))
+
+    def __execute(self, command: Tuple[int, str, tuple]):
+        """Execute a command in the worker thread."""
+        command_id, name, args = command
+
+        if name == "running":
+            self.running = args[0]
+
+        elif name == "stop":
+            self.stopped = True
+
+        elif name == "engine":
+            self.engine = args[0]
+
+            # the processes of the pool have the previous engine
+            self.__shut_down_pool()
+
+            if self.structure is not None:
+                integrator = self.engine.get_integrator()
+                self.state = integrator.initial_state(len(self.awake))
+
+        elif name == "structure":
+            self.structure_id, structure, positions, previous = args
+
+            # the nodes that were already simulated keep their positions, since the
+            # owner might not have applied them yet (the ones it moved were sent)
+            if self.positions is not None:
+                known = np.flatnonzero(previous != -1)
+                positions[known] = self.positions[previous[known]]
+
+            self.positions = positions
+            self.moving = np.ones(len(self.positions), dtype=bool)
+            self.__set_structure(structure, previous)
+
+        elif name == "drag" and self.structure is not None:
+            indexes, positions, released = args
+
+            # the dragged nodes are only moved by the mouse
+            self.moving[:] = True
+            self.moving[indexes] = False
+            self.positions[indexes] = positions
+
+            self.__wake(indexes + released)
+
+        elif name == "move" and self.structure is not None:
+            indexes, positions = args
+
+            self.positions[indexes] = positions
+            self.__wake(indexes)
+
+        elif name == "layout" and self.structure is not None:
+            if len(self.positions) == 0:
+                return
+
+            # the dragged nodes stay where the mouse moved them
+            positions = args[0].layout(self.structure)
+            positions[~self.moving] = self.positions[~self.moving]
+
+            self.positions = positions
+            self.__wake(np.arange(len(positions)))
+            self.__publish(command_id)
+
+    def __step(self):
+        """Simulate a single step of the awake components, putting the components that
+        barely moved for long enough to sleep."""
+        previous = self.positions[self.active]
+        moving = self.moving[self.active]
+
+        positions = None
+        if self.chunks is not None:
+            positions = self.__step_chunks(previous, moving)
+
+        if positions is None:
+            positions = self.engine.simulate(
+                previous, moving, self.active_structure, self.state
+            )
+
+        self.positions[self.active] = positions
+
+        self.__separate()
+        positions = self.positions[self.active]
+
+        # the average of the squared distances that the nodes of the components moved
+        groups = self.active_structure.groups
+        distances = ((positions - previous) ** 2).sum(axis=1)
+        sizes = np.maximum(np.bincount(groups, minlength=len(self.awake)), 1)
+        energy = np.bincount(groups, distances, minlength=len(self.awake)) / sizes
+
+        self.calm = np.where(energy < self.sleep_energy, self.calm + 1, 0)
+
+        asleep = self.awake & (self.calm >= self.sleep_steps)
+        if asleep.any():
+            self.awake &= ~asleep
+            self.__update_active()
+
+    def __separate(self):
+        """Move the awake components that overlap other components apart. Each of them
+        is a disc around its centroid (containing all of its nodes, plus half of the
+        gap) and each pair of overlapping discs is moved apart by a part of the overlap,
+        the smaller component moving more. Components with dragged nodes or the root,
+        like the sleeping ones, don't move (but the others move away from them)."""
+        groups, count = self.structure.groups, len(self.awake)
+
+        if count < 2:
+            return
+
+        movable = self.awake.copy()
+        movable[groups[~self.moving]] = False
+
+        if self.structure.root is not None:
+            movable[groups[self.structure.root]] = False
+
+        if not movable.any():
+            return
+
+        sizes = np.bincount(groups, minlength=count)
+        sums = [np.bincount(groups, self.positions[:, axis], count) for axis in (0, 1)]
+        centroids = np.stack(sums, axis=1) / sizes[:, None]
+
+        squared = ((self.positions - centroids[groups]) ** 2).sum(axis=1)
+        radii = np.zeros(count)
+        np.maximum.at(radii, groups, squared)
+        radii = np.sqrt(radii) + self.component_gap / 2
+
+        # the pairs whose discs overlap along the x axis (sweeping them by their left
+        # ends), of which only the ones that overlap and can move are kept
+        left, right = centroids[:, 0] - radii, centroids[:, 0] + radii
+        order = np.argsort(left, kind="stable")
+        ends = np.searchsorted(left[order], right[order], side="right")
+        counts = np.maximum(ends - np.arange(1, count + 1), 0)
+
+        first = np.repeat(np.arange(count), counts)
+        starts = np.repeat(np.cumsum(counts) - counts, counts)
+        second = first + 1 + np.arange(counts.sum()) - starts
+        i, j = order[first], order[second]
+
+        delta = centroids[j] - centroids[i]
+        distances = np.hypot(delta[:, 0], delta[:, 1])
+        overlap = radii[i] + radii[j] - distances
+
+        kept = (overlap > 0) & (movable[i] | movable[j])
+        i, j, delta = i[kept], j[kept], delta[kept]
+        distances, overlap = distances[kept], overlap[kept]
+
+        if len(i) == 0:
+            return
+
+        # components with the same centroid move apart in a random direction
+        same = distances == 0
+        delta[same] = self.engine.random.normal(size=(int(same.sum()), 2))
+        directions = delta / np.hypot(delta[:, 0], delta[:, 1])[:, None]
+
+        # the smaller component of the pair moves more (the fixed one doesn't at all)
+        share_i = np.where(movable[i], sizes[j], 0)
+        share_j = np.where(movable[j], sizes[i], 0)
+        push = (overlap * self.separation / (share_i + share_j))[:, None] * directions
+
+        shifts = np.zeros((count, 2))
+        for axis in (0, 1):
+            shifts[:, axis] -= np.bincount(i, push[:, axis] * share_i, count)
+            shifts[:, axis] += np.bincount(j, push[:, axis] * share_j, count)
+
+        self.positions += shifts[groups]
+
+    def __step_chunks(
+        self, previous: np.ndarray, moving: np.ndarray
+    ) -> Optional[np.ndarray]:
+        """Simulate a single step of the chunks in the process pool, returning the new
+        positions of the active nodes (or None if the pool can't be used, like when the
+        interpreter is shutting down)."""
+        if self.pool is None:
+            # forking a process with threads is not safe, so they are spawned (and the
+            # engine is only sent to them once, when they start)
+            self.pool = ProcessPoolExecutor(
+                self.processes,
+                mp_context=get_context("spawn"),
+                initializer=set_chunk_engine,
+                initargs=(self.engine,),
+            )
+
+        # each of the chunks gets its own seed, so they nudge the nodes differently
+        seeds = self.engine.random.integers(2 ** 63, size=len(self.chunks)).tolist()
+
+        futures = []
+        try:
+            for seed, (indexes, structure, components) in zip(seeds, self.chunks):
+                futures.append(
+                    self.pool.submit(
+                        simulate_chunk,
+                        seed,
+                        previous[indexes],
+                        moving[indexes],
+                        structure,
+                        self.state[components],
+                    )
+                )
+
+            positions = np.empty_like(previous)
+            for (indexes, _, components), future in zip(self.chunks, futures):
+                positions[indexes], self.state[components] = future.result()
+        except RuntimeError:
+            # the pool was shut down (or broken), so the step is simulated here
+            for future in futures:
+                future.cancel()
+
+            return None
+
+        return positions
+
+    def __shut_down_pool(self):
+        """Shut down the process pool (if there is one). There are no chunks waiting in
+        it, since each step waits for all of its chunks (see __step_chunks)."""
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def __publish(self, command: int):
+        """Publish the positions (reflecting the commands up to the given one) to the
+        back buffer and swap it with the front one."""
+        if self.back is None or self.back.shape != self.positions.shape:
+            self.back = np.empty_like(self.positions)
+        np.copyto(self.back, self.positions)
+
+        self.published_step += 1
+
+        with self.lock:
+            self.front, self.back = self.back, self.front
+            self.front_structure = self.structure_id
+            self.front_command = command
+            self.front_step = self.published_step
+
+    def process_commands(self):
+        """Execute the commands that were sent to the worker (without waiting)."""
+        while True:
+            try:
+                self.__execute_command(self.commands.get_nowait())
+            except Empty:
+                return
+
+    def __execute_command(self, command: Tuple[int, str, tuple]):
+        """Execute the command, remembering that it was the last one."""
+        self.__execute(command)
+        self.last_command = command[0]
+
+    def __is_simulating(self) -> bool:
+        """Return True if there is something to simulate, else False."""
+        return self.running and self.structure is not None and len(self.active) != 0
+
+    def tick(self, elapsed: float) -> bool:
+        """Simulate the steps for the given real time (that elapsed since the previous
+        tick) and publish the positions, returning True if it did.
+
+        The steps are simulated at a fixed rate (one for each timestep of real time),
+        so the speed of the layout doesn't depend on how often the positions are read.
+        The real time that wasn't simulated yet is accumulated (only when there is
+        something to simulate) and if the worker falls behind (like when a command
+        takes long), it simulates more steps before publishing the positions, as long
+        as it takes at most a timestep. The time it can't catch up on (over max_lag or
+        when the steps themselves are too slow) is dropped. Nothing is simulated while
+        there are commands waiting."""
+        if self.simulating:
+            self.accumulated = min(self.accumulated + elapsed, self.max_lag)
+
+        self.simulating = self.__is_simulating()
+
+        if not self.simulating:
+            return False
+
+        if self.accumulated < self.timestep or not self.commands.empty():
+            return False
+
+        start = perf_counter()
+        while self.accumulated >= self.timestep and len(self.active) != 0:
+            self.__step()
+            self.accumulated -= self.timestep
+
+            if perf_counter() - start >= self.timestep:
+                break
+
+        self.accumulated %= self.timestep
+
+        self.__publish(self.last_command)
+        return True
+
+    def run(self):
+        """The loop of the worker thread: execute the commands and simulate the steps,
+        publishing the positions (see tick). It waits for the commands until the next
+        step is due (indefinitely if there is nothing to simulate) and ends when the
+        worker is stopped, shutting down the process pool."""
+        clock = perf_counter()
+
+        while not self.stopped:
+            now = perf_counter()
+            elapsed, clock = now - clock, now
+
+            if self.tick(elapsed):
+                continue
+
+            try:
+                timeout = None
+                if self.simulating:
+                    timeout = max(self.timestep - self.accumulated, 0)
+
+                self.__execute_command(self.commands.get(timeout=timeout))
+            except Empty:
+                pass
+
+        self.__shut_down_pool()
@@ -4,8 +4,14 @@ from __future__ import annotations
 
 from abc import *
 from ast import literal_eval
-from collections import defaultdict
-from math import radians, pi
+from bisect import bisect_right, insort
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from dataclasses import replace
+from itertools import chain
+from math import radians, pi, hypot, sin, cos, isfinite
+
+import numpy as np
 
 from grafatko.color import *
 from grafatko.animation import *
@@ -16,7 +22,12 @@ class Node:
     """A class for working with nodes of a graph."""
 
     def __init__(self, label=None):
-        self.adjacent: Set[Vertex] = set()
+        # a dictionary of vertices from this node, indexed by the nodes they go to
+        self.adjacent: Dict[Node, Vertex] = {}
+
+        # a dictionary of vertices to this node, indexed by the nodes they go from
+        self.incoming: Dict[Node, Vertex] = {}
+
         self.label = label
 
     def get_label(self) -> Optional[str]:
@@ -31,25 +42,45 @@ class Node:
         if self.label is not None and len(self.label) == 0:
             self.label = None
 
-    def get_adjacent_vertices(self) -> Set[Vertex]:
-        """Returns a set of vertices adjacent to this one."""
-        return self.adjacent
+    def get_adjacent_vertices(self) -> ValuesView[Vertex]:
+        """Returns a view of vertices adjacent to this one."""
+        return self.adjacent.values()
+
+    def get_adjacent_nodes(self) -> KeysView[Node]:
+        """Returns a (set-like) view of nodes adjacent to this one."""
+        return self.adjacent.keys()
+
+    def get_incoming_vertices(self) -> ValuesView[Vertex]:
+        """Returns a view of vertices that go to this node."""
+        return self.incoming.values()
+
+    def get_incoming_nodes(self) -> KeysView[Node]:
+        """Returns a (set-like) view of nodes that this node is adjacent from."""
+        return self.incoming.keys()
 
-    def get_adjacent_nodes(self) -> Set[Node]:
-        """Returns a list of nodes adjacent to this one."""
-        return {v[1] for v in self.adjacent}
+    def get_vertex(self, node: Node) -> Optional[Vertex]:
+        """Return the vertex from this node to the specified node (or None)."""
+        return self.adjacent.get(node)
 
     def is_adjacent_to(self, node: Node) -> bool:
         """Return True if this node is adjacent to the specified node."""
-        return node in self.get_adjacent_nodes()
+        return node in self.adjacent
 
     def _remove_adjacent_node(self, node: Node):
         """Remove an adjacent node (if it's there)."""
-        self.adjacent = {v for v in self.adjacent if v[1] is not node}
+        self.adjacent.pop(node, None)
 
     def _add_adjacent_vertex(self, vertex: Vertex):
         """Add an adjacent vertex."""
-        self.adjacent.add(vertex)
+        self.adjacent[vertex.node_to] = vertex
+
+    def _remove_incoming_node(self, node: Node):
+        """Remove a node that this node is adjacent from (if it's there)."""
+        self.incoming.pop(node, None)
+
+    def _add_incoming_vertex(self, vertex: Vertex):
+        """Add a vertex that goes to this node."""
+        self.incoming[vertex.node_from] = vertex
 
 
 class Vertex:
@@ -97,69 +128,603 @@ class Vertex:
         return self[0] is self[1]
 
 
+class Components:
+    """A class for keeping track of the weakly connected components of a graph.
+
+    Components are merged using union-find when vertices are added. When a vertex or
+    a node is removed, the component is only marked as dirty and gets rebuilt (from
+    the vertices of its own nodes) the next time it's queried."""
+
+    def __init__(self):
+        self.parent: Dict[Node, Node] = {}
+        self.members: Dict[Node, Set[Node]] = {}  # root of a component -> its nodes
+
+        self.dirty: Set[Node] = set()  # roots of components that might have split
+        self.removed: Set[Node] = set()  # removed nodes that are still in the forest
+
+    def __find(self, node: Node) -> Node:
+        """Return the root of the component of the node (compressing the path)."""
+        root = node
+        while self.parent[root] is not root:
+            root = self.parent[root]
+
+        while self.parent[node] is not root:
+            self.parent[node], node = root, self.parent[node]
+
+        return root
+
+    def __union(self, n1: Node, n2: Node):
+        """Merge the components of the two nodes (the smaller into the larger one)."""
+        r1, r2 = self.__find(n1), self.__find(n2)
+
+        if r1 is r2:
+            return
+
+        if len(self.members[r1]) < len(self.members[r2]):
+            r1, r2 = r2, r1
+
+        self.parent[r2] = r1
+        self.members[r1] |= self.members.pop(r2)
+
+        # if any of the two components might have split, so might the merged one
+        if r2 in self.dirty:
+            self.dirty.remove(r2)
+            self.dirty.add(r1)
+
+    def __rebuild(self):
+        """Rebuild all of the dirty components from the vertices of their nodes."""
+        dirty, self.dirty = self.dirty, set()
+
+        for root in dirty:
+            members = self.members.pop(root)
+
+            for node in members:
+                self.parent[node] = node
+                self.members[node] = {node}
+
+            # vertices of a component only ever go between its nodes
+            for node in members:
+                for adjacent in node.get_adjacent_nodes():
+                    self.__union(node, adjacent)
+
+        for node in self.removed:
+            del self.parent[node]
+
+        self.removed = set()
+
+    def __clean(self):
+        """Make sure that no component is dirty."""
+        if len(self.dirty) != 0:
+            self.__rebuild()
+
+    def add_node(self, node: Node):
+        """Add a new node as its own component."""
+        if node in self.removed:
+            self.__rebuild()
+
+        self.parent[node] = node
+        self.members[node] = {node}
+
+    def remove_node(self, node: Node):
+        """Remove the node. Its component might split, so it's marked as dirty."""
+        root = self.__find(node)
+
+        self.members[root].remove(node)
+        self.removed.add(node)
+        self.dirty.add(root)
+
+    def add_vertex(self, n1: Node, n2: Node):
+        """Merge the components of the nodes of a newly added vertex."""
+        self.__union(n1, n2)
+
+    def remove_vertex(self, n1: Node, n2: Node):
+        """Mark the component of a removed vertex as dirty, since it might split (it
+        can't if the nodes are still connected by the reverse vertex)."""
+        if n2.is_adjacent_to(n1):
+            return
+
+        self.dirty.add(self.__find(n1))
+
+    def get_component_id(self, node: Node) -> Node:
+        """Return an identifier of the component the node is in (its root node)."""
+        self.__clean()
+        return self.__find(node)
+
+    def get_component(self, node: Node) -> Set[Node]:
+        """Return the set of nodes in the same component as the given node."""
+        return self.members[self.get_component_id(node)]
+
+    def get_components(self) -> List[Set[Node]]:
+        """Return a list of all of the components."""
+        self.__clean()
+        return list(self.members.values())
+
+    def connected(self, n1: Node, n2: Node) -> bool:
+        """Return True if the nodes are in the same component, else False."""
+        return self.get_component_id(n1) is self.get_component_id(n2)
+
+
+class RootLayers:
+    """A class for keeping track of the BFS layers of a graph from its root node.
+
+    The layers are updated incrementally when vertices/nodes are added or removed, so
+    only the nodes whose distance from the root actually changes are visited."""
+
+    def __init__(self):
+        self.root: Optional[Node] = None
+
+        self.distance: Dict[Node, int] = {}
+        self.layers: Dict[int, Set[Node]] = {}
+
+    def __set_distance(self, node: Node, distance: int):
+        """Set the distance of the node, moving it to the appropriate layer."""
+        self.__remove_distance(node)
+
+        self.distance[node] = distance
+
+        if distance not in self.layers:
+            self.layers[distance] = set()
+        self.layers[distance].add(node)
+
+    def __remove_distance(self, node: Node):
+        """Remove the node from the layers (if it's there)."""
+        if node not in self.distance:
+            return
+
+        distance = self.distance.pop(node)
+        self.layers[distance].remove(node)
+
+        if len(self.layers[distance]) == 0:
+            del self.layers[distance]
+
+    def __relax(self, queue: Deque[Node]):
+        """Run BFS from the nodes in the queue, lowering the distance of the nodes that
+        can be reached faster through them."""
+        while len(queue) != 0:
+            current = queue.popleft()
+            distance = self.distance[current] + 1
+
+            for adjacent in current.get_adjacent_nodes():
+                if self.distance.get(adjacent, distance + 1) > distance:
+                    self.__set_distance(adjacent, distance)
+                    queue.append(adjacent)
+
+    def __repair(self, seeds: List[Node]):
+        """Recalculate the distances after removing vertices to the seed nodes, which
+        all have to be from the same layer."""
+        # first, find the nodes that lost all of their shortest paths from the root
+        # since the queue is processed layer by layer, all of the node's parents are
+        # determined to be affected (or not) before the node itself is examined
+        affected = set()
+        queue = deque(seeds)
+        seen = set(seeds)
+
+        while len(queue) != 0:
+            current = queue.popleft()
+            distance = self.distance[current]
+
+            if any(
+                node not in affected and self.distance.get(node) == distance - 1
+                for node in current.get_incoming_nodes()
+            ):
+                continue
+
+            affected.add(current)
+
+            for adjacent in current.get_adjacent_nodes():
+                if adjacent not in seen and self.distance.get(adjacent) == distance + 1:
+                    seen.add(adjacent)
+                    queue.append(adjacent)
+
+        for node in affected:
+            self.__remove_distance(node)
+
+        # then calculate their new distance from the nodes that weren't affected
+        # (sorting them and merging them with the BFS queue while it's being run)
+        candidates = []
+        for node in affected:
+            distances = [
+                self.distance[n] + 1
+                for n in node.get_incoming_nodes()
+                if n in self.distance
+            ]
+
+            if len(distances) != 0:
+                candidates.append((min(distances), node))
+
+        candidates = deque(sorted(candidates, key=lambda c: c[0]))
+        queue = deque()
+
+        while len(candidates) != 0 or len(queue) != 0:
+            if len(queue) == 0 or (
+                len(candidates) != 0 and candidates[0][0] <= queue[0][0]
+            ):
+                distance, current = candidates.popleft()
+            else:
+                distance, current = queue.popleft()
+
+            if current in self.distance:
+                continue
+
+            self.__set_distance(current, distance)
+
+            for adjacent in current.get_adjacent_nodes():
+                if adjacent in affected and adjacent not in self.distance:
+                    queue.append((distance + 1, adjacent))
+
+    def set_root(self, root: Optional[Node]):
+        """Set the root, recalculating all of the layers."""
+        self.root = root
+        self.recalculate()
+
+    def recalculate(self):
+        """Recalculate all of the layers from scratch (using BFS)."""
+        self.distance = {}
+        self.layers = {}
+
+        if self.root is None:
+            return
+
+        self.__set_distance(self.root, 0)
+        self.__relax(deque([self.root]))
+
+    def add_vertex(self, n1: Node, n2: Node):
+        """Update the layers after a vertex from n1 to n2 was added."""
+        if n1 not in self.distance:
+            return
+
+        distance = self.distance[n1] + 1
+
+        if self.distance.get(n2, distance + 1) > distance:
+            self.__set_distance(n2, distance)
+            self.__relax(deque([n2]))
+
+    def remove_vertex(self, n1: Node, n2: Node):
+        """Update the layers after a vertex from n1 to n2 was removed."""
+        if n1 in self.distance and self.distance.get(n2) == self.distance[n1] + 1:
+            self.__repair([n2])
+
+    def remove_node(self, node: Node, adjacent: Iterable[Node]):
+        """Update the layers after a node (along with vertices to the adjacent nodes)
+        was removed."""
+        if node is self.root:
+            self.set_root(None)
+
+        if node not in self.distance:
+            return
+
+        distance = self.distance[node]
+        self.__remove_distance(node)
+
+        self.__repair([n for n in adjacent if self.distance.get(n) == distance + 1])
+
+    def get_layers(self) -> Dict[int, Set[Node]]:
+        """Return a dictionary of layers (sets of nodes), indexed by their distance."""
+        return self.layers
+
+
+class TreeLayout:
+    """The layered layout of a graph from its root, each node placed in the row of its
+    BFS layer.
+
+    If the BFS tree contains all of the vertices, it is laid out by Reingold–Tilford:
+    each node is placed under its parent from the previous layer, the subtrees of the
+    children of a node are placed next to each other as close as their contours (the
+    leftmost and the rightmost node in each row) allow and the node is centered above
+    them.
+
+    Otherwise, the vertices that aren't in the tree can cross the others and the ones
+    of directed graphs can even go back up through several layers, so the graph is laid
+    out like in the Sugiyama framework: the vertices are split by dummy nodes in the
+    layers between their nodes, the order of the nodes in each row (starting from the
+    one of the tree layout) is improved by sweeps that sort the rows by the barycenters
+    of their neighbours and the nodes are then placed near their neighbours above."""
+
+    horizontal = 3  # the minimal distance of two nodes in the same layer
+    vertical = 4  # the distance of the layers
+
+    sweeps = 4  # the number of the crossing-reduction sweeps (down and up)
+
+    @classmethod
+    def calculate(
+        cls, nodes: Sequence[Node], layers: Dict[int, Set[Node]]
+    ) -> Dict[Node, Vec2]:
+        """Return the positions of the nodes of the layers, relative to the root (the
+        only node of the first layer). The nodes are ordered by their index in the
+        given sequence, so the layout is always the same."""
+        index = {node: i for i, node in enumerate(nodes)}
+        rows = [sorted(layers[i], key=index.get) for i in range(len(layers))]
+
+        # the children of each node in the BFS tree
+        children = {}
+        for row, next_row in zip(rows, rows[1:] + [[]]):
+            remaining = set(next_row)
+
+            for node in row:
+                children[node] = []
+
+                for adjacent in sorted(node.get_adjacent_nodes(), key=index.get):
+                    if adjacent in remaining:
+                        remaining.remove(adjacent)
+                        children[node].append(adjacent)
+
+        layout = cls.__tree(rows, children)
+
+        # the pairs of adjacent nodes (regardless of the direction of the vertices)
+        pairs = {
+            (n1, n2) if index[n1] < index[n2] else (n2, n1)
+            for n1 in layout
+            for n2 in n1.get_adjacent_nodes()
+            if n2 in layout and n1 is not n2
+        }
+
+        # the BFS tree has a pair of each of its vertices, so it's the whole graph
+        if len(pairs) == len(layout) - 1:
+            return layout
+
+        pairs = sorted(pairs, key=lambda pair: (index[pair[0]], index[pair[1]]))
+        return cls.__layered(rows, pairs, layout)
+
+    @classmethod
+    def __tree(
+        cls, rows: List[List[Node]], children: Dict[Node, List[Node]]
+    ) -> Dict[Node, Vec2]:
+        """Return the Reingold–Tilford layout of the BFS tree."""
+        # the contours of the subtrees (relative to their roots), stored from the
+        # deepest row, so a row can be added above in constant time, and with an offset
+        # that is added to all of their values, so they can be moved in constant time
+        contours = {}
+
+        # the positions of the nodes relative to their parents
+        shifts = {}
+
+        for row in reversed(rows):
+            for node in row:
+                if len(children[node]) == 0:
+                    contours[node] = ([0.0], [0.0], 0.0)
+                    continue
+
+                first, *others = children[node]
+                left, right, offset = contours.pop(first)
+
+                # place the subtrees from the left, relative to the first one
+                positions = {first: 0.0}
+                for child in others:
+                    child_left, child_right, child_offset = contours.pop(child)
+                    common = min(len(left), len(child_left))
+
+                    x = cls.horizontal + max(
+                        right[-1 - d] + offset - child_left[-1 - d] - child_offset
+                        for d in range(common)
+                    )
+
+                    positions[child] = x
+                    child_offset += x
+
+                    # merge the rows into the deeper contour (the left side of the
+                    # common rows is the old one, the right side is the child's)
+                    if len(child_left) > len(left):
+                        for d in range(common):
+                            child_left[-1 - d] = left[-1 - d] + offset - child_offset
+
+                        left, right, offset = child_left, child_right, child_offset
+                    else:
+                        for d in range(common):
+                            right[-1 - d] = child_right[-1 - d] + child_offset - offset
+
+                # center the node above its children
+                middle = (positions[first] + positions[children[node][-1]]) / 2
+
+                for child in children[node]:
+                    shifts[child] = positions[child] - middle
+
+                offset -= middle
+                left.append(-offset)
+                right.append(-offset)
+
+                contours[node] = (left, right, offset)
+
+        # place the nodes from the top, so their parents are already placed
+        layout = {rows[0][0]: Vec2(0, 0)}
+        for depth, row in enumerate(rows, 1):
+            for node in row:
+                for child in children[node]:
+                    x = layout[node].x + shifts[child]
+                    layout[child] = Vec2(x, depth * cls.vertical)
+
+        return layout
+
+    @classmethod
+    def __layered(
+        cls,
+        rows: List[List[Node]],
+        pairs: List[Tuple[Node, Node]],
+        tree: Dict[Node, Vec2],
+    ) -> Dict[Node, Vec2]:
+        """Return the layered layout of a graph that isn't a tree, given the pairs of
+        its adjacent nodes and the layout of its BFS tree."""
+        depth = {node: d for d, row in enumerate(rows) for node in row}
+        x = {node: position.x for node, position in tree.items()}
+        rows = [list(row) for row in rows]
+
+        # the neighbours of the (real and dummy) nodes in the rows above and below
+        above, below = defaultdict(list), defaultdict(list)
+
+        for n1, n2 in pairs:
+            if depth[n1] == depth[n2]:
+                continue  # the order of the row can't make these cross anything
+
+            if depth[n1] > depth[n2]:
+                n1, n2 = n2, n1
+
+            # the dummy nodes start where the vertex crosses their rows
+            chain = [n1]
+            for d in range(depth[n1] + 1, depth[n2]):
+                dummy = object()
+                rows[d].append(dummy)
+                chain.append(dummy)
+
+                t = (d - depth[n1]) / (depth[n2] - depth[n1])
+                x[dummy] = x[n1] + (x[n2] - x[n1]) * t
+
+            chain.append(n2)
+
+            for upper, lower in zip(chain, chain[1:]):
+                below[upper].append(lower)
+                above[lower].append(upper)
+
+        # sweep down and up, keeping the order with the fewest crossings
+        order = [sorted(row, key=x.get) for row in rows]
+        best, fewest = [list(row) for row in order], cls.__crossings(order, below)
+
+        for _ in range(cls.sweeps):
+            for i in range(1, len(order)):
+                cls.__sort(order[i], order[i - 1], above)
+
+            for i in reversed(range(len(order) - 1)):
+                cls.__sort(order[i], order[i + 1], below)
+
+            crossings = cls.__crossings(order, below)
+            if crossings < fewest:
+                best, fewest = [list(row) for row in order], crossings
+
+        # place each node at the average of its neighbours above (the nodes of the
+        # row are pushed right to keep them apart and the row is then moved back)
+        positions = {best[0][0]: 0.0}
+        for row in best[1:]:
+            wanted = [
+                sum(positions[n] for n in above[node]) / len(above[node])
+                for node in row
+            ]
+
+            placed = []
+            for position in wanted:
+                if len(placed) != 0:
+                    position = max(position, placed[-1] + cls.horizontal)
+
+                placed.append(position)
+
+            shift = sum(p - w for p, w in zip(placed, wanted)) / len(row)
+            for node, position in zip(row, placed):
+                positions[node] = position - shift
+
+        return {
+            node: Vec2(positions[node], depth[node] * cls.vertical) for node in depth
+        }
+
+    @staticmethod
+    def __sort(row: List, other: List, neighbours: Dict[object, List]):
+        """Sort the row by the barycenters of the neighbours of its nodes in the other
+        row (in place). Nodes with no neighbours there keep their place."""
+        index = {node: i for i, node in enumerate(other)}
+
+        def barycenter(i: int, node) -> float:
+            adjacent = neighbours[node]
+            if len(adjacent) == 0:
+                return i
+
+            return sum(index[n] for n in adjacent) / len(adjacent)
+
+        keys = [(barycenter(i, node), i) for i, node in enumerate(row)]
+        row[:] = [row[i] for _, i in sorted(keys)]
+
+    @staticmethod
+    def __crossings(order: List[List], below: Dict[object, List]) -> int:
+        """Return the number of crossings of the vertices between the rows."""
+        crossings = 0
+
+        for upper, lower in zip(order, order[1:]):
+            index = {node: i for i, node in enumerate(lower)}
+            ends = [e for node in upper for e in sorted(index[n] for n in below[node])]
+
+            # vertices cross when their ends below are in the opposite order
+            seen = []
+            for end in ends:
+                crossings += len(seen) - bisect_right(seen, end)
+                insort(seen, end)
+
+        return crossings
+
+
 class Graph:
     """A class for working with graphs."""
 
     vertex_class = Vertex
     node_class = Node
 
+    # the keywords of the annotations of the graph files (all of them, including the
+    # ones that are only understood by a drawable graph or by the canvas)
+    annotation_keywords = {"node", "directed", "position", "root", "transformation"}
+
     def __init__(self):
         self.directed: bool = False
         self.weighted: bool = False
 
-        self.nodes: List[Node] = []
-        self.vertices: List[Vertex] = []
+        # sets with O(1) removal that keep the order in which the elements were added
+        self.nodes: OrderedSet = OrderedSet()
+        self.vertices: OrderedSet = OrderedSet()
 
-        # a component array that gets recalculated on each destructive graph operation
-        # takes O(n^2) to rebuild, but O(1) to check components, so it's better for us
-        self.components: List[Set[Node]] = None
+        # weakly connected components of the graph, updated on each graph operation
+        # merging is done in O(1) (amortized), splitting lazily when they're needed
+        self.components: Components = Components()
 
-    def recalculate_components(function):
-        """A decorator for rebuilding the components of the graph."""
+        # how many batches are currently open (see the batch method)
+        self.batch_depth: int = 0
 
-        def wrapper(self, *args, **kwargs):
-            # first add/remove vertex/node/...
-            function(self, *args, **kwargs)
+        # incremented on each change of the structure of the graph, so the things that
+        # are derived from it can be cached (see get_version)
+        self.version: int = 0
 
-            self.components = []
+    @contextmanager
+    def batch(self):
+        """A context manager for doing a lot of graph operations at once. Things derived
+        from the graph (which would otherwise be recalculated after each operation) are
+        only recalculated once, when the outermost batch ends."""
+        self.batch_depth += 1
 
-            for node in self.get_nodes():
-                # the current set of nodes that we know are reachable from one another
-                component = set([node] + list(node.get_adjacent_nodes()))
+        try:
+            yield self
+        finally:
+            self.batch_depth -= 1
 
-                i = 0
-                while i < len(self.components):
-                    if len(self.components[i].intersection(component)) != 0:
-                        component |= self.components.pop(i)
-                    else:
-                        i += 1
+            if self.batch_depth == 0:
+                self._batch_ended()
+
+    def in_batch(self) -> bool:
+        """Return True if some graph batch is currently open, else False."""
+        return self.batch_depth != 0
 
-                self.components.append(component)
+    def get_version(self) -> int:
+        """Return the version of the structure of the graph, which changes each time
+        a node/vertex is added or removed (or the root of a drawable graph is set)."""
+        return self.version
 
-        return wrapper
+    def _batch_ended(self):
+        """Called when the outermost batch ends to recalculate the deferred things."""
+        pass
+
+    def get_components(self) -> List[Set[Node]]:
+        """Return a list of the weakly connected components of the graph."""
+        return self.components.get_components()
 
     def get_weakly_connected(self, *args: Sequence[Node]) -> Set[Node]:
         """Return a set of all nodes that are weakly connected to any node from the
         given sequence."""
         nodes = set()
+        roots = set()
 
         for node in args:
-            for component in self.components:
-                if node in component:
-                    nodes |= component
+            root = self.components.get_component_id(node)
+
+            if root not in roots:
+                roots.add(root)
+                nodes |= self.components.get_component(node)
 
         return nodes
 
     def weakly_connected(self, n1: Node, n2: Node) -> bool:
         """Return True if the nodes are weakly connected, else False."""
-        for component in self.components:
-            a = n1 in component
-            b = n2 in component
-
-            if a and b:
-                return True
-            elif a or b:
-                return False
+        return self.components.connected(n1, n2)
 
     def is_directed(self) -> bool:
         """Return True if the graph is directed, else False."""
@@ -168,21 +733,21 @@ class Graph:
     def set_directed(self, directed: bool):
         """Set, whether the graph is directed or not."""
         # if we're converting to undirected, make all current vertices go both ways
-        if self.is_directed():
-            for node in self.get_nodes():
-                for neighbour in node.get_adjacent_nodes():
-                    if node is neighbour:
-                        self.remove_vertex(node, neighbour)  # no loops allowed >:C
-                    else:
-                        self.add_vertex(neighbour, node)
-
-            # also, set all weights between to nodes to equal
-            for v1 in self.get_vertices():
-                for v2 in self.get_vertices():
-                    if v1 == (v2[1], v2[0]):
-                        v2.set_weight(v1.get_weight())
-
-        self.directed = directed
+        with self.batch():
+            if self.is_directed() and not directed:
+                for node in self.get_nodes():
+                    for neighbour in list(node.get_adjacent_nodes()):
+                        if node is neighbour:
+                            self.remove_vertex(node, neighbour)  # no loops allowed >:C
+                        else:
+                            self.add_vertex(neighbour, node)
+
+                # also, set all weights between to nodes to equal
+                for vertex in self.get_vertices():
+                    reverse = self.get_vertex(vertex[1], vertex[0])
+                    reverse.set_weight(vertex.get_weight())
+
+            self.directed = directed
 
     def is_weighted(self) -> bool:
         """Return True if the graph is weighted and False otherwise."""
@@ -198,74 +763,78 @@ class Graph:
         vertex.set_weight(weight)
 
         if not self.is_directed():
-            # find the vertex that goes the other way
-            for v in self.get_vertices():
-                if v == (vertex[1], vertex[0]):
-                    v.set_weight(weight)
-                    break
+            # set the vertex that goes the other way
+            reverse = self.get_vertex(vertex[1], vertex[0])
+
+            if reverse is not None:
+                reverse.set_weight(weight)
+
+    def get_vertex(self, n1: Node, n2: Node) -> Optional[Vertex]:
+        """Return the vertex from n1 to n2 (and None if they're not connected)."""
+        return n1.get_vertex(n2)
 
     def get_weight(self, n1: Node, n2: Node) -> Optional[Union[int, float]]:
         """Return the weight of the specified vertex (and None if they're not connected)."""
-        for vertex in self.get_vertices():
-            if Vertex(n1, n2) == vertex:
-                return vertex.get_weight()
+        vertex = self.get_vertex(n1, n2)
+
+        if vertex is not None:
+            return vertex.get_weight()
 
     def get_nodes(self) -> List[Node]:
-        """Return a list of nodes of the graph."""
-        return self.nodes
+        """Return a list of nodes of the graph (in the order in which they were
+        added)."""
+        return self.nodes.get_list()
 
     def get_vertices(self) -> List[Vertex]:
-        """Return a list of vertices of the graph."""
-        return self.vertices
+        """Return a list of vertices of the graph (in the order in which they were
+        added)."""
+        return self.vertices.get_list()
 
-    @recalculate_components
     def add_node(self, node: Node):
         """Add a new node to the graph."""
-        self.nodes.append(node)
+        self.nodes.add(node)
+        self.components.add_node(node)
+        self.version += 1
 
     def reorient(self):
         """Change the orientation of all vertices."""
-        # for each pair of nodes
-        for i, n1 in enumerate(self.get_nodes()):
-            for n2 in self.get_nodes()[i:]:
-                # change the direction, if there is only one
-                if bool(n1.is_adjacent_to(n2)) != bool(n2.is_adjacent_to(n1)):  # xor
-                    self.toggle_vertex(n1, n2)
-                    self.toggle_vertex(n2, n1)
+        with self.batch():
+            # for each pair of nodes
+            for i, n1 in enumerate(self.get_nodes()):
+                for n2 in self.get_nodes()[i:]:
+                    # change the direction, if there is only one
+                    if n1.is_adjacent_to(n2) != n2.is_adjacent_to(n1):  # xor
+                        self.toggle_vertex(n1, n2)
+                        self.toggle_vertex(n2, n1)
 
     def complement(self):
         """Complement the graph."""
-        # for each pair of nodes
-        for i, n1 in enumerate(self.get_nodes()):
-            for n2 in self.get_nodes()[i:]:
-                self.toggle_vertex(n1, n2)
-
-                # also toggle the other way, if it's directed
-                # node that I didn't deliberately put 'and n1 is not n2' here, since
-                # they're special and we usually don't want them
-                if self.is_directed():
-                    self.toggle_vertex(n2, n1)
-
-    @recalculate_components
+        with self.batch():
+            # for each pair of nodes
+            for i, n1 in enumerate(self.get_nodes()):
+                for n2 in self.get_nodes()[i:]:
+                    self.toggle_vertex(n1, n2)
+
+                    # also toggle the other way, if it's directed
+                    # node that I didn't deliberately put 'and n1 is not n2' here, since
+                    # they're special and we usually don't want them
+                    if self.is_directed():
+                        self.toggle_vertex(n2, n1)
+
     def remove_node(self, node: Node):
         """Removes the node from the graph."""
         # remove it from the list of nodes
         self.nodes.remove(node)
+        self.components.remove_node(node)
+        self.version += 1
 
-        # remove all vertices that contain it
-        i = 0
-        while i < len(self.vertices):
-            v = self.vertices[i]
-            if node is v[0] or node is v[1]:
-                del self.vertices[i]
-            else:
-                i += 1
+        # remove all vertices that contain it (a loop is removed with the first ones)
+        for vertex in list(node.get_adjacent_vertices()):
+            self._remove_vertex(vertex)
 
-        # remove this node from all nodes' adjacent
-        for other in self.get_nodes():
-            other._remove_adjacent_node(node)
+        for vertex in list(node.get_incoming_vertices()):
+            self._remove_vertex(vertex)
 
-    @recalculate_components
     def add_vertex(self, n1: Node, n2: Node, weight: Optional[float] = 1, **kwargs):
         """Adds a vertex from node n1 to node n2 (and vice versa, if it's not directed).
         Only does so if the given vertex doesn't already exist and can be added (if, for
@@ -275,33 +844,80 @@ class Graph:
             return
 
         # create the object, adding it to vertices
-        vertex = self.vertex_class(n1, n2, weight, **kwargs)
-        self.vertices.append(vertex)
-        n1._add_adjacent_vertex(vertex)
+        self._add_vertex(self.vertex_class(n1, n2, weight, **kwargs))
 
         # add it one/both ways, depending on whether the graph is directed or not
         if not self.is_directed():
-            vertex = self.vertex_class(n2, n1, weight, **kwargs)
-            self.vertices.append(vertex)
-            n2._add_adjacent_vertex(vertex)
+            self._add_vertex(self.vertex_class(n2, n1, weight, **kwargs))
+
+        self.components.add_vertex(n1, n2)
 
-    @recalculate_components
     def remove_vertex(self, n1: Node, n2: Node):
         """Removes a vertex from node n1 to node n2 (and vice versa, if it's not 
         directed). Only does so if the given vertex exists."""
         # remove it one-way if the graph is directed and both if it's not
-        i = 0
-        while i < len(self.vertices):
-            v = self.vertices[i]
-            if (n1, n2) == v or (not self.is_directed() and (n2, n1) == v):
-                del self.vertices[i]
-            else:
-                i += 1
-
-        # see above comment
-        n1._remove_adjacent_node(n2)
+        vertices = [n1.get_vertex(n2)]
         if not self.is_directed():
-            n2._remove_adjacent_node(n1)
+            vertices.append(n2.get_vertex(n1))
+
+        vertices = [vertex for vertex in vertices if vertex is not None]
+        if len(vertices) == 0:
+            return
+
+        for vertex in vertices:
+            self._remove_vertex(vertex)
+
+        self.components.remove_vertex(n1, n2)
+
+    def _populate(self, nodes: List[Node], vertices: Iterable[Tuple[int, int, Any]]):
+        """Add the new nodes and the vertices between them (given by the indexes of
+        their nodes and their weights) all at once.
+
+        Much faster than adding them one by one, but the vertices aren't checked: each
+        pair of nodes can only be in them once (regardless of the direction, if the
+        graph isn't directed) and there can only be loops if the graph is directed."""
+        for node in nodes:
+            self.add_node(node)
+
+        vertex_class, directed = self.vertex_class, self.is_directed()
+
+        created = []
+        for i, j, weight in vertices:
+            created.append(vertex_class(nodes[i], nodes[j], weight))
+
+            if not directed:
+                created.append(vertex_class(nodes[j], nodes[i], weight))
+
+        self._add_vertices(created)
+
+    def _add_vertices(self, vertices: List[Vertex]):
+        """Add new vertex objects to the graph at once (the bulk version of add_vertex,
+        which doesn't check them, see _populate)."""
+        self.vertices.update(vertices)
+        self.version += 1
+
+        for vertex in vertices:
+            n1, n2 = vertex.node_from, vertex.node_to
+
+            n1._add_adjacent_vertex(vertex)
+            n2._add_incoming_vertex(vertex)
+            self.components.add_vertex(n1, n2)
+
+    def _add_vertex(self, vertex: Vertex):
+        """Add the vertex object to the graph and to the nodes that it connects."""
+        self.vertices.add(vertex)
+        self.version += 1
+
+        vertex[0]._add_adjacent_vertex(vertex)
+        vertex[1]._add_incoming_vertex(vertex)
+
+    def _remove_vertex(self, vertex: Vertex):
+        """Remove the vertex object from the graph and from the nodes it connects."""
+        self.vertices.remove(vertex)
+        self.version += 1
+
+        vertex[0]._remove_adjacent_node(vertex[1])
+        vertex[1]._remove_incoming_node(vertex[0])
 
     def toggle_vertex(self, n1: Node, n2: Node):
         """Toggles a connection between two nodes."""
@@ -310,109 +926,264 @@ class Graph:
         else:
             self.add_vertex(n1, n2)
 
+    @staticmethod
+    def parse_weight(string: str) -> Union[int, float]:
+        """Parse the weight of a vertex (trying the fast numeric conversions first).
+        Infinite and NaN weights (like "inf" or "1e999") are not allowed."""
+        try:
+            return int(string)
+        except ValueError:
+            pass
+
+        try:
+            weight = float(string)
+        except ValueError:
+            return literal_eval(string)
+
+        if not isfinite(weight):
+            raise ValueError(f"The weight '{string}' is not finite.")
+
+        return weight
+
     @classmethod
-    def from_string(cls, string: str, *args, **kwargs) -> type(cls):
-        """Generates the graph from a given string."""
-        graph = None
-        node_dictionary = {}
+    def parse_lines(
+        cls, lines: Iterable[str], annotations: List[List[str]] = None
+    ) -> Optional[Tuple[bool, bool, Iterator[Tuple[str, str, Union[int, float]]]]]:
+        """Parse the lines of a graph file, returning whether the graph is directed,
+        weighted, and an iterator of (node name, node name, weight) tuples of its
+        vertices (or None if the file is empty). The lines are parsed lazily.
+
+        Lines starting with '#' followed by one of the annotation keywords are
+        annotations (like '# position A 1.0 2.0'). They are split and appended to the
+        annotations list (if given) as they are parsed. Other lines starting with '#'
+        are vertices (of a node labeled '#...') and a line with a single label is a
+        node that isn't in any vertex (it's appended as a '# node' annotation)."""
+        # whether the graph is annotated as directed (only needed without vertices)
+        annotated_directed = False
+
+        def split():
+            nonlocal annotated_directed
+
+            for line in lines:
+                parts = line.split()
+
+                if len(parts) == 0:
+                    continue
+
+                if len(parts) == 1:
+                    if annotations is not None:
+                        annotations.append(["node", parts[0]])
+                    continue
+
+                if parts[0] == "#" and parts[1] in cls.annotation_keywords:
+                    if parts[1] == "directed":
+                        annotated_directed = True
+
+                    if annotations is not None:
+                        annotations.append(parts[1:])
+                    continue
+
+                yield parts
+
+        parts = split()
+
+        first = next(parts, None)
+        if first is None:
+            # a graph with no vertices can still have annotated nodes
+            if annotations:
+                return annotated_directed, False, iter(())
+
+            return None
+
+        # the formats are either 'A B' or 'A <something> B'
+        directed = first[1] in ("->", "<-")
+
+        # if weight is present, the formats are:
+        # - 'A B num' for undirected graphs
+        # - 'A <something> B num' for directed graphs
+        weighted = len(first) == 3 + directed
+
+        def vertices():
+            for p in chain([first], parts):
+                weight = 0 if not weighted else cls.parse_weight(p[2 + directed])
+
+                # possibly switch places for a reverse arrow
+                if p[1] == "<-":
+                    yield p[2], p[0], weight
+                else:
+                    yield p[0], p[1 + directed], weight
 
-        # add each of the nodes of the given line to the graph
-        for line in filter(lambda x: len(x) != 0, string.splitlines()):
-            parts = line.strip().split()
+        return directed, weighted, vertices()
 
-            # initialize the graph from the first line (if it hasn't been done yet)
-            if graph is None:
-                directed = parts[1] in ("->", "<-")
-                weighted = len(parts) == 3 + directed
+    @classmethod
+    def from_lines(
+        cls,
+        lines: Iterable[str],
+        *args,
+        annotations: List[List[str]] = None,
+        **kwargs,
+    ) -> type(cls):
+        """Generates the graph from the given lines (a list, an open file...), which
+        are processed one by one. All of the annotations of the file are appended to
+        the annotations list (if given), so the unknown ones can be handled outside."""
+        annotations = [] if annotations is None else annotations
+        parsed = cls.parse_lines(lines, annotations)
+
+        if parsed is None:
+            return None
+
+        directed, weighted, vertices = parsed
+
+        # the indexes of the nodes (by their names) and the vertices (by the pairs of
+        # the indexes of their nodes) are collected first, so the graph can be built
+        # all at once, instead of adding the vertices one by one
+        indexes: Dict[str, int] = {}
+        pairs: Dict[Tuple[int, int], Tuple[int, int, Any]] = {}
+
+        with paused_collection():
+            for n1_name, n2_name, weight in vertices:
+                i = indexes.setdefault(n1_name, len(indexes))
+                j = indexes.setdefault(n2_name, len(indexes))
+
+                if directed:
+                    pair = (i, j)
+                elif i != j:  # no loops allowed >:C
+                    pair = (i, j) if i < j else (j, i)
+                else:
+                    continue
 
-                graph = cls(*args, **kwargs)
-                graph.set_directed(directed)
-                graph.set_weighted(weighted)
+                # the first of the duplicate vertices is the one that's added
+                if pair not in pairs:
+                    pairs[pair] = (i, j, weight)
 
-            # the formats are either 'A B' or 'A <something> B'
-            node_names = (parts[0], parts[1 + directed])
+        graph = cls(*args, **kwargs)
+        graph.set_directed(directed)
+        graph.set_weighted(weighted)
 
-            # if weight is present, the formats are:
-            # - 'A B num' for undirected graphs
-            # - 'A <something> B num' for directed graphs
-            weight = 0 if not weighted else literal_eval(parts[2 + directed])
+        with graph.batch(), paused_collection():
+            nodes = [cls.node_class(label=name) for name in indexes]
+            graph._populate(nodes, pairs.values())
 
-            # create node objects for each of the names (if it hasn't been done yet)
-            for name in node_names:
-                if name not in node_dictionary:
+            def get_node(name: str) -> Node:
+                """Return the node of the given name, creating it if it doesn't exist."""
+                if name not in indexes:
                     # add it to graph with default values
-                    node_dictionary[name] = cls.node_class(label=name)
-                    graph.add_node(node_dictionary[name])
-
-            # get the node objects from the names
-            n1, n2 = node_dictionary[node_names[0]], node_dictionary[node_names[1]]
+                    indexes[name] = len(nodes)
+                    nodes.append(cls.node_class(label=name))
+                    graph.add_node(nodes[-1])
 
-            # possibly switch places for a reverse arrow
-            if parts[1] == "<-":
-                n1, n2 = n2, n1
+                return nodes[indexes[name]]
 
-            # add the vertex
-            graph.add_vertex(n1, n2, weight)
+            # the annotations have all been parsed once the vertices have
+            for parts in annotations:
+                graph._apply_annotation(parts, get_node)
 
         return graph
 
-    def to_string(self) -> str:
-        """Exports the graph, returning the string."""
-        string = ""
+    def _apply_annotation(self, parts: List[str], get_node: Callable[[str], Node]):
+        """Apply an annotation of an imported file to the graph. Unknown annotations
+        are ignored. A graph understands the '# node <name>' annotation, which adds a
+        node that isn't in any of the vertices."""
+        if parts[0] == "node" and len(parts) == 2:
+            get_node(parts[1])
+
+    @classmethod
+    def from_file(cls, file: Union[str, TextIO], *args, **kwargs) -> type(cls):
+        """Generates the graph from a file (given either by its path or as an open
+        file), reading it line by line."""
+        if isinstance(file, str):
+            with open(file, "r") as f:
+                return cls.from_lines(f, *args, **kwargs)
 
-        counter = 0  # for naming nodes that don't have a label
-        added = {}
+        return cls.from_lines(file, *args, **kwargs)
 
-        # for each vertex
-        for vertex in self.get_vertices():
-            n1 = vertex[0]
-            n2 = vertex[1]
+    @classmethod
+    def from_string(cls, string: str, *args, **kwargs) -> type(cls):
+        """Generates the graph from a given string."""
+        return cls.from_lines(string.splitlines(), *args, **kwargs)
 
-            # only add a vertex from an undirected graph once
-            if not self.is_directed() and id(n1) > id(n2):
-                continue
+    def get_export_names(self) -> Dict[Node, str]:
+        """Return the names of the nodes used when exporting the graph. Nodes that
+        don't have a label are numbered (skipping the numbers used as labels)."""
+        labels = {node.get_label() for node in self.get_nodes()}
 
-            n1_label = n1.get_label()
-            if n1_label is None:
-                if n1 not in added:
-                    counter += 1
-                    added[n1] = str(counter)
-                n1_label = added[n1]
+        names = {}
+        counter = 0
+        for node in self.get_nodes():
+            label = node.get_label()
 
-            n2_label = n2.get_label()
-            if n2_label is None:
-                if n2 not in added:
+            if label is None:
+                counter += 1
+                while str(counter) in labels:
                     counter += 1
-                    added[n2] = str(counter)
-                n2_label = added[n2]
-
-            if n1.is_adjacent_to(n2):
-                string += (
-                    n1_label
-                    + (" -> " if self.is_directed() else " ")
-                    + n2_label
-                    + (
-                        (" " + str(self.get_weight(n1, n2)))
-                        if self.is_weighted()
-                        else ""
-                    )
-                    + "\n"
-                )
 
-            if n2.is_adjacent_to(n1) and self.is_directed():
-                string += (
-                    n1_label
-                    + (" <- " if self.is_directed() else " ")
-                    + n2_label
-                    + (
-                        (" " + str(self.get_weight(n2, n1)))
-                        if self.is_weighted()
-                        else ""
-                    )
-                    + "\n"
-                )
+                label = str(counter)
+
+            names[node] = label
+
+        return names
+
+    def iter_lines(self) -> Iterator[str]:
+        """Exports the graph, yielding its lines one by one. The vertices are exported
+        in the order of the nodes (and their adjacent vertices), so the output only
+        depends on the order in which things were added to the graph. The vertices
+        are followed by the annotations (see _iter_annotations)."""
+        # the order of the nodes, for only exporting undirected vertices once
+        order = {node: i for i, node in enumerate(self.get_nodes())}
+        names = self.get_export_names()
+
+        separator = " -> " if self.is_directed() else " "
+
+        for n1 in self.get_nodes():
+            for vertex in n1.get_adjacent_vertices():
+                n2 = vertex[1]
+
+                # only add a vertex from an undirected graph once
+                if not self.is_directed() and order[n2] < order[n1]:
+                    continue
+
+                name1, name2 = names[n1], names[n2]
+
+                # an undirected vertex starting with a node labeled '#' could be read
+                # as an annotation, so it starts with the other node instead
+                if name1 == "#" and not self.is_directed():
+                    name1, name2 = name2, name1
+
+                line = name1 + separator + name2
+
+                if self.is_weighted():
+                    line += " " + str(vertex.get_weight())
+
+                yield line + "\n"
+
+        for parts in self._iter_annotations(names):
+            yield "# " + " ".join(parts) + "\n"
+
+    def _iter_annotations(self, names: Dict[Node, str]) -> Iterator[List[str]]:
+        """Yield the annotations of the exported graph (see _apply_annotation), given
+        the export names of its nodes."""
+        # the vertices say whether the graph is directed, but it might have none
+        if self.is_directed():
+            yield ["directed"]
+
+        for node in self.get_nodes():
+            adjacent = node.get_adjacent_vertices()
+
+            if len(adjacent) == 0 and len(node.get_incoming_vertices()) == 0:
+                yield ["node", names[node]]
+
+    def to_file(self, file: Union[str, TextIO]):
+        """Exports the graph to a file (given either by its path or as an open file),
+        writing it line by line."""
+        if isinstance(file, str):
+            with open(file, "w") as f:
+                f.writelines(self.iter_lines())
+        else:
+            file.writelines(self.iter_lines())
 
-        return string
+    def to_string(self) -> str:
+        """Exports the graph, returning the string."""
+        return "".join(self.iter_lines())
 
 
 class Drawable(ABC):
@@ -426,11 +1197,15 @@ class Drawable(ABC):
 
 
 class Paintable:
-    """Has a brush and a pen to be drawn on the painter."""
+    """Has a brush and a pen to be drawn on the painter. The default ones are shared by
+    all of the objects, so they're replaced (not modified) when the color changes."""
+
+    default_pen = Pen()
+    default_brush = Brush()
 
     def __init__(self, pen: Pen = None, brush: Brush = None):
-        self.pen = pen or Pen()
-        self.brush = brush or Brush()
+        self.pen = pen or self.default_pen
+        self.brush = brush or self.default_brush
 
     @abstractmethod
     def set_color(self, color: ColorGenerating, *args, **kwargs):
@@ -470,44 +1245,93 @@ class Selectable:
         return self.selected
 
 
+class TextLayout:
+    """The size of a text (of its bounding rectangle) and a QStaticText for drawing it,
+    cached for each text and font, so the labels and the weights don't have to be
+    measured and laid out each time they're drawn (only when they or the font
+    change)."""
+
+    # the cached layouts (cleared when it gets too large)
+    cache: Dict[Tuple[str, str], TextLayout] = {}
+    cache_size = 4096
+
+    def __init__(self, text: str, font: QFont):
+        rect = QFontMetrics(font).boundingRect(text)
+        self.width, self.height = rect.width(), rect.height()
+
+        # the labels are plain text, even if they look like rich text (like '<b>')
+        self.static_text = QStaticText(text)
+        self.static_text.setTextFormat(Qt.PlainText)
+        self.static_size = self.static_text.size()
+
+    @classmethod
+    def get(cls, text: str, font: QFont) -> TextLayout:
+        """Return the layout of the text in the font."""
+        key = (text, font.key())
+
+        if key not in cls.cache:
+            if len(cls.cache) >= cls.cache_size:
+                cls.cache.clear()
+
+            cls.cache[key] = TextLayout(text, font)
+
+        return cls.cache[key]
+
+    def draw(self, painter: QPainter, width: float, height: float):
+        """Draw the text centered in the rectangle with the top left corner at (0, 0)
+        and the given size."""
+        x = (width - self.static_size.width()) / 2
+        y = (height - self.static_size.height()) / 2
+
+        painter.drawStaticText(QPointF(x, y), self.static_text)
+
+
 class DrawableNode(Drawable, Paintable, Selectable, Node):
-    def __init__(self, *args, position=Vector(0, 0), **kwargs):
-        self.position: Vector = position
+    label_size: Final[float] = 1.9  # the diagonal of the rectangle of the label
 
-        self.forces: List[Vector] = []
+    def __init__(self, *args, position: Vec2 = None, **kwargs):
+        self.position: Vec2 = Vec2() if position is None else position
 
         # for information about being dragged
         # at that point, no forces act on it
         # it's the offset from the mouse when the drag started
-        self.drag: Optional[Vector] = None
+        self.drag: Optional[Vec2] = None
+
+        # the grid of the graph that the node is in (notified when the node moves)
+        self.grid: Optional[NodeGrid] = None
 
         Paintable.__init__(self)
         Selectable.__init__(self)
         Node.__init__(self, *args, **kwargs)
 
     def set_color(self, color: ColorGenerating):
-        self.brush.set_color(color)
+        self.brush = replace(self.brush, color=color)
 
     def get_color(self) -> ColorGenerating:
         return self.brush.get_color()
 
-    def get_position(self) -> Vector:
+    def get_position(self) -> Vec2:
         """Return the position of the node."""
         return self.position
 
-    def set_position(self, position: Vector, override_drag: bool = False):
+    def set_position(self, position: Vec2, override_drag: bool = False):
         """Set the position of the node (accounted for drag). The override_drag option
         moves the node to the position even if it's currently being dragged."""
-        if override_drag and self.is_dragged():
+        if not self.is_dragged():
+            self.position = position
+        elif override_drag:
             self.drag += self.position - position
         else:
-            self.position = position - (self.drag or Vector(0, 0))
+            self.position = position - self.drag
+
+        if self.grid is not None:
+            self.grid.move_node(self)
 
-    def start_drag(self, mouse_position: Vector):
+    def start_drag(self, mouse_position: Vec2):
         """Start dragging the node, setting its drag offset from the mouse."""
         self.drag = mouse_position - self.get_position()
 
-    def stop_drag(self) -> Vector:
+    def stop_drag(self) -> Vec2:
         """Stop dragging the node."""
         self.drag = None
 
@@ -515,60 +1339,40 @@ class DrawableNode(Drawable, Paintable, Selectable, Node):
         """Return true if the node is currently in a dragged state."""
         return self.drag is not None
 
-    def add_force(self, force: Vector):
-        """Adds a force that is acting upon the node to the force list."""
-        self.forces.append(force)
-
-    def evaluate_forces(self):
-        """Evaluates all of the forces acting upon the node and moves it accordingly.
-        Node that they are only applied if the note is not being dragged."""
-        while len(self.forces) != 0:
-            force = self.forces.pop()
-
-            if not self.is_dragged():
-                self.position += force
-
-    def clear_forces(self):
-        """Clear all of the forces from the node."""
-        self.forces = []
-
     def draw(self, painter: QPainter, palette: QPalette, draw_label=False):
         painter.setBrush(self.brush(palette))
         painter.setPen(self.pen(palette))
 
         # draw an ellipse with radius 1
-        painter.drawEllipse(QPointF(*self.position), 1, 1)
+        painter.drawEllipse(QPointF(self.position.x, self.position.y), 1, 1)
 
         # possibly draw the label of the node
-        if draw_label and self.get_label() is not None:
-            self.__draw_label(painter, palette)
+        if draw_label:
+            self.draw_label(painter, palette)
+
+    def draw_label(self, painter: QPainter, palette: QPalette):
+        """Draw the label of the node (if it has one)."""
+        if self.get_label() is None:
+            return
 
-    def __draw_label(self, painter: QPainter, palette: QPalette):
-        """Draw the label of the node"""
-        label = self.get_label()
         mid = self.get_position()
 
         # get the rectangle that surrounds the label
-        r = QFontMetrics(painter.font()).boundingRect(label)
-        scale = 1.9 / Vector(r.width(), r.height()).magnitude()
+        layout = TextLayout.get(self.get_label(), painter.font())
+        scale = self.label_size / hypot(layout.width, layout.height)
 
         # draw it on the screen
-        size = Vector(r.width(), r.height()) * scale
-        rect = QRectF(*(mid - size / 2), *size)
+        width, height = layout.width * scale, layout.height * scale
 
         painter.save()
 
         painter.setPen(self.get_font_color()(palette))
 
         # translate to top left and scale down to draw the actual text
-        painter.translate(rect.topLeft())
+        painter.translate(mid.x - width / 2, mid.y - height / 2)
         painter.scale(scale, scale)
 
-        painter.drawText(
-            QRectF(0, 0, rect.width() / scale, rect.height() / scale),
-            Qt.AlignCenter,
-            label,
-        )
+        layout.draw(painter, layout.width, layout.height)
 
         painter.restore()
 
@@ -580,6 +1384,10 @@ class DrawableVertex(Drawable, Paintable, Selectable, Vertex):
 
     text_scale: Final[float] = 0.04  # the constant by which to scale down the font
 
+    # the rotation of the sides of the tip from the vertex
+    tip_cos: Final[float] = cos(radians(30))
+    tip_sin: Final[float] = sin(radians(30))
+
     def __init__(self, *args, **kwargs):
         self.font: QFont = None  # the font that is used to draw the weights
 
@@ -591,59 +1399,59 @@ class DrawableVertex(Drawable, Paintable, Selectable, Vertex):
         self, painter: QPainter, palette: QPalette, directed: bool, weighted: bool
     ):
         """Also takes, whether the graph is directed or not."""
-        self.font = painter.font()
-
         painter.setPen(self.pen(palette))
-        painter.setBrush(self.brush(palette))
+        painter.setBrush(Brush.empty()(palette))
 
         # special case for a loop
         if self.is_loop():
-            painter.setBrush(Brush.empty()(palette))
+            line = None
 
             # draw the ellipse that symbolizes a loop
-            center = self[0].get_position() - Vector(0.5, 1)
-            painter.drawEllipse(QPointF(*center), 0.5, 0.5)
-
-            # draw the head of the loop arrow
-            head_direction = Vector(0, 1).rotated(radians(self.loop_arrowhead_angle))
-            self.__draw_tip(center + Vector(0.5, 0), head_direction, painter, palette)
+            center = self.get_loop_center()
+            painter.drawEllipse(QPointF(center.x, center.y), 0.5, 0.5)
         else:
-            start, end = self.__get_position(directed)
+            line = start, end = self.get_position(directed)
 
             # draw the line
-            painter.drawLine(QPointF(*start), QPointF(*end))
+            painter.drawLine(QPointF(start.x, start.y), QPointF(end.x, end.y))
 
-            # draw the head of a directed arrow, which is an equilateral triangle
-            if directed:
-                self.__draw_tip(end, end - start, painter, palette)
+        # draw the head of the arrow (the brush color is given by the current pen)
+        tip = self.get_tip(directed, line)
+        if tip is not None:
+            painter.setBrush(Brush(self.pen.get_color())(palette))
+            painter.drawPolygon(tip)
 
         # draw the weight
         if weighted:
-            painter.setBrush(self.brush(palette))
-            painter.save()
+            self.draw_weight(painter, palette, directed)
+
+    def draw_weight(self, painter: QPainter, palette: QPalette, directed: bool):
+        """Draw the weight of the vertex (in a box with the color of the vertex)."""
+        self.font = painter.font()
+
+        painter.setPen(self.pen(palette))
+        painter.setBrush(self.brush(palette))
+        painter.save()
 
-            # draw the bounding box
-            rect = self._get_weight_box(directed)
-            painter.drawRect(rect)
+        # draw the bounding box
+        rect = self._get_weight_box(directed)
+        painter.drawRect(rect)
 
-            scale = self.text_scale
+        scale = self.text_scale
 
-            # translate to top left and scale down to draw the actual text
-            painter.translate(rect.topLeft())
-            painter.scale(scale, scale)
+        # translate to top left and scale down to draw the actual text
+        painter.translate(rect.topLeft())
+        painter.scale(scale, scale)
 
-            painter.setPen(self.get_font_color()(palette))
+        painter.setPen(self.get_font_color()(palette))
 
-            painter.drawText(
-                QRectF(0, 0, rect.width() / scale, rect.height() / scale),
-                Qt.AlignCenter,
-                str(self.get_weight()),
-            )
+        layout = TextLayout.get(str(self.get_weight()), self.font)
+        layout.draw(painter, rect.width() / scale, rect.height() / scale)
 
-            painter.restore()
+        painter.restore()
 
     def set_color(self, color: ColorGenerating):
-        self.brush.set_color(color)
+        self.brush = replace(self.brush, color=color)
 
     def get_color(self) -> ColorGenerating:
         return self.brush.get_color()
@@ -651,49 +1459,72 @@ class DrawableVertex(Drawable, Paintable, Selectable, Vertex):
     def _get_weight_box(self, directed) -> QRectF:
         """Get the rectangle that the weight of n1->n2 vertex will be drawn in."""
         # get the rectangle that bounds the text (according to the current font metric)
-        metrics = QFontMetrics(self.font)
-        r = metrics.boundingRect(str(self.get_weight()))
+        # the vertex might not have been drawn yet (if it's not visible), in which case
+        # the default font is used
+        layout = TextLayout.get(str(self.get_weight()), self.font or QFont())
 
         # get the mid point of the weight box, depending on whether it's a loop or not
         if self.is_loop():
             # the distance from the center of the node to the side of the ellipse that
             # is drawn to symbolize the loop
-            offset = Vector(0.5, 1) + Vector(0.5, 0).rotated(radians(45))
-            mid = self.__get_position()[0] - offset
+            offset = Vec2(0.5, 1) + Vec2(0.5, 0).rotated(radians(45))
+            mid = self.get_position()[0] - offset
         else:
-            mid = Vector.average(self.__get_position(directed))
+            mid = Vec2.average(self.get_position(directed))
 
         # scale it down by text_scale before returning it
         # if width is smaller then height, set it to height
-        height = r.height()
-        width = r.width() if r.width() >= height else height
-
-        size = Vector(width, height) * self.text_scale
-        return QRectF(*(mid - size / 2), *size)
-
-    def __draw_tip(
-        self, position: Vector, direction: Vector, painter: QPainter, palette: QPalette
-    ):
-        """Draw the tip of the vertex (as a triangle)."""
-        uv = direction.unit()
-
-        # the brush color is given by the current pen
-        painter.setBrush(Brush(self.pen.get_color())(palette))
-        painter.drawPolygon(
-            QPointF(*position),
-            QPointF(*(position + (-uv).rotated(radians(30)) * self.arrowhead_size)),
-            QPointF(*(position + (-uv).rotated(radians(-30)) * self.arrowhead_size)),
+        height = layout.height
+        width = layout.width if layout.width >= height else height
+
+        width, height = width * self.text_scale, height * self.text_scale
+        return QRectF(mid.x - width / 2, mid.y - height / 2, width, height)
+
+    def get_loop_center(self) -> Vec2:
+        """Return the center of the ellipse that symbolizes a loop."""
+        return self[0].get_position() - Vec2(0.5, 1)
+
+    def get_tip(
+        self, directed: bool, line: Tuple[Vec2, Vec2] = None
+    ) -> Optional[QPolygonF]:
+        """Return the tip of the vertex (a triangle), or None if it doesn't have one
+        (if it's not a loop and the graph is not directed). The start and the end of
+        the vertex can be given, if they were already calculated (see get_position)."""
+        if self.is_loop():
+            position = self.get_loop_center() + Vec2(0.5, 0)
+            direction = Vec2(0, 1).rotated(radians(self.loop_arrowhead_angle))
+        elif directed:
+            start, position = line or self.get_position(directed)
+            direction = position - start
+        else:
+            return None
+
+        # the nodes are on top of each other, so there's no direction
+        length = direction.magnitude()
+        if length == 0:
+            return None
+
+        # the backwards direction, rotated by 30 degrees both ways
+        x, y = -direction.x / length, -direction.y / length
+        c, s = self.tip_cos * self.arrowhead_size, self.tip_sin * self.arrowhead_size
+
+        return QPolygonF(
+            [
+                QPointF(position.x, position.y),
+                QPointF(position.x + x * c - y * s, position.y + x * s + y * c),
+                QPointF(position.x + x * c + y * s, position.y - x * s + y * c),
+            ]
         )
 
-    def __get_position(self, directed: bool = False) -> Tuple[Vector, Vector]:
+    def get_position(self, directed: bool = False) -> Tuple[Vec2, Vec2]:
         """Return the starting and ending position of the vertex on the screen."""
         # special case for a loop
         if self.is_loop():
             return (self[0].get_position(), self[1].get_position())
 
         # positions of the nodes
-        from_pos = Vector(*self[0].get_position())
-        to_pos = Vector(*self[1].get_position())
+        from_pos = self[0].get_position()
+        to_pos = self[1].get_position()
 
         if to_pos == from_pos:
             return to_pos, to_pos
@@ -714,12 +1545,202 @@ class DrawableVertex(Drawable, Paintable, Selectable, Vertex):
         return start, end
 
 
+class NodeGrid:
+    """A uniform grid of the nodes of a graph (each cell has the nodes whose positions
+    are in it), for quickly finding the objects in some area of the canvas. The nodes
+    notify the grid when they move, which only costs something when they change cells.
+
+    Vertices are found through their nodes: one whose nodes are in the same or in
+    neighbouring cells can only be in the area if one of its nodes is at most one cell
+    away from it. The other (long) vertices are kept separately and tested one by one,
+    but there are few of them, since the vertices are usually shorter than a cell."""
+
+    size = 8  # the width of a cell
+    margin = 3  # how far from its position can an object be drawn (labels, weights...)
+
+    def __init__(self):
+        self.cells: Dict[Tuple[int, int], Set[DrawableNode]] = defaultdict(set)
+        self.node_cells: Dict[DrawableNode, Tuple[int, int]] = {}
+
+        self.long_vertices: Set[DrawableVertex] = set()
+
+    def __get_cell(self, position: Vec2) -> Tuple[int, int]:
+        """Return the cell of the position."""
+        return (int(position.x // self.size), int(position.y // self.size))
+
+    def __is_long(self, vertex: DrawableVertex) -> bool:
+        """Return True if the nodes of the vertex aren't in the same/neighbouring cells."""
+        (x1, y1), (x2, y2) = self.node_cells[vertex[0]], self.node_cells[vertex[1]]
+        return abs(x1 - x2) > 1 or abs(y1 - y2) > 1
+
+    def __update_vertices(self, node: DrawableNode):
+        """Update whether the vertices of the node are long."""
+        for vertex in chain(node.get_adjacent_vertices(), node.get_incoming_vertices()):
+            if self.__is_long(vertex):
+                self.long_vertices.add(vertex)
+            else:
+                self.long_vertices.discard(vertex)
+
+    def add_node(self, node: DrawableNode):
+        """Add the node to the cell of its position."""
+        cell = self.__get_cell(node.get_position())
+
+        self.cells[cell].add(node)
+        self.node_cells[node] = cell
+        node.grid = self
+
+    def remove_node(self, node: DrawableNode):
+        """Remove the node (its vertices have to be removed first)."""
+        cell = self.node_cells.pop(node)
+
+        self.cells[cell].remove(node)
+        if len(self.cells[cell]) == 0:
+            del self.cells[cell]
+
+        node.grid = None
+
+    def move_node(self, node: DrawableNode):
+        """Move the node to the cell of its new position (if it changed)."""
+        cell = self.__get_cell(node.get_position())
+        previous = self.node_cells[node]
+
+        if cell == previous:
+            return
+
+        self.cells[previous].remove(node)
+        if len(self.cells[previous]) == 0:
+            del self.cells[previous]
+
+        self.cells[cell].add(node)
+        self.node_cells[node] = cell
+
+        self.__update_vertices(node)
+
+    def add_vertex(self, vertex: DrawableVertex):
+        """Add a newly added vertex to the long ones, if it is long."""
+        if self.__is_long(vertex):
+            self.long_vertices.add(vertex)
+
+    def remove_vertex(self, vertex: DrawableVertex):
+        """Forget a removed vertex."""
+        self.long_vertices.discard(vertex)
+
+    def __cells_in(
+        self, x1: int, y1: int, x2: int, y2: int
+    ) -> Iterator[Tuple[Tuple[int, int], Set[DrawableNode]]]:
+        """Yield the non-empty cells in the given (inclusive) range and their nodes."""
+        # if the range is larger than the number of the non-empty cells (when the
+        # canvas is zoomed out), it's faster to go through those instead
+        if (x2 - x1 + 1) * (y2 - y1 + 1) > len(self.cells):
+            for (x, y), nodes in self.cells.items():
+                if x1 <= x <= x2 and y1 <= y <= y2:
+                    yield (x, y), nodes
+        else:
+            for x in range(x1, x2 + 1):
+                for y in range(y1, y2 + 1):
+                    if (x, y) in self.cells:
+                        yield (x, y), self.cells[(x, y)]
+
+    @staticmethod
+    def __intersects(vertex: DrawableVertex, rect: QRectF) -> bool:
+        """Return True if the line of the vertex intersects the rectangle (using the
+        Liang–Barsky line clipping algorithm)."""
+        (ax, ay), (bx, by) = vertex[0].get_position(), vertex[1].get_position()
+
+        # most of the lines don't even have their bounding box in it
+        if (
+            max(ax, bx) < rect.left()
+            or min(ax, bx) > rect.right()
+            or max(ay, by) < rect.top()
+            or min(ay, by) > rect.bottom()
+        ):
+            return False
+
+        dx, dy = bx - ax, by - ay
+
+        # the part of the line (from 0 to 1) that is inside of all of the sides
+        start, end = 0, 1
+        for p, q in (
+            (-dx, ax - rect.left()),
+            (dx, rect.right() - ax),
+            (-dy, ay - rect.top()),
+            (dy, rect.bottom() - ay),
+        ):
+            if p == 0:
+                # parallel to the side and outside of it
+                if q < 0:
+                    return False
+            elif p < 0:
+                start = max(start, q / p)
+            else:
+                end = min(end, q / p)
+
+            if start > end:
+                return False
+
+        return True
+
+    def query(
+        self, rect: QRectF
+    ) -> Optional[Tuple[List[DrawableNode], List[DrawableVertex]]]:
+        """Return the nodes and the vertices that could be drawn in the rectangle, or
+        None if all of them could be (so they don't have to be collected)."""
+        rect = rect.adjusted(-self.margin, -self.margin, self.margin, self.margin)
+
+        x1, y1 = self.__get_cell(Vec2(rect.left(), rect.top()))
+        x2, y2 = self.__get_cell(Vec2(rect.right(), rect.bottom()))
+
+        inside, around = set(), set()
+        for (x, y), cell in self.__cells_in(x1 - 1, y1 - 1, x2 + 1, y2 + 1):
+            (inside if x1 <= x <= x2 and y1 <= y <= y2 else around).update(cell)
+
+        # each vertex has a node in the rectangle, if all of the nodes are in it
+        if len(inside) == len(self.node_cells):
+            return None
+
+        # the vertices of the nodes in the rectangle are drawn, the ones of the nodes
+        # around it only if they intersect it (each vertex is only visited through
+        # one of its nodes, so they don't have to be deduplicated)
+        visited = inside | around
+
+        vertices = []
+        for vertex in self.__vertices_of(visited):
+            if vertex[0] in inside or vertex[1] in inside:
+                vertices.append(vertex)
+            elif self.__intersects(vertex, rect):
+                vertices.append(vertex)
+
+        # the long vertices that weren't visited through their nodes
+        for vertex in self.long_vertices:
+            if vertex[0] not in visited and vertex[1] not in visited:
+                if self.__intersects(vertex, rect):
+                    vertices.append(vertex)
+
+        return list(inside), vertices
+
+    @staticmethod
+    def __vertices_of(nodes: Set[DrawableNode]) -> Iterator[DrawableVertex]:
+        """Yield the vertices of the nodes, each one exactly once."""
+        for node in nodes:
+            yield from node.get_adjacent_vertices()
+
+            # the other ones are visited from the node they start in
+            for vertex in node.get_incoming_vertices():
+                if vertex[0] not in nodes:
+                    yield vertex
+
+
 class DrawableGraph(Drawable, Graph):
     """A class for working with graphs that can be drawn."""
 
     vertex_class = DrawableVertex
     node_class = DrawableNode
 
+    # levels of detail, depending on the scale of the painter (pixels per unit)
+    simple_scale = 3  # when smaller, nodes are drawn as points and vertices as lines
+    pixel_scale = 0.5  # when smaller, the points are only a single pixel large
+    readable_size = 5  # labels and weights smaller than this (in pixels) aren't drawn
+
     def __init__(
         self,
         *args,
@@ -729,14 +1750,24 @@ class DrawableGraph(Drawable, Graph):
     ):
         self.show_labels: bool = False  # whether or not to show the labels of nodes
 
-        # a dictionary for calculating the distance from a root node
-        # used in displaying the graph as a tree
-        self.distance_from_root = {}
+        # BFS layers from the root node, used in displaying the graph as a tree
+        self.root_layers = RootLayers()
         self.root = None
 
+        # the tree layout from the root (and the version of the graph it's from)
+        self.tree_layout: Dict[DrawableNode, Vec2] = {}
+        self.tree_layout_version = None
+
+        # a grid of the nodes, so only the visible part of the graph is drawn
+        self.grid = NodeGrid()
+
         # callback when something in the graph is selected/deselected
         self.selected_changed = selected_changed
 
+        # whether the distance to root/selection changed during the current batch
+        self.distance_from_root_changed = False
+        self.selection_changed = False
+
         # callback when the animation has stopped playing
         self.animation_stopped = animation_stopped
 
@@ -749,8 +1780,9 @@ class DrawableGraph(Drawable, Graph):
 
         Graph.__init__(self, *args, **kwargs)
 
-    def draw(self, painter: QPainter, palette: QPalette):
-        """Draw the entire graph."""
+    def draw(self, painter: QPainter, palette: QPalette, rect: QRectF = None):
+        """Draw the graph. If the rectangle is given, only the objects that are in it
+        are drawn (the rest is found out using the grid, without going through it)."""
         # if there are no currently ongoing animations, start some!
         if len(self.animations) != 0:
             # activate multiple parallel or one non-parallel
@@ -773,19 +1805,203 @@ class DrawableGraph(Drawable, Graph):
         # check for animations that have already finished and remove them
         animation_count = len(self.animations)
         while len(self.animations) > 0 and self.animations[0][1].has_finished():
-            self.animations.pop(0)
+            obj, a = self.animations.pop(0)
+
+            # the object gets the final color (unless it's already animated by another
+            # animation), so it doesn't have to be interpolated anymore
+            if obj.get_color() is a:
+                obj.set_color(a.get_end_value())
 
         # callback when the animations stopped playing
         if animation_count != 0 and len(self.animations) == 0:
             self.animation_stopped()
 
-        # first, draw all vertices
-        for vertex in self.get_vertices():
-            vertex.draw(painter, palette, self.is_directed(), self.is_weighted())
+        visible = None if rect is None else self.grid.query(rect)
 
-        # then, draw all nodes
-        for node in self.get_nodes():
-            node.draw(painter, palette, self.show_labels)
+        if visible is None:
+            vertices, nodes = self.get_vertices(), self.get_nodes()
+        else:
+            nodes, vertices = visible
+
+            # sorted, so the objects that overlap are always drawn in the same order
+            nodes = sorted(nodes, key=self.nodes.get_indexes().__getitem__)
+            vertices = sorted(vertices, key=self.vertices.get_indexes().__getitem__)
+
+        scale = painter.worldTransform().m11()
+
+        # antialiasing is not needed when the nodes are only a few pixels large
+        painter.setRenderHint(QPainter.Antialiasing, scale >= self.simple_scale)
+
+        if scale < self.simple_scale:
+            self.__draw_simple(painter, palette, vertices, nodes)
+            return
+
+        # the sizes of the texts in pixels (the label one is approximate, since it
+        # depends on the length of the label)
+        font_height = QFontMetrics(painter.font()).height()
+        weight_size = DrawableVertex.text_scale * font_height * scale
+        label_size = DrawableNode.label_size / 2 * scale
+
+        weighted = self.is_weighted() and weight_size >= self.readable_size
+        show_labels = self.show_labels and label_size >= self.readable_size
+
+        self.__draw_detailed(painter, palette, vertices, nodes, weighted, show_labels)
+
+    def __draw_detailed(
+        self,
+        painter: QPainter,
+        palette: QPalette,
+        vertices: Iterable[DrawableVertex],
+        nodes: Iterable[DrawableNode],
+        weighted: bool,
+        show_labels: bool,
+    ):
+        """Draw the vertices and the nodes the same way they draw themselves, but
+        grouped by their pens and brushes, so each of them is only set once and the
+        lines of each pen are drawn as a single path. The labels are drawn after all
+        of the nodes, so they're on top of the neighbouring nodes."""
+        directed = self.is_directed()
+
+        # for each pen of the vertices: the brush of its tips, the coordinates of the
+        # lines (x1, y1, x2, y2, ...), the centers of the loops and the tips
+        styles = {}
+        for vertex in vertices:
+            pen = vertex.pen(palette)
+
+            if id(pen) not in styles:
+                brush = Brush(vertex.pen.get_color())(palette)
+                styles[id(pen)] = (pen, brush, [], [], [])
+
+            _, _, lines, loops, tips = styles[id(pen)]
+
+            if vertex.is_loop():
+                line = None
+                loops.append(vertex.get_loop_center())
+            else:
+                line = start, end = vertex.get_position(directed)
+                lines.extend((start.x, start.y, end.x, end.y))
+
+            tip = vertex.get_tip(directed, line)
+            if tip is not None:
+                tips.append(tip)
+
+        for pen, brush, lines, loops, tips in styles.values():
+            painter.setPen(pen)
+            painter.setBrush(Qt.NoBrush)
+
+            if len(lines) != 0:
+                painter.drawPath(self.__get_lines_path(lines))
+
+            for center in loops:
+                painter.drawEllipse(QPointF(center.x, center.y), 0.5, 0.5)
+
+            painter.setBrush(brush)
+            for tip in tips:
+                painter.drawPolygon(tip)
+
+        if weighted:
+            for vertex in vertices:
+                vertex.draw_weight(painter, palette, directed)
+
+        # the positions of the nodes for each pen and brush
+        styles = {}
+        for node in nodes:
+            pen, brush = node.pen(palette), node.brush(palette)
+
+            if (id(pen), id(brush)) not in styles:
+                styles[(id(pen), id(brush))] = (pen, brush, [])
+
+            styles[(id(pen), id(brush))][2].append(node.get_position())
+
+        for pen, brush, positions in styles.values():
+            painter.setPen(pen)
+            painter.setBrush(brush)
+
+            # draw ellipses with radius 1 (a path of all of them is much slower)
+            for position in positions:
+                painter.drawEllipse(QPointF(position.x, position.y), 1, 1)
+
+        if show_labels:
+            for node in nodes:
+                node.draw_label(painter, palette)
+
+    def __draw_simple(
+        self,
+        painter: QPainter,
+        palette: QPalette,
+        vertices: Iterable[DrawableVertex],
+        nodes: Iterable[DrawableNode],
+    ):
+        """Draw the vertices as lines (without the arrowheads, weights and loops) and
+        the nodes as points. Objects of the same color are drawn in a single call."""
+        directed = self.is_directed()
+        indexes = self.nodes.get_indexes()
+
+        # the coordinates of the lines/points of each color
+        lines = defaultdict(list)
+        for vertex in vertices:
+            n1, n2 = vertex[0], vertex[1]
+
+            # a line of an undirected graph is drawn only once (not for both vertices)
+            if n1 is n2 or not directed and indexes[n1] > indexes[n2]:
+                continue
+
+            a, b = n1.get_position(), n2.get_position()
+            lines[vertex.pen.get_color()].extend((a.x, a.y, b.x, b.y))
+
+        for color, coordinates in lines.items():
+            painter.setPen(QPen(color(palette), 0))  # 0 is a one pixel wide line
+            painter.drawPath(self.__get_lines_path(coordinates))
+
+        # selected nodes are filled with the background (only their outline is seen),
+        # so their points have the color of the outline, not to disappear
+        points = defaultdict(list)
+        for node in nodes:
+            position = node.get_position()
+            color = node.pen.get_color() if node.is_selected() else node.get_color()
+
+            points[color].extend((position.x, position.y))
+
+        # the points have the size of the nodes, unless they'd be smaller than a pixel
+        # (they're square, since round ones are much slower to draw and look the same)
+        size = 0 if painter.worldTransform().m11() < self.pixel_scale else 2
+
+        for color, coordinates in points.items():
+            painter.setPen(QPen(color(palette), size, Qt.SolidLine, Qt.SquareCap))
+            painter.drawPoints(self.__get_points_polygon(coordinates))
+
+    @staticmethod
+    def __get_lines_path(coordinates: List[float]) -> QPainterPath:
+        """Return a path of lines, given their coordinates (x1, y1, x2, y2, ...). The
+        path is read from the format QDataStream uses for it, which is much faster
+        than creating a QLineF object for each line."""
+        count = len(coordinates) // 2
+
+        # each element of the path is its type (move to, line to) and its coordinates
+        elements = np.empty(count, dtype=[("type", ">i4"), ("x", ">f8"), ("y", ">f8")])
+        elements["type"] = np.arange(count) % 2
+        elements["x"] = coordinates[0::2]
+        elements["y"] = coordinates[1::2]
+
+        # the number of elements, the elements and the fill rule
+        data = np.array([count], dtype=">i4").tobytes() + elements.tobytes()
+        data += np.array([0], dtype=">i4").tobytes()
+
+        path = QPainterPath()
+        QDataStream(QByteArray(data)) >> path
+        return path
+
+    @staticmethod
+    def __get_points_polygon(coordinates: List[float]) -> QPolygonF:
+        """Return a polygon of points, given their coordinates (x1, y1, x2, y2, ...).
+        The coordinates are written to the memory of the polygon directly."""
+        polygon = QPolygonF(len(coordinates) // 2)
+
+        memory = polygon.data()
+        memory.setsize(len(coordinates) * 8)
+        np.frombuffer(memory, dtype=np.float64)[:] = coordinates
+
+        return polygon
 
     def change_color(
         self, obj: Union[DrawableNode, DrawableVertex], c: Color, **kwargs
@@ -826,7 +2042,10 @@ class DrawableGraph(Drawable, Graph):
         if len(self.animations) == 0:
             self.change_color_to_selected(obj)
 
-        self.selected_changed()
+        if self.in_batch():
+            self.selection_changed = True
+        else:
+            self.selected_changed()
 
     def get_selected_nodes(self) -> List[DrawableNode]:
         """Return a list of all currently selected nodes."""
@@ -848,92 +2067,150 @@ class DrawableGraph(Drawable, Graph):
         """Whether to show the node labels or not."""
         self.show_labels = value
 
-    def recalculate_distance_to_root(function):
-        """A decorator for recalculating the distance from the root node to the rest of
-        the graph."""
-
-        def wrapper(self, *args, **kwargs):
-            # first add/remove vertex/node/whatever
-            function(self, *args, **kwargs)
-
-            self.distance_from_root = {}
-
-            # don't do anything if the root
-            if self.get_root() is None:
-                return
-
-            # else run the BFS to calculate the distances
-            queue = [(self.root, 1)]
-            closed = set()
-            self.distance_from_root[0] = [self.root]
-
-            while len(queue) != 0:
-                current, distance = queue.pop(0)
-
-                for adjacent in current.get_adjacent_nodes():
-                    if adjacent not in closed:
-                        if distance not in self.distance_from_root:
-                            self.distance_from_root[distance] = []
+    def _update_distance_to_root(self, function: Callable, *args):
+        """Update the distance from the root node to the rest of the graph by calling
+        the function (a RootLayers method). If we're in a batch, the distances are only
+        recalculated once it ends."""
+        if self.in_batch():
+            self.distance_from_root_changed = True
+        else:
+            function(*args)
 
-                        queue.append((adjacent, distance + 1))
-                        self.distance_from_root[distance].append(adjacent)
+    def _batch_ended(self):
+        """Recalculate the distance to root and call the selection callback, if they
+        changed during the batch."""
+        super()._batch_ended()
 
-                closed.add(current)
+        if self.distance_from_root_changed:
+            self.distance_from_root_changed = False
+            self.root_layers.set_root(self.root)
+            self.tree_layout_version = None
 
-        return wrapper
+        if self.selection_changed:
+            self.selection_changed = False
+            self.selected_changed()
 
-    @recalculate_distance_to_root
     def set_root(self, node: DrawableNode):
         """Set a node as the root of the tree."""
         self.root = node
+        self.version += 1
+        self._update_distance_to_root(self.root_layers.set_root, node)
 
     def get_root(self) -> Optional[DrawableNode]:
         """Return the root of the tree (or None if there is none)."""
         return self.root
 
-    @recalculate_distance_to_root
-    def add_vertex(self, *args, **kwargs):
-        super().add_vertex(*args, **kwargs)
+    def _apply_annotation(self, parts: List[str], get_node: Callable[[str], Node]):
+        """Apply an annotation of an imported file to the graph. On top of the graph
+        ones, a drawable graph understands the '# position <name> <x> <y>' and the
+        '# root <name>' annotations, so the graph's layout can be restored."""
+        if parts[0] == "position" and len(parts) == 4:
+            get_node(parts[1]).set_position(Vec2(float(parts[2]), float(parts[3])))
+        elif parts[0] == "root" and len(parts) == 2:
+            self.set_root(get_node(parts[1]))
+        else:
+            super()._apply_annotation(parts, get_node)
+
+    def _iter_annotations(self, names: Dict[Node, str]) -> Iterator[List[str]]:
+        """Yield the annotations of the exported graph. Since the positions make all
+        of the nodes part of the file, the '# node' annotations aren't needed."""
+        if self.is_directed():
+            yield ["directed"]
+
+        for node in self.get_nodes():
+            x, y = node.get_position()
+            yield ["position", names[node], repr(float(x)), repr(float(y))]
 
-    @recalculate_distance_to_root
-    def remove_vertex(self, *args, **kwargs):
-        super().remove_vertex(*args, **kwargs)
+        if self.get_root() is not None:
+            yield ["root", names[self.get_root()]]
 
-    @recalculate_distance_to_root
     def add_node(self, node: DrawableNode):
         super().add_node(node)
+        self.grid.add_node(node)
+
+    def _add_vertex(self, vertex: DrawableVertex):
+        super()._add_vertex(vertex)
+        self.grid.add_vertex(vertex)
+
+    def _add_vertices(self, vertices: List[DrawableVertex]):
+        super()._add_vertices(vertices)
+
+        for vertex in vertices:
+            self.grid.add_vertex(vertex)
+
+        self._update_distance_to_root(self.root_layers.recalculate)
+
+    def _remove_vertex(self, vertex: DrawableVertex):
+        super()._remove_vertex(vertex)
+        self.grid.remove_vertex(vertex)
+
+    def add_vertex(self, n1: DrawableNode, n2: DrawableNode, *args, **kwargs):
+        super().add_vertex(n1, n2, *args, **kwargs)
+
+        self._update_distance_to_root(self.root_layers.add_vertex, n1, n2)
+        if not self.is_directed():
+            self._update_distance_to_root(self.root_layers.add_vertex, n2, n1)
+
+    def remove_vertex(self, n1: DrawableNode, n2: DrawableNode):
+        super().remove_vertex(n1, n2)
 
-    @recalculate_distance_to_root
-    def remove_node(self, node, **kwargs):
+        self._update_distance_to_root(self.root_layers.remove_vertex, n1, n2)
+        if not self.is_directed():
+            self._update_distance_to_root(self.root_layers.remove_vertex, n2, n1)
+
+    def remove_node(self, node: DrawableNode, **kwargs):
         # check, if we're not removing the root; if we are, act accordingly
         if node is self.root:
             self.set_root(None)
 
+        adjacent = list(node.get_adjacent_nodes())
         super().remove_node(node, **kwargs)
+        self.grid.remove_node(node)
+
+        self._update_distance_to_root(self.root_layers.remove_node, node, adjacent)
 
     def deselect_all(self):
         """Deselect all nodes and vertices."""
-        for node in self.get_nodes():
-            self.deselect(node)
+        with self.batch():
+            for node in self.get_nodes():
+                self.deselect(node)
 
-        for vertex in self.get_vertices():
-            self.deselect(vertex)
+            for vertex in self.get_vertices():
+                self.deselect(vertex)
 
-    def node_at_position(self, position: Vector) -> Optional[DrawableNode]:
+    def node_at_position(self, position: Vec2) -> Optional[DrawableNode]:
         """Returns a Node if there is one at the given position, else None."""
         for node in self.get_nodes():
             if position.distance(node.get_position()) <= 1:
                 return node
 
-    def get_distance_from_root(self) -> Dict[int, List[DrawableNode]]:
+    def get_distance_from_root(self) -> Dict[int, Set[DrawableNode]]:
         """Return the resulting dictionary of a BFS ran from the root node."""
-        return self.distance_from_root
+        return self.root_layers.get_layers()
 
-    def vertices_at_position(self, position: Vector) -> List[Vertex]:
-        """Returns vertices at the given position."""
-        vertices = []
+    def get_tree_layout(self) -> Dict[DrawableNode, Vec2]:
+        """Return the positions of the nodes reachable from the root in the tree layout
+        (relative to the root). Only recalculated when the graph changes."""
+        if self.tree_layout_version != self.version:
+            self.tree_layout_version = self.version
 
-        for vertex in self.get_vertices():
+            if self.root is None:
+                self.tree_layout = {}
+            else:
+                self.tree_layout = TreeLayout.calculate(
+                    self.get_nodes(), self.get_distance_from_root()
+                )
+
+        return self.tree_layout
+
+    def vertices_at_position(self, position: Vec2) -> List[Vertex]:
+        """Returns vertices at the given position. Only the vertices near it (found
+        using the grid) are tested."""
+        nearby = self.grid.query(QRectF(position.x - 1, position.y - 1, 2, 2))
+        candidates = self.get_vertices() if nearby is None else nearby[1]
+
+        vertices = []
+        for vertex in candidates:
             if vertex._get_weight_box(self.is_directed()).contains(*position):
                 vertices.append(vertex)
 
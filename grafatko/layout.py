@@ -0,0 +1,113 @@
+"""Algorithms that calculate the layout of a graph directly (not by live simulation)."""
+
+from __future__ import annotations
+
+from math import sqrt
+
+from grafatko.forces import *
+
+
+class MultilevelLayout:
+    """Lays out a graph by repeatedly coarsening it (merging pairs of adjacent nodes),
+    laying out the coarsest graph and going back through the levels, placing each node
+    where the node it was merged into is and refining the layout by simulating a few
+    steps of the forces. The coarse levels untangle the graph globally, so the finer
+    ones only have to fix it locally, which is much faster than simulating the forces
+    on the whole graph from the start."""
+
+    minimum = 50  # graphs with at most this many nodes are not coarsened further
+    shrink = 0.8  # neither are the ones whose coarser level has more of their nodes
+    steps = 50  # the number of steps simulated on each level
+    spacing = 6  # the distance of the nodes on the coarsest level (the vertex length)
+
+    def __init__(self, engine: ArrayEngine, seed: Optional[int] = 0):
+        self.engine = engine
+        self.random = np.random.default_rng(seed)
+
+    def layout(self, structure: Structure) -> np.ndarray:
+        """Return the positions of the nodes of the structure."""
+        levels, parents = self.coarsen(structure)
+
+        # the coarsest level starts at random positions (in an area proportional to
+        # the number of its nodes)
+        count = len(levels[-1].groups)
+        positions = (self.random.random((count, 2)) - 0.5) * self.spacing * sqrt(count)
+        positions = self.__refine(positions, levels[-1])
+
+        for level, parent in zip(reversed(levels[:-1]), reversed(parents)):
+            positions = self.__refine(self.prolong(positions, parent), level)
+
+        return positions
+
+    def coarsen(self, structure: Structure) -> Tuple[List[Structure], List[np.ndarray]]:
+        """Return the levels of the structure (from the structure itself to the
+        coarsest one) and for each level but the coarsest, the node of the next level
+        that each of its nodes is merged into."""
+        levels = [structure]
+        parents = []
+
+        while len(levels[-1].groups) > self.minimum:
+            parent, count = self.__match(levels[-1])
+
+            if count > self.shrink * len(levels[-1].groups):
+                break
+
+            parents.append(parent)
+            levels.append(self.__coarsen(levels[-1], parent, count))
+
+        return levels, parents
+
+    def prolong(self, positions: np.ndarray, parent: np.ndarray) -> np.ndarray:
+        """Return the positions of the nodes of a finer level, placed where the nodes
+        they were merged into (whose positions are given) are."""
+        # the finer level takes up more space (and the merged nodes are moved apart
+        # slightly, so they're not on top of each other)
+        scale = sqrt(len(parent) / len(positions))
+        positions = positions[parent] * scale
+
+        return positions + self.random.random(positions.shape) - 0.5
+
+    def __match(self, structure: Structure) -> Tuple[np.ndarray, int]:
+        """Greedily match the adjacent nodes (going through the vertices in a random
+        order), returning the node of the coarser level that each of them is merged
+        into and the number of the nodes of the coarser level."""
+        parent = [-1] * len(structure.groups)
+        count = 0
+
+        order = self.random.permutation(len(structure.edges))
+        for u, v in structure.edges[order].tolist():
+            if parent[u] == -1 and parent[v] == -1:
+                parent[u] = parent[v] = count
+                count += 1
+
+        # the nodes that weren't matched stay as they are
+        for i in range(len(parent)):
+            if parent[i] == -1:
+                parent[i] = count
+                count += 1
+
+        return np.array(parent, dtype=np.int64), count
+
+    @staticmethod
+    def __coarsen(structure: Structure, parent: np.ndarray, count: int) -> Structure:
+        """Return the structure of the coarser level (vertices of the merged nodes are
+        merged too). It has no tree layout, since it wouldn't make sense."""
+        edges = np.sort(parent[structure.edges], axis=1)
+        edges = np.unique(edges[edges[:, 0] != edges[:, 1]], axis=0).reshape(-1, 2)
+
+        groups = np.empty(count, dtype=np.int64)
+        groups[parent] = structure.groups
+
+        return Structure(groups, edges, np.full((count, 2), np.nan), None)
+
+    def __refine(self, positions: np.ndarray, structure: Structure) -> np.ndarray:
+        """Simulate the forces on a level for a few steps, returning the positions."""
+        moving = np.ones(len(positions), dtype=bool)
+
+        components = int(structure.groups.max(initial=-1)) + 1
+        state = self.engine.get_integrator().initial_state(components)
+
+        for _ in range(self.steps):
+            positions = self.engine.simulate(positions, moving, structure, state)
+
+        return positions
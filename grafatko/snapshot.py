@@ -0,0 +1,284 @@
+"""A binary (memory-mappable) format for storing snapshots of graphs.
+
+The file starts with a header (see HEADER), followed by these arrays (all of them
+little-endian and each starting at a multiple of 8 bytes):
+
+- positions (float64, nodes x 2) -- positions of the nodes
+- node colors (uint16, nodes) -- indexes to the color table (0 is the default color)
+- label offsets (int64, nodes + 1) -- label i is strings[offsets[i]:offsets[i + 1]]
+- vertex from, vertex to (int32, vertices) -- the indexes of the nodes of the vertices
+- weights (float64, vertices) -- the weights of the vertices
+- vertex colors (uint16, vertices) -- indexes to the color table
+- strings (uint8, string table size) -- UTF-8 encoded labels of the nodes
+- colors (uint8, color table size) -- JSON list of the descriptions of the colors
+
+Undirected vertices are only stored once. Loading a snapshot maps the file to memory
+and copies the arrays out of it without parsing anything. A CompactGraph is created
+from the arrays directly, but other graphs are still built from them as node and vertex
+objects, which takes about as long as importing the text format (what's saved is
+calculating the positions of the nodes).
+
+The weights are stored as float64, so only numbers that it can represent exactly can be
+saved (integers up to 2 ** 53); saving other weights raises a ValueError."""
+
+from __future__ import annotations
+
+import json
+import mmap
+import struct
+
+import numpy as np
+
+from grafatko.graph import *
+from grafatko.compact import *
+
+
+MAGIC = b"GRAFATKO"
+VERSION = 1
+
+# magic, version, flags, nodes, vertices, root (-1 if none), strings, colors
+HEADER = struct.Struct("<8sIIqqqqq")
+
+DIRECTED = 1
+WEIGHTED = 2
+
+
+def is_snapshot(path: str) -> bool:
+    """Return True if the file at the given path is a graph snapshot."""
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _describe_color(color: ColorGenerating, keys: Dict[Color, Hashable]) -> Any:
+    """Return a description of an interned color (given the keys of the interned
+    colors), from which it can be created again, or None if it isn't interned (like
+    the colors of animations)."""
+    key = keys.get(color)
+
+    if key is None or isinstance(key, str):
+        return key
+
+    # the derived colors (like (color, "lighter", 150)) are described by the
+    # operation, the description of the color they're derived from and its arguments
+    description = _describe_color(key[0], keys)
+
+    if description is None:
+        return None
+
+    return [key[1], description, *key[2:]]
+
+
+def _create_color(description: Any) -> Color:
+    """Create (get) the color from its description (see _describe_color)."""
+    if isinstance(description, str):
+        return getattr(Color, description)()
+
+    operation, color, *arguments = description
+
+    if operation == "contrast":
+        return Color.contrast(_create_color(color))
+
+    return getattr(_create_color(color), operation)(*arguments)
+
+
+def save_snapshot(graph: Graph, file: Union[str, BinaryIO]):
+    """Save the snapshot of the graph to a file (given either by its path or as an
+    open binary file)."""
+    if isinstance(file, str):
+        with open(file, "wb") as f:
+            return save_snapshot(graph, f)
+
+    nodes = graph.get_nodes()
+    indexes = {node: i for i, node in enumerate(nodes)}
+
+    vertices = [
+        vertex
+        for vertex in graph.get_vertices()
+        if graph.is_directed() or indexes[vertex[0]] < indexes[vertex[1]]
+    ]
+
+    # the default colors aren't stored, so the objects keep sharing their brushes
+    keys = {color: key for key, color in Color.interned.items()}
+    table: Dict[str, int] = {}
+
+    def get_color_index(color: ColorGenerating) -> int:
+        description = _describe_color(color, keys)
+
+        if description is None or color is Paintable.default_brush.get_color():
+            return 0
+
+        return table.setdefault(json.dumps(description), len(table) + 1)
+
+    # drawable nodes and vertices also have positions and colors
+    positions = np.zeros((len(nodes), 2), dtype="<f8")
+    node_colors = np.zeros(len(nodes), dtype="<u2")
+    vertex_colors = np.zeros(len(vertices), dtype="<u2")
+
+    for i, node in enumerate(nodes):
+        if isinstance(node, DrawableNode):
+            positions[i] = tuple(node.get_position())
+            node_colors[i] = get_color_index(node.get_color())
+
+    for i, vertex in enumerate(vertices):
+        if isinstance(vertex, DrawableVertex):
+            vertex_colors[i] = get_color_index(vertex.get_color())
+
+    labels = [(node.get_label() or "").encode() for node in nodes]
+    label_offsets = np.zeros(len(labels) + 1, dtype="<i8")
+    np.cumsum([len(label) for label in labels], out=label_offsets[1:])
+
+    colors = ("[" + ",".join(table) + "]").encode()
+
+    # drawable graphs also have a root
+    root = graph.get_root() if isinstance(graph, DrawableGraph) else None
+
+    flags = (DIRECTED if graph.is_directed() else 0) | (
+        WEIGHTED if graph.is_weighted() else 0
+    )
+
+    file.write(
+        HEADER.pack(
+            MAGIC,
+            VERSION,
+            flags,
+            len(nodes),
+            len(vertices),
+            -1 if root is None else indexes[root],
+            int(label_offsets[-1]),
+            len(colors),
+        )
+    )
+
+    arrays = [
+        positions,
+        node_colors,
+        label_offsets,
+        np.array([indexes[vertex[0]] for vertex in vertices], dtype="<i4"),
+        np.array([indexes[vertex[1]] for vertex in vertices], dtype="<i4"),
+        np.array([check_weight(vertex.get_weight()) for vertex in vertices], "<f8"),
+        vertex_colors,
+        np.frombuffer(b"".join(labels), dtype="u1"),
+        np.frombuffer(colors, dtype="u1"),
+    ]
+
+    position = HEADER.size
+    for array in arrays:
+        padding = -position % 8
+        file.write(bytes(padding))
+        file.write(array.tobytes())
+
+        position += padding + array.nbytes
+
+
+def load_snapshot(
+    path: str, cls: Type[Union[Graph, CompactGraph]] = Graph, *args, **kwargs
+) -> Union[Graph, CompactGraph]:
+    """Load the graph (of the given class, created with the given arguments) from the
+    snapshot in the file at the given path. The class can also be CompactGraph."""
+    with open(path, "rb") as f, mmap.mmap(
+        f.fileno(), 0, access=mmap.ACCESS_READ
+    ) as buffer:
+        magic, version, flags, nodes, vertices, root, strings, colors = HEADER.unpack(
+            buffer[: HEADER.size]
+        )
+
+        if magic != MAGIC:
+            raise ValueError("The file is not a graph snapshot.")
+
+        if version != VERSION:
+            raise ValueError(f"Unsupported graph snapshot version {version}.")
+
+        position = HEADER.size
+
+        def read(dtype: str, count: int, shape: Tuple[int, ...] = ()) -> np.ndarray:
+            """Return a copy of the next array (so the buffer can be closed)."""
+            nonlocal position
+            position += -position % 8
+
+            array = np.frombuffer(
+                buffer, dtype=dtype, count=count * int(np.prod(shape)), offset=position
+            ).copy()
+            position += array.nbytes
+
+            return array.reshape((count,) + shape)
+
+        positions = read("<f8", nodes, (2,))
+        node_colors = read("<u2", nodes)
+        label_offsets = read("<i8", nodes + 1).tolist()
+
+        n1 = read("<i4", vertices)
+        n2 = read("<i4", vertices)
+        weights = read("<f8", vertices)
+        vertex_colors = read("<u2", vertices)
+
+        table = read("u1", strings).tobytes()
+        color_descriptions = json.loads(read("u1", colors).tobytes())
+
+    # empty labels are stored as empty strings
+    labels = [
+        table[label_offsets[i] : label_offsets[i + 1]].decode() or None
+        for i in range(nodes)
+    ]
+
+    color_table = [None] + [
+        _create_color(description) for description in color_descriptions
+    ]
+
+    directed, weighted = bool(flags & DIRECTED), bool(flags & WEIGHTED)
+
+    if issubclass(cls, CompactGraph):
+        return cls.from_arrays(
+            directed,
+            weighted,
+            labels,
+            n1,
+            n2,
+            weights,
+            positions,
+            node_colors,
+            vertex_colors,
+            color_table[1:],
+        )
+
+    positions, node_colors = positions.tolist(), node_colors.tolist()
+    n1, n2, vertex_colors = n1.tolist(), n2.tolist(), vertex_colors.tolist()
+
+    # keep integer weights integers
+    weights = [to_weight(weight) for weight in weights.tolist()]
+
+    graph = cls(*args, **kwargs)
+    graph.set_directed(directed)
+    graph.set_weighted(weighted)
+
+    with graph.batch(), paused_collection():
+        drawable = issubclass(cls.node_class, DrawableNode)
+
+        if drawable:
+            nodes = [
+                cls.node_class(label=label, position=Vec2(x, y))
+                for label, (x, y) in zip(labels, positions)
+            ]
+
+            for node, color in zip(nodes, node_colors):
+                if color != 0:
+                    node.set_color(color_table[color])
+        else:
+            nodes = [cls.node_class(label=label) for label in labels]
+
+        graph._populate(nodes, zip(n1, n2, weights))
+
+        if drawable and any(color != 0 for color in vertex_colors):
+            for i, j, color in zip(n1, n2, vertex_colors):
+                if color != 0:
+                    graph.get_vertex(nodes[i], nodes[j]).set_color(color_table[color])
+
+                    if not graph.is_directed():
+                        graph.get_vertex(nodes[j], nodes[i]).set_color(
+                            color_table[color]
+                        )
+
+        # drawable graphs also have a root
+        if isinstance(graph, DrawableGraph) and root != -1:
+            graph.set_root(nodes[root])
+
+    return graph
@@ -3,111 +3,221 @@
 from __future__ import annotations
 from typing import *
 
-from math import sqrt, sin, cos
+import gc
+
+from math import sin, cos, hypot
 from dataclasses import *
+from contextlib import contextmanager
 
 
-Number = Union[int, float, complex]
+class Vec2:
+    """A two-dimensional vector and some of its operations. The components are stored in
+    slots and the operations work with them directly, so it's fast.
 
-class Vector:
-    """A Python implementation of a vector class and some of its operations."""
+    The in-place operators (+=, -=, *=, /=) modify the vector, so they should only be
+    used on vectors that are not shared (like the result of an operation), not on
+    positions returned by getters."""
 
-    values: List[Number] = None
+    __slots__ = ("x", "y")
 
-    def __init__(self, *args):
-        self.values = list(args)
+    def __init__(self, x: float = 0, y: float = 0):
+        self.x = x
+        self.y = y
 
     def __str__(self):
         """String representation of a vector is its components surrounded by < and >."""
-        return f"<{str(self.values)[1:-1]}>"
+        return f"<{self.x}, {self.y}>"
 
     __repr__ = __str__
 
     def __len__(self):
-        return len(self.values)
+        return 2
+
+    def __iter__(self):
+        return iter((self.x, self.y))
 
     def __hash__(self):
         """Defines the hash of the vector as a hash of a tuple with its components."""
-        return hash(tuple(self))
+        return hash((self.x, self.y))
 
-    def __eq__(self, other: Vector):
-        return self.values == other.values
+    def __eq__(self, other: Vec2):
+        return self.x == other.x and self.y == other.y
 
-    def __setitem__(self, i: int, value: Number):
-        self.values[i] = value
+    def __setitem__(self, i: int, value: float):
+        if i == 0 or i == -2:
+            self.x = value
+        elif i == 1 or i == -1:
+            self.y = value
+        else:
+            raise IndexError("Vec2 index out of range")
 
     def __getitem__(self, i: int):
-        return self.values[i]
+        return (self.x, self.y)[i]
 
     def __neg__(self):
-        return Vector(*iter(-component for component in self))
+        return Vec2(-self.x, -self.y)
 
-    def __add__(self, other: Vector):
-        return Vector(*iter(u + v for u, v in zip(self, other)))
+    def __add__(self, other: Vec2):
+        return Vec2(self.x + other.x, self.y + other.y)
 
-    __iadd__ = __add__
+    def __iadd__(self, other: Vec2):
+        self.x += other.x
+        self.y += other.y
+        return self
 
-    def __sub__(self, other: Vector):
-        return self + (-other)
+    def __sub__(self, other: Vec2):
+        return Vec2(self.x - other.x, self.y - other.y)
 
-    __isub__ = __sub__
+    def __isub__(self, other: Vec2):
+        self.x -= other.x
+        self.y -= other.y
+        return self
 
-    def __mul__(self, other: Vector):
+    def __mul__(self, other: Union[Vec2, float]):
         """Defines scalar and dot product of a vector."""
-        if type(other) in (int, float, complex):
-            return Vector(*iter(component * other for component in self))
+        if type(other) is Vec2:
+            return self.x * other.x + self.y * other.y
         else:
-            return sum(u * v for u, v in zip(self, other))
+            return Vec2(self.x * other, self.y * other)
 
-    __rmul__ = __imul__ = __mul__
+    __rmul__ = __mul__
 
-    def __truediv__(self, other: Number):
+    def __imul__(self, other: float):
+        self.x *= other
+        self.y *= other
+        return self
+
+    def __truediv__(self, other: float):
         """Defines vector division by a scalar."""
-        return Vector(*iter(component / other for component in self))
+        return Vec2(self.x / other, self.y / other)
+
+    def __itruediv__(self, other: float):
+        self.x /= other
+        self.y /= other
+        return self
 
-    def __floordiv__(self, other: Number):
+    def __floordiv__(self, other: float):
         """Defines floor vector division by a scalar."""
-        return Vector(*iter(component // other for component in self))
+        return Vec2(self.x // other, self.y // other)
+
+    def copy(self) -> Vec2:
+        """Return a copy of the vector (for using the in-place operators on it)."""
+        return Vec2(self.x, self.y)
 
     def magnitude(self):
         """Returns the magnitude of the vector."""
-        return sqrt(sum(component ** 2 for component in self))
+        return hypot(self.x, self.y)
 
-    def rotated(self, angle: float, point: Vector = None):
+    def rotated(self, angle: float, point: Vec2 = None):
         """Returns this vector rotated by an angle (in radians) around a certain point."""
-        if point is None:
-            point = Vector(0, 0)
+        c, s = cos(angle), sin(angle)
 
-        return self.__rotated(angle, self - point) + point
+        if point is None:
+            return Vec2(self.x * c - self.y * s, self.x * s + self.y * c)
 
-    def __rotated(self, angle: float, vector: Vector):
-        """Returns a vector rotated by an angle (in radians)."""
-        return Vector(
-            vector[0] * cos(angle) - vector[1] * sin(angle),
-            vector[0] * sin(angle) + vector[1] * cos(angle),
-        )
+        x, y = self.x - point.x, self.y - point.y
+        return Vec2(x * c - y * s + point.x, x * s + y * c + point.y)
 
     def unit(self):
         """Returns a unit vector with the same direction as this vector."""
         return self / self.magnitude()
 
-    def distance(self, other: Vector):
-        """Returns the distance of two Vectors in space."""
-        return sqrt(sum(map(lambda x: sum(x) ** 2, zip(self, -other))))
-
-    def repeat(self, n: int):
-        """Performs sequence repetition on the vector (n times)."""
-        return Vector(*self.values * n)
+    def distance(self, other: Vec2):
+        """Returns the distance of two vectors in space."""
+        return hypot(self.x - other.x, self.y - other.y)
 
     @classmethod
-    def sum(cls, l: List[Vector]):
+    def sum(cls, l: Sequence[Vec2]):
         """Return the sum of the given vectors."""
-        return sum(l[1:], l[0])
+        x = y = 0
+        for vector in l:
+            x += vector.x
+            y += vector.y
+
+        return Vec2(x, y)
 
     @classmethod
-    def average(cls, l: List[Vector]):
+    def average(cls, l: Sequence[Vec2]):
         """Return the average of the given vectors."""
-        return Vector.sum(l) / len(l)
+        return Vec2.sum(l) / len(l)
+
+
+# the previous name of the vector class (kept for the algorithms written with it)
+Vector = Vec2
+
+
+class OrderedSet:
+    """A set that keeps the order in which its elements were added (removing one keeps
+    the order of the others), with constant-time adding, removing and membership tests.
+
+    The list of the elements (and the index of each of them) is only created when it's
+    needed and then kept until the set changes, so it's shared -- don't modify it."""
+
+    def __init__(self, iterable: Iterable = ()):
+        # a dictionary keeps the order of its keys (and removing one keeps the rest)
+        self.elements: Dict[Any, None] = dict.fromkeys(iterable)
+
+        self.list: Optional[List] = None
+        self.indexes: Optional[Dict[Any, int]] = None
+
+    def __len__(self):
+        return len(self.elements)
+
+    def __iter__(self):
+        return iter(self.get_list())
+
+    def __contains__(self, element) -> bool:
+        return element in self.elements
+
+    def __changed(self):
+        """Forget the list of the elements and their indexes, since the set changed."""
+        self.list = None
+        self.indexes = None
+
+    def add(self, element):
+        """Add the element to the end of the set (if it's not already in it)."""
+        if element not in self.elements:
+            self.elements[element] = None
+            self.__changed()
+
+    def update(self, elements: Iterable):
+        """Add the elements (that aren't already in it) to the end of the set."""
+        self.elements.update(dict.fromkeys(elements))
+        self.__changed()
+
+    def remove(self, element):
+        """Remove the element from the set."""
+        del self.elements[element]
+        self.__changed()
+
+    def get_list(self) -> List:
+        """Return a list of the elements, in the order in which they were added."""
+        if self.list is None:
+            self.list = list(self.elements)
+
+        return self.list
+
+    def get_indexes(self) -> Dict[Any, int]:
+        """Return a dictionary of the index of each element in the list of elements."""
+        if self.indexes is None:
+            self.indexes = dict(zip(self.get_list(), range(len(self.elements))))
+
+        return self.indexes
+
+
+@contextmanager
+def paused_collection():
+    """A context manager that pauses the garbage collector. Creating a lot of objects
+    that aren't garbage (like when building a large graph) triggers a lot of
+    collections otherwise, which are useless and take a lot of time."""
+    enabled = gc.isenabled()
+    gc.disable()
+
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
 
 
 @dataclass
@@ -118,32 +228,38 @@ class Transformation:
 
     # initial scale and transformation
     scale: float = 20
-    translation: float = Vector(0, 0)
+    translation: Vec2 = field(default_factory=Vec2)
 
     def transform_painter(self, painter: QPainter):
         """Translate the painter according to the current canvas state."""
         painter.translate(*self.translation)
         painter.scale(self.scale, self.scale)
 
-    def apply(self, point: Vector):
+    def apply(self, point: Vec2):
         """Apply the current canvas transformation on the point."""
-        return (point - self.translation) / self.scale
+        return Vec2(
+            (point.x - self.translation.x) / self.scale,
+            (point.y - self.translation.y) / self.scale,
+        )
 
-    def inverse(self, point: Vector):
+    def inverse(self, point: Vec2):
         """The inverse of apply."""
-        return point * self.scale + self.translation
+        return Vec2(
+            point.x * self.scale + self.translation.x,
+            point.y * self.scale + self.translation.y,
+        )
 
-    def center(self, point: Vector, center_smoothness: float = 0.3):
+    def center(self, point: Vec2, center_smoothness: float = 0.3):
         """Center the transformation on the given point. The closer to 1 the value of
         center_smoothness, the faster the centering is."""
-        middle = self.apply(Vector(self.canvas.width(), self.canvas.height()) / 2)
+        middle = self.apply(Vec2(self.canvas.width() / 2, self.canvas.height() / 2))
         self.translation = self.inverse((middle - point) * center_smoothness)
 
-    def translate(self, delta: Vector):
+    def translate(self, delta: Vec2):
         """Translate the transformation by the vector delta delta."""
         self.translation += delta * self.scale
 
-    def zoom(self, position: Vector, delta: float):
+    def zoom(self, position: Vec2, delta: float):
         """Zoom in/out."""
         # adjust the scale
         previous_scale = self.scale
@@ -27,6 +27,6 @@ setup(
     entry_points={'console_scripts': ['grafatko=grafatko.__init__:run']},
 
     # requirements
-    install_requires=["pyqt5", "qtmodern"],
+    install_requires=["pyqt5", "qtmodern", "numpy"],
     python_requires='>=3.7.1',
 )
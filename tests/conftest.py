@@ -0,0 +1,11 @@
+import os
+
+import pytest
+from PyQt5.QtWidgets import QApplication
+
+
+@pytest.fixture(scope="session")
+def app() -> QApplication:
+    """The application that drawing needs (without a display)."""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    return QApplication.instance() or QApplication([])
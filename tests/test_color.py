@@ -0,0 +1,93 @@
+from grafatko.color import *
+
+
+def palette_of(text: QColor) -> QPalette:
+    """Return a palette with the given text color."""
+    palette = QPalette()
+    palette.setColor(QPalette.Text, text)
+
+    return palette
+
+
+def test_pens_and_brushes_are_reused(app, monkeypatch):
+    monkeypatch.setattr(Pen, "cache", {})
+    monkeypatch.setattr(Brush, "cache", {})
+    Color.invalidate()
+
+    palette = palette_of(QColor(10, 20, 30))
+
+    # the objects with the same color and style share a single QPen/QBrush
+    pen = Pen()(palette)
+    assert Pen()(palette) is pen
+    assert Pen(width=0.2)(palette) is not pen
+    assert Pen(Color.red())(palette) is not pen
+
+    brush = Brush()(palette)
+    assert Brush()(palette) is brush
+    assert Brush(style=Qt.Dense4Pattern)(palette) is not brush
+
+    assert pen.color() == brush.color() == QColor(10, 20, 30)
+
+
+def test_pens_and_brushes_are_rebuilt_after_invalidation(app, monkeypatch):
+    monkeypatch.setattr(Pen, "cache", {})
+    monkeypatch.setattr(Brush, "cache", {})
+    Color.invalidate()
+
+    palette = palette_of(QColor(10, 20, 30))
+    pen, brush = Pen()(palette), Brush()(palette)
+
+    Color.invalidate()
+    palette = palette_of(QColor(200, 100, 0))
+
+    assert Pen()(palette) is not pen
+    assert Pen()(palette).color() == QColor(200, 100, 0)
+    assert Brush()(palette) is not brush
+    assert Brush()(palette).color() == QColor(200, 100, 0)
+
+
+def test_pen_cache_is_bounded(app, monkeypatch):
+    monkeypatch.setattr(Pen, "cache", {})
+    monkeypatch.setattr(Pen, "cache_size", 10)
+
+    for i in range(25):
+        Pen(Color(lambda _, i=i: QColor(i, i, i)))(QPalette())
+
+    assert 0 < len(Pen.cache) <= 10
+
+
+def test_colors_are_interned():
+    assert Color.text() is Color.text()
+    assert Color.red() is not Color.blue()
+
+    assert Color.red().lighter(150) is Color.red().lighter(150)
+    assert Color.red().lighter(150) is not Color.red().lighter(120)
+    assert Color.contrast(Color.text()) is Color.contrast(Color.text())
+
+
+def test_colors_follow_the_palette(app):
+    dark, light = palette_of(QColor(10, 20, 30)), palette_of(QColor(200, 100, 0))
+
+    # the generated color is reused for the same palette...
+    color = Color.text()(dark)
+    assert Color.text()(dark) is color
+    assert color == QColor(10, 20, 30)
+
+    # ...but not for another one, even in the same generation
+    assert Color.text()(light) == QColor(200, 100, 0)
+    assert Color.text().lighter(150)(light) == QColor(200, 100, 0).lighter(150)
+    assert Color.text()(dark) == QColor(10, 20, 30)
+
+
+def test_invalidating_regenerates_the_colors(app):
+    calls = []
+    color = Color(lambda palette: calls.append(palette) or QColor(1, 2, 3))
+    palette = QPalette()
+
+    color(palette)
+    color(palette)
+    assert len(calls) == 1
+
+    Color.invalidate()
+    color(palette)
+    assert len(calls) == 2
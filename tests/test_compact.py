@@ -0,0 +1,127 @@
+import random
+
+import pytest
+
+from grafatko.compact import *
+
+
+def assert_same(compact: CompactGraph, graph: Graph):
+    """Assert that the compact graph has the same structure as the graph (node i of the
+    compact graph being the i-th node of the graph)."""
+    nodes = graph.get_nodes()
+    indexes = {node: i for i, node in enumerate(nodes)}
+
+    assert list(compact.get_nodes()) == list(range(len(nodes)))
+    assert sorted(compact.get_vertices()) == sorted(
+        (indexes[v[0]], indexes[v[1]]) for v in graph.get_vertices()
+    )
+
+    for i, node in enumerate(nodes):
+        assert compact.get_label(i) == node.get_label()
+
+        assert set(compact.get_adjacent_nodes(i)) == {
+            indexes[n] for n in node.get_adjacent_nodes()
+        }
+        assert set(compact.get_incoming_nodes(i)) == {
+            indexes[n] for n in node.get_incoming_nodes()
+        }
+
+        for j, other in enumerate(nodes):
+            assert compact.get_weight(i, j) == graph.get_weight(node, other)
+
+    assert sorted(map(sorted, compact.get_components())) == sorted(
+        sorted(indexes[n] for n in component) for component in graph.get_components()
+    )
+
+
+def test_compact_graph_matches_graph():
+    for directed in (False, True):
+        rng = random.Random(directed)
+
+        graph = Graph()
+        graph.set_directed(directed)
+        compact = CompactGraph(directed)
+
+        # small, so that the vertices added/removed between the indexings are tested
+        compact.reindex_minimum = 5
+
+        nodes = []
+        for i in range(30):
+            nodes.append(Node(str(i)))
+            graph.add_node(nodes[-1])
+            assert compact.add_node(str(i)) == i
+
+        for _ in range(300):
+            i, j = rng.randrange(len(nodes)), rng.randrange(len(nodes))
+            operation = rng.random()
+
+            if operation < 0.6:
+                weight = rng.choice([1, 2.5, -3])
+                graph.add_vertex(nodes[i], nodes[j], weight)
+                compact.add_vertex(i, j, weight)
+            elif operation < 0.9:
+                graph.remove_vertex(nodes[i], nodes[j])
+                compact.remove_vertex(i, j)
+            elif operation < 0.95:
+                graph.toggle_vertex(nodes[i], nodes[j])
+                compact.toggle_vertex(i, j)
+            else:
+                graph.remove_node(nodes.pop(i))
+                compact.remove_node(i)
+
+            if rng.random() < 0.1:
+                assert_same(compact, graph)
+
+        assert_same(compact, graph)
+
+
+def test_compact_graph_conversions():
+    graph = DrawableGraph()
+    graph.set_weighted(True)
+
+    nodes = [DrawableNode(label=str(i), position=Vec2(i, 2 * i)) for i in range(4)]
+    for node in nodes:
+        graph.add_node(node)
+
+    graph.add_vertex(nodes[0], nodes[1], 3)
+    graph.add_vertex(nodes[2], nodes[1], 0.5)
+    nodes[2].set_color(Color.red())
+
+    compact = CompactGraph.from_graph(graph)
+
+    assert compact.is_weighted()
+    assert_same(compact, graph)
+    assert compact.get_position(3) == Vec2(3, 6)
+    assert compact.get_color(2) is Color.red()
+    assert compact.get_color(0) is None
+
+    back = compact.to_graph(DrawableGraph)
+    assert_same(compact, back)
+    assert back.get_nodes()[2].get_color() is Color.red()
+    assert back.get_nodes()[1].get_position() == Vec2(1, 2)
+
+
+def test_compact_graph_rejects_inexact_weights():
+    compact = CompactGraph()
+    compact.add_nodes(["a", "b"])
+
+    for weight in ("heavy", (1, 2), 2 ** 53 + 1):
+        with pytest.raises(ValueError):
+            compact.add_vertex(0, 1, weight)
+
+    compact.add_vertex(0, 1, 2 ** 53)
+    assert compact.get_weight(1, 0) == 2 ** 53
+
+
+def test_compact_graph_of_a_million_vertices_is_small():
+    count = 1_000_000
+    rng = np.random.default_rng(0)
+
+    compact = CompactGraph()
+    compact.add_nodes([None] * (count // 4))
+    compact.add_vertices(
+        rng.integers(count // 4, size=count), rng.integers(count // 4, size=count)
+    )
+
+    assert len(compact.get_adjacent_nodes(0)) > 0
+    assert compact.get_nbytes() < 64 * 2 ** 20
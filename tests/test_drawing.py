@@ -0,0 +1,158 @@
+from grafatko.graph import *
+
+
+def example_graph(directed: bool) -> DrawableGraph:
+    graph = DrawableGraph(selected_changed=lambda: None)
+    graph.set_directed(directed)
+    graph.set_weighted(True)
+
+    nodes = [
+        DrawableNode(label=f"<b>{i}</b>", position=Vec2(i % 5 * 6, i // 5 * 6))
+        for i in range(25)
+    ]
+
+    for node in nodes:
+        graph.add_node(node)
+
+    for i in range(24):
+        graph.add_vertex(nodes[i], nodes[i + 1], weight=i / 2)
+
+    graph.add_vertex(nodes[0], nodes[24], weight=100)
+    graph.set_root(nodes[0])
+    graph.select(nodes[3])
+    graph.select(graph.get_vertex(nodes[1], nodes[2]))
+
+    return graph
+
+
+def render(graph: DrawableGraph, scale: float, palette: QPalette) -> QImage:
+    """Draw the graph, centered on (12, 12) and scaled, to an image."""
+    image = QImage(300, 300, QImage.Format_ARGB32)
+    image.fill(Qt.white)
+
+    painter = QPainter(image)
+    painter.translate(150, 150)
+    painter.scale(scale, scale)
+    painter.translate(-12, -12)
+
+    rect = painter.worldTransform().inverted()[0].mapRect(QRectF(0, 0, 300, 300))
+    graph.draw(painter, palette, rect)
+    painter.end()
+
+    return image
+
+
+def test_drawing_at_all_levels_of_detail(app, monkeypatch):
+    drawn = []
+
+    def recorded(name: str, function: Callable) -> Callable:
+        def wrapper(*args, **kwargs):
+            result = function(*args, **kwargs)
+
+            # vertices of undirected graphs have no tips
+            if result is not None or name != "tip":
+                drawn.append(name)
+
+            return result
+
+        return wrapper
+
+    draw_simple = DrawableGraph._DrawableGraph__draw_simple
+    monkeypatch.setattr(
+        DrawableGraph, "_DrawableGraph__draw_simple", recorded("simple", draw_simple)
+    )
+    monkeypatch.setattr(
+        DrawableVertex, "get_tip", recorded("tip", DrawableVertex.get_tip)
+    )
+    monkeypatch.setattr(
+        DrawableVertex, "draw_weight", recorded("weight", DrawableVertex.draw_weight)
+    )
+    monkeypatch.setattr(
+        DrawableNode, "draw_label", recorded("label", DrawableNode.draw_label)
+    )
+
+    # points of single pixels, points, the shapes and the full detail
+    expected = {
+        0.3: {"simple"},
+        1: {"simple"},
+        4: {"tip"},
+        20: {"tip", "weight", "label"},
+    }
+
+    for directed in (False, True):
+        graph = example_graph(directed)
+        graph.set_show_labels(True)
+
+        for scale, names in expected.items():
+            drawn.clear()
+            image = render(graph, scale, app.palette())
+
+            pixels = [image.pixel(x, y) for x in range(300) for y in range(300)]
+            assert len(set(pixels)) > 1
+
+            assert set(drawn) == (names if directed else names - {"tip"})
+
+
+def test_undirected_lines_are_drawn_once(app, monkeypatch):
+    lines = []
+
+    def get_lines_path(coordinates: List[float]) -> QPainterPath:
+        lines.extend(zip(coordinates[0::4], coordinates[1::4]))
+        return get_lines_path.original(coordinates)
+
+    get_lines_path.original = DrawableGraph._DrawableGraph__get_lines_path
+    monkeypatch.setattr(
+        DrawableGraph, "_DrawableGraph__get_lines_path", staticmethod(get_lines_path)
+    )
+
+    graph = example_graph(False)
+    render(graph, 1, app.palette())
+
+    assert len(lines) == len(graph.get_vertices()) // 2
+
+
+def test_selected_nodes_are_visible_when_zoomed_out(app):
+    palette = app.palette()
+
+    graph = DrawableGraph(selected_changed=lambda: None)
+    node = DrawableNode(position=Vec2(12, 12))
+    graph.add_node(node)
+    graph.select(node)
+
+    # selected nodes are filled with the background, so the point has the color of
+    # their outline instead
+    outline = node.pen.get_color()(palette).rgb()
+    assert node.get_color()(palette).rgb() != outline
+
+    for scale in (0.3, 1):
+        image = render(graph, scale, palette)
+        pixels = {image.pixel(x, y) for x in range(140, 160) for y in range(140, 160)}
+
+        assert outline in pixels
+
+
+def test_text_layouts_are_cached(app):
+    font = QFont("Times New Roman", 12)
+    bold = QFont("Times New Roman", 12)
+    bold.setBold(True)
+
+    layout = TextLayout.get("<b>label</b>", font)
+
+    assert TextLayout.get("<b>label</b>", font) is layout
+    assert TextLayout.get("<b>label</b>", bold) is not layout
+    assert TextLayout.get("label", font) is not layout
+
+    # the labels are plain text, so the tags are a part of them
+    assert layout.static_text.textFormat() == Qt.PlainText
+    assert layout.width > TextLayout.get("label", font).width
+
+
+def test_text_layout_cache_is_bounded(app, monkeypatch):
+    monkeypatch.setattr(TextLayout, "cache", {})
+    monkeypatch.setattr(TextLayout, "cache_size", 10)
+
+    font = QFont("Times New Roman", 12)
+    for i in range(25):
+        TextLayout.get(str(i), font)
+
+    assert 0 < len(TextLayout.cache) <= 10
@@ -0,0 +1,152 @@
+import numpy as np
+
+from grafatko.forces import *
+
+
+def repulsion(distance: np.ndarray) -> np.ndarray:
+    return (1 / distance) ** 2
+
+
+def exact_repulsion(positions: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """The repulsion calculated by comparing all pairs of points of the same group."""
+    delta = positions[None, :, :] - positions[:, None, :]
+    distances = np.hypot(delta[..., 0], delta[..., 1])
+
+    affected = (groups[:, None] == groups[None, :]) & (distances != 0)
+    distances = np.where(affected, distances, 1)
+    magnitudes = np.where(affected, repulsion(distances) / distances, 0)
+
+    return -(delta * magnitudes[..., None]).sum(axis=1)
+
+
+def random_points(count: int, groups: int) -> Tuple[np.ndarray, np.ndarray]:
+    random = np.random.default_rng(1)
+    return random.random((count, 2)) * 40, random.integers(0, groups, count)
+
+
+def test_zero_theta_is_exact():
+    positions, groups = random_points(600, 3)
+
+    forces, coincident = QuadTree(positions, groups).repulsion(repulsion, 0)
+
+    assert np.abs(forces - exact_repulsion(positions, groups)).max() < 1e-9
+    assert not coincident.any()
+
+
+def test_theta_approximates_the_repulsion():
+    positions, groups = random_points(600, 3)
+    exact = exact_repulsion(positions, groups)
+
+    for theta in (0.5, 0.9):
+        forces, _ = QuadTree(positions, groups).repulsion(repulsion, theta)
+
+        assert np.linalg.norm(forces - exact) < 0.01 * np.linalg.norm(exact)
+
+
+def test_coincident_points():
+    positions = np.array([[0.0, 0.0], [0.0, 0.0], [1.0, 0.0], [5.0, 5.0]])
+    groups = np.array([0, 0, 0, 1])
+
+    forces, coincident = QuadTree(positions, groups).repulsion(repulsion, 0.9)
+
+    assert coincident.tolist() == [True, True, False, False]
+
+    # the point of the other group isn't affected by the rest
+    assert forces[3].tolist() == [0, 0]
+    assert forces[2, 0] > 0
+
+
+def test_array_engine_repulsion_is_exact():
+    positions, groups = random_points(1200, 3)
+
+    exact = exact_repulsion(positions, groups)
+
+    # the blocks are sized by their memory (down to a single node per block)
+    for memory in (ArrayEngine.block_memory, 7 * 48 * 1200, 1):
+        engine = ArrayEngine()
+        engine.block_memory = memory
+
+        forces, coincident = engine._repulsion(positions, groups)
+
+        assert np.abs(forces - exact).max() < 1e-9
+        assert not coincident.any()
+
+
+def test_structure_subset_renumbers_the_nodes():
+    structure = Structure(
+        groups=np.array([0, 1, 0, 2, 1]),
+        edges=np.array([[0, 2], [1, 4]]),
+        targets=np.array([[0, 0], [np.nan, np.nan], [1, 2], [np.nan, np.nan], [3, 4]]),
+        root=2,
+    )
+
+    subset = structure.subset(np.array([4, 2, 1, 0]))
+
+    assert subset.groups.tolist() == [1, 0, 1, 0]
+    assert sorted(map(sorted, subset.edges.tolist())) == [[0, 2], [1, 3]]
+    assert subset.targets[[0, 1, 3]].tolist() == [[3, 4], [1, 2], [0, 0]]
+    assert subset.root == 1
+
+    # the root isn't in this one
+    subset = structure.subset(np.array([3, 1, 4]))
+
+    assert subset.edges.tolist() == [[1, 2]]
+    assert subset.root is None
+
+
+def test_cooling_caps_the_displacement_by_the_temperature():
+    integrator = CoolingIntegrator()
+    state = integrator.initial_state(2)
+    state[1, 0] = 0.5
+
+    positions = np.zeros((3, 2))
+    forces = np.array([[30.0, 40.0], [0.1, 0.0], [0.0, -20.0]])
+    moved = integrator.integrate(positions, forces, np.array([0, 0, 1]), state)
+
+    # the large forces are scaled down to the temperature of their component
+    assert np.allclose(moved, [[0.6, 0.8], [0.1, 0.0], [0.0, -0.5]])
+
+
+def test_cooling_lowers_the_temperature():
+    integrator = CoolingIntegrator()
+    state = integrator.initial_state(1)
+
+    positions = np.zeros((2, 2))
+    forces = np.array([[5.0, 0.0], [-5.0, 0.0]])
+    groups = np.array([0, 0])
+
+    # the energy doesn't decrease, so the component keeps cooling down
+    temperatures = []
+    for _ in range(20):
+        integrator.integrate(positions, forces, groups, state)
+        temperatures.append(state[0, 0])
+
+    assert all(t1 > t2 for t1, t2 in zip(temperatures[1:], temperatures[2:]))
+    assert temperatures[-1] < 0.5
+
+
+def test_cooling_layout_converges():
+    positions, _ = random_points(10, 1)
+    groups = np.zeros(10, dtype=np.int64)
+    edges = np.array([[i, i + 1] for i in range(9)])
+    structure = Structure(groups, edges, np.full((10, 2), np.nan), None)
+
+    engine = ArrayEngine(CoolingIntegrator())
+    state = engine.get_integrator().initial_state(1)
+    moving = np.ones(10, dtype=bool)
+
+    energies = []
+    for _ in range(1000):
+        previous = positions
+        positions = engine.simulate(positions, moving, structure, state)
+
+        energies.append(state[0, 2])
+        assert state[0, 0] <= CoolingIntegrator.temperature
+
+    # the forces died out, so the nodes barely move anymore
+    assert energies[-1] < energies[0] / 10 ** 5
+    assert np.abs(positions - previous).max() < 0.01
+
+    # and the path has stretched out
+    lengths = np.hypot(*(positions[edges[:, 1]] - positions[edges[:, 0]]).T)
+    assert lengths.min() > 3
@@ -0,0 +1,151 @@
+import pytest
+
+from grafatko.graph import *
+
+
+def vertex_set(graph: Graph) -> Set[Tuple[str, str, Any]]:
+    return {
+        (v[0].get_label(), v[1].get_label(), v.get_weight())
+        for v in graph.get_vertices()
+    }
+
+
+def test_parse_lines():
+    directed, weighted, vertices = Graph.parse_lines(["A -> B 2", "C <- B 0.5", ""])
+
+    assert directed and weighted
+    assert list(vertices) == [("A", "B", 2), ("B", "C", 0.5)]
+
+    directed, weighted, vertices = Graph.parse_lines(["A B", "B C"])
+
+    assert not directed and not weighted
+    assert list(vertices) == [("A", "B", 0), ("B", "C", 0)]
+
+    assert Graph.parse_lines(["", "  "]) is None
+
+
+def test_parse_lines_is_lazy():
+    def lines():
+        yield "A B 1"
+        yield "B C x"
+
+    _, _, vertices = Graph.parse_lines(lines())
+
+    # the invalid weight is only parsed when its vertex is
+    assert next(vertices) == ("A", "B", 1)
+
+    with pytest.raises(ValueError):
+        next(vertices)
+
+
+def test_parse_weight():
+    assert Graph.parse_weight("3") == 3
+    assert type(Graph.parse_weight("3")) is int
+    assert Graph.parse_weight("-0.25") == -0.25
+    assert Graph.parse_weight("1_000") == 1000
+
+    for weight in ("nan", "inf", "-inf", "1e999"):
+        with pytest.raises(ValueError):
+            Graph.parse_weight(weight)
+
+
+def test_from_lines_skips_loops_and_duplicates():
+    graph = Graph.from_lines(["A B 1", "B A 2", "A A 3", "B C 4"])
+
+    assert vertex_set(graph) == {
+        ("A", "B", 1),
+        ("B", "A", 1),
+        ("B", "C", 4),
+        ("C", "B", 4),
+    }
+    assert len(graph.get_components()) == 1
+
+
+def test_from_lines_adds_lone_nodes():
+    graph = Graph.from_lines(["A", "B C"])
+
+    assert [n.get_label() for n in graph.get_nodes()] == ["B", "C", "A"]
+    assert len(graph.get_components()) == 2
+
+
+def test_iter_lines_round_trip():
+    for lines in (["A B 1", "B C 2.5", "D E -3"], ["A -> B", "B -> A", "C -> A"]):
+        graph = Graph.from_lines(lines)
+        exported = list(graph.iter_lines())
+
+        assert all(line.endswith("\n") for line in exported)
+
+        imported = Graph.from_lines(exported)
+
+        assert imported.is_directed() == graph.is_directed()
+        assert imported.is_weighted() == graph.is_weighted()
+        assert vertex_set(imported) == vertex_set(graph)
+
+        # exporting is deterministic
+        assert list(imported.iter_lines()) == exported
+
+
+def test_iter_lines_names_unlabeled_nodes():
+    graph = Graph()
+    nodes = [Node(), Node("1"), Node()]
+
+    for node in nodes:
+        graph.add_node(node)
+
+    graph.add_vertex(nodes[0], nodes[1])
+    graph.add_vertex(nodes[1], nodes[2])
+
+    names = graph.get_export_names()
+
+    assert len(set(names.values())) == 3
+    assert names[nodes[1]] == "1"
+    assert len(Graph.from_string(graph.to_string()).get_nodes()) == 3
+
+
+def test_annotations_round_trip():
+    graph = DrawableGraph()
+    nodes = [DrawableNode(label=str(i), position=Vec2(i / 3, -i)) for i in range(4)]
+
+    for node in nodes:
+        graph.add_node(node)
+
+    graph.add_vertex(nodes[0], nodes[1])
+    graph.set_root(nodes[1])
+
+    annotations = []
+    imported = DrawableGraph.from_lines(
+        ["# transformation 2 1 1\n"] + list(graph.iter_lines()),
+        annotations=annotations,
+    )
+    imported_nodes = {n.get_label(): n for n in imported.get_nodes()}
+
+    # the unknown annotations are left to the caller
+    assert ["transformation", "2", "1", "1"] in annotations
+
+    assert len(imported_nodes) == 4
+    assert imported.get_root() is imported_nodes["1"]
+
+    for node in nodes:
+        assert imported_nodes[node.get_label()].get_position() == node.get_position()
+
+
+def test_annotated_graphs_without_vertices():
+    graph = Graph()
+    graph.set_directed(True)
+    graph.add_node(Node("A"))
+
+    imported = Graph.from_string(graph.to_string())
+
+    assert imported.is_directed()
+    assert [n.get_label() for n in imported.get_nodes()] == ["A"]
+
+
+def test_labels_starting_with_a_hash():
+    graph = Graph.from_lines(["# B", "#root B", "# position"])
+
+    assert vertex_set(graph) == {
+        ("#", "B", 0),
+        ("B", "#", 0),
+        ("#root", "B", 0),
+        ("B", "#root", 0),
+    }
@@ -0,0 +1,434 @@
+from collections import defaultdict, deque
+from random import Random
+
+from grafatko.graph import *
+
+
+def path_graph(count: int, directed: bool = False) -> Tuple[Graph, List[Node]]:
+    """Return a graph that is a path of the given number of nodes."""
+    graph = Graph()
+    graph.set_directed(directed)
+
+    nodes = [Node(str(i)) for i in range(count)]
+    for node in nodes:
+        graph.add_node(node)
+
+    for n1, n2 in zip(nodes, nodes[1:]):
+        graph.add_vertex(n1, n2)
+
+    return graph, nodes
+
+
+def test_components_are_merged_by_vertices():
+    graph, nodes = path_graph(3)
+    isolated = Node("isolated")
+    graph.add_node(isolated)
+
+    assert graph.weakly_connected(nodes[0], nodes[2])
+    assert not graph.weakly_connected(nodes[0], isolated)
+    assert graph.get_weakly_connected(nodes[1]) == set(nodes)
+    assert sorted(len(c) for c in graph.get_components()) == [1, 3]
+
+
+def test_components_split_when_a_vertex_is_removed():
+    graph, nodes = path_graph(4)
+
+    graph.remove_vertex(nodes[1], nodes[2])
+
+    assert graph.weakly_connected(nodes[0], nodes[1])
+    assert not graph.weakly_connected(nodes[1], nodes[2])
+    assert graph.get_weakly_connected(nodes[3]) == {nodes[2], nodes[3]}
+
+
+def test_components_stay_clean_when_nothing_can_split():
+    graph, nodes = path_graph(3, directed=True)
+    graph.add_vertex(nodes[1], nodes[0])
+    graph.get_components()
+
+    # there is no such vertex
+    graph.remove_vertex(nodes[0], nodes[2])
+    assert len(graph.components.dirty) == 0
+
+    # the reverse vertex still connects the nodes
+    graph.remove_vertex(nodes[0], nodes[1])
+    assert len(graph.components.dirty) == 0
+    assert graph.weakly_connected(nodes[0], nodes[1])
+
+
+def test_components_split_when_a_node_is_removed():
+    graph, nodes = path_graph(5)
+
+    graph.remove_node(nodes[2])
+
+    assert sorted(len(c) for c in graph.get_components()) == [2, 2]
+    assert not graph.weakly_connected(nodes[0], nodes[4])
+
+
+def test_directed_vertices_connect_weakly():
+    graph, nodes = path_graph(3, directed=True)
+
+    assert graph.weakly_connected(nodes[2], nodes[0])
+
+    graph.remove_vertex(nodes[0], nodes[1])
+    assert not graph.weakly_connected(nodes[0], nodes[1])
+    assert graph.weakly_connected(nodes[1], nodes[2])
+
+
+def test_removed_node_can_be_added_again():
+    graph, nodes = path_graph(3)
+
+    graph.remove_node(nodes[1])
+    graph.add_node(nodes[1])
+    graph.add_vertex(nodes[1], nodes[2])
+
+    assert graph.weakly_connected(nodes[1], nodes[2])
+    assert not graph.weakly_connected(nodes[0], nodes[1])
+    assert len(graph.get_components()) == 2
+
+
+def test_vertices_are_found_by_their_nodes():
+    graph, nodes = path_graph(3)
+
+    vertex = graph.get_vertex(nodes[0], nodes[1])
+    assert vertex[0] is nodes[0] and vertex[1] is nodes[1]
+    assert graph.get_vertex(nodes[0], nodes[2]) is None
+
+    assert nodes[1].is_adjacent_to(nodes[0]) and nodes[0].is_adjacent_to(nodes[1])
+    assert not nodes[0].is_adjacent_to(nodes[2])
+
+
+def test_weights_are_set_both_ways_in_undirected_graphs():
+    graph, nodes = path_graph(2)
+
+    graph.set_weight(graph.get_vertex(nodes[0], nodes[1]), 5)
+    assert graph.get_weight(nodes[1], nodes[0]) == 5
+
+    graph.set_directed(True)
+    graph.set_weight(graph.get_vertex(nodes[0], nodes[1]), 7)
+    assert graph.get_weight(nodes[0], nodes[1]) == 7
+    assert graph.get_weight(nodes[1], nodes[0]) == 5
+
+
+def test_vertices_are_not_duplicated():
+    graph, nodes = path_graph(2)
+
+    graph.add_vertex(nodes[0], nodes[1])
+    graph.add_vertex(nodes[1], nodes[0])
+    graph.add_vertex(nodes[0], nodes[0])  # no loops in undirected graphs
+
+    assert len(graph.get_vertices()) == 2
+
+    graph.toggle_vertex(nodes[1], nodes[0])
+    assert len(graph.get_vertices()) == 0
+
+    graph.toggle_vertex(nodes[1], nodes[0])
+    assert graph.get_weight(nodes[0], nodes[1]) == 1
+
+
+def test_directed_graphs_stay_directed():
+    graph, nodes = path_graph(3, directed=True)
+
+    graph.set_directed(True)
+    assert len(graph.get_vertices()) == 2
+    assert not nodes[1].is_adjacent_to(nodes[0])
+
+    graph.set_directed(False)
+    assert len(graph.get_vertices()) == 4
+    assert nodes[1].is_adjacent_to(nodes[0])
+
+
+def test_removing_a_node_removes_its_vertices():
+    graph, nodes = path_graph(4, directed=True)
+    graph.add_vertex(nodes[3], nodes[1])
+    graph.add_vertex(nodes[1], nodes[1])
+
+    graph.remove_node(nodes[1])
+
+    assert graph.get_nodes() == [nodes[0], nodes[2], nodes[3]]
+    assert [(v[0], v[1]) for v in graph.get_vertices()] == [(nodes[2], nodes[3])]
+
+    assert len(nodes[0].get_adjacent_vertices()) == 0
+    assert len(nodes[2].get_incoming_vertices()) == 0
+    assert len(nodes[3].get_adjacent_vertices()) == 0
+
+
+def test_removing_keeps_the_order():
+    graph, nodes = path_graph(5)
+
+    graph.remove_vertex(nodes[1], nodes[2])
+    graph.remove_node(nodes[0])
+
+    assert graph.get_nodes() == nodes[1:]
+    assert [(v[0].get_label(), v[1].get_label()) for v in graph.get_vertices()] == [
+        ("2", "3"),
+        ("3", "2"),
+        ("3", "4"),
+        ("4", "3"),
+    ]
+
+
+def test_batch_defers_the_callbacks_and_the_layers():
+    changes = []
+    graph = DrawableGraph(selected_changed=lambda: changes.append(None))
+
+    nodes = [DrawableNode(label=str(i)) for i in range(3)]
+
+    with graph.batch():
+        for node in nodes:
+            graph.add_node(node)
+            graph.select(node)
+
+        graph.set_root(nodes[0])
+
+        with graph.batch():
+            graph.add_vertex(nodes[0], nodes[1])
+            graph.add_vertex(nodes[1], nodes[2])
+
+        assert graph.in_batch()
+        assert changes == []
+
+    assert not graph.in_batch()
+    assert len(changes) == 1
+    layers = graph.get_distance_from_root()
+    assert layers == {0: {nodes[0]}, 1: {nodes[1]}, 2: {nodes[2]}}
+
+
+def bfs_layers(root: Node) -> Dict[int, Set[Node]]:
+    """Return the BFS layers from the root, calculated from scratch."""
+    distance = {root: 0}
+    queue = deque([root])
+
+    while len(queue) != 0:
+        node = queue.popleft()
+
+        for adjacent in node.get_adjacent_nodes():
+            if adjacent not in distance:
+                distance[adjacent] = distance[node] + 1
+                queue.append(adjacent)
+
+    layers = defaultdict(set)
+    for node, d in distance.items():
+        layers[d].add(node)
+
+    return dict(layers)
+
+
+def test_root_layers_are_updated_incrementally():
+    random = Random(0)
+
+    for directed in (False, True):
+        graph = DrawableGraph()
+        graph.set_directed(directed)
+
+        nodes = [DrawableNode(label=str(i)) for i in range(30)]
+        for node in nodes:
+            graph.add_node(node)
+
+        graph.set_root(nodes[0])
+
+        for _ in range(300):
+            graph.toggle_vertex(random.choice(nodes), random.choice(nodes))
+
+            assert graph.get_distance_from_root() == bfs_layers(nodes[0])
+
+        for node in nodes[:0:-1]:
+            graph.remove_node(node)
+            assert graph.get_distance_from_root() == bfs_layers(nodes[0])
+
+
+def test_removing_the_root_removes_the_layers():
+    graph = DrawableGraph()
+    n1, n2 = DrawableNode(), DrawableNode()
+    graph.add_node(n1)
+    graph.add_node(n2)
+    graph.add_vertex(n1, n2)
+
+    graph.set_root(n1)
+    graph.remove_node(n1)
+
+    assert graph.get_root() is None
+    assert graph.get_distance_from_root() == {}
+
+
+def random_tree(count: int, random: Random) -> Tuple[DrawableGraph, List[DrawableNode]]:
+    """Return a random tree rooted at its first node."""
+    graph = DrawableGraph()
+    nodes = [DrawableNode(label=str(i)) for i in range(count)]
+
+    for node in nodes:
+        graph.add_node(node)
+
+    for i in range(1, count):
+        graph.add_vertex(nodes[random.randrange(i)], nodes[i])
+
+    graph.set_root(nodes[0])
+
+    return graph, nodes
+
+
+def test_tree_layout():
+    random = Random(0)
+
+    for _ in range(20):
+        graph, nodes = random_tree(60, random)
+        layers = graph.get_distance_from_root()
+        layout = graph.get_tree_layout()
+
+        assert set(layout) == set(nodes)
+        assert layout[nodes[0]] == Vec2(0, 0)
+
+        for depth, layer in layers.items():
+            row = sorted(layout[node].x for node in layer)
+
+            assert all(layout[node].y == depth * TreeLayout.vertical for node in layer)
+            gaps = [b - a for a, b in zip(row, row[1:])]
+            assert all(gap > TreeLayout.horizontal - 1e-9 for gap in gaps)
+
+        # each parent is centered above its children (which keep their order)
+        for node in nodes:
+            depth = next(d for d, layer in layers.items() if node in layer)
+            children = [
+                n for n in node.get_adjacent_nodes() if n in layers.get(depth + 1, ())
+            ]
+
+            if len(children) != 0:
+                xs = [layout[child].x for child in children]
+
+                assert xs == sorted(xs)
+                assert abs(layout[node].x - (xs[0] + xs[-1]) / 2) < 1e-9
+
+
+def test_tree_layout_is_cached():
+    graph, nodes = random_tree(10, Random(0))
+    layout = graph.get_tree_layout()
+
+    nodes[3].set_position(Vec2(5, 5))
+    assert graph.get_tree_layout() is layout
+
+    graph.toggle_vertex(nodes[3], nodes[4])
+    assert graph.get_tree_layout() is not layout
+
+    graph.set_root(None)
+    assert graph.get_tree_layout() == {}
+
+
+def segments_intersect(a: Vec2, b: Vec2, c: Vec2, d: Vec2) -> bool:
+    """Return True if the segments ab and cd intersect."""
+
+    def orientation(p: Vec2, q: Vec2, r: Vec2) -> float:
+        return (q.x - p.x) * (r.y - p.y) - (q.y - p.y) * (r.x - p.x)
+
+    return (
+        orientation(a, b, c) * orientation(a, b, d) <= 0
+        and orientation(c, d, a) * orientation(c, d, b) <= 0
+    )
+
+
+def test_layered_layout_of_a_graph_that_is_not_a_tree():
+    graph = DrawableGraph()
+    graph.set_directed(True)
+
+    r, a, b, x, y, w, z = nodes = [DrawableNode(label=str(i)) for i in range(7)]
+    for node in nodes:
+        graph.add_node(node)
+
+    # in the order of the BFS tree, the vertex from a to w crosses the one from b to y
+    # and the vertex from z goes back up to the root, through two other rows
+    for n1, n2 in [(r, a), (r, b), (a, x), (b, y), (b, w), (w, a), (w, z), (z, r)]:
+        graph.add_vertex(n1, n2)
+
+    graph.set_root(r)
+    layers = graph.get_distance_from_root()
+    layout = graph.get_tree_layout()
+
+    assert set(layout) == set(nodes)
+    assert layout[r] == Vec2(0, 0)
+
+    for depth, layer in layers.items():
+        row = sorted(layout[node].x for node in layer)
+
+        assert all(layout[node].y == depth * TreeLayout.vertical for node in layer)
+        assert all(b - a > TreeLayout.horizontal - 1e-9 for a, b in zip(row, row[1:]))
+
+    # the rows were reordered, so no vertices (apart from the long one) cross
+    vertices = [
+        (layout[v[0]], layout[v[1]]) for v in graph.get_vertices() if v[0] is not z
+    ]
+
+    for i, (p1, p2) in enumerate(vertices):
+        for p3, p4 in vertices[i + 1 :]:
+            if len({p1, p2, p3, p4}) == 4:
+                assert not segments_intersect(p1, p2, p3, p4)
+
+    # the dummy nodes of the long vertex kept space for it in the rows it goes through
+    for node in (a, b, x, y, w):
+        t = (layout[node].y - layout[z].y) / (layout[r].y - layout[z].y)
+        crossing = layout[z] + (layout[r] - layout[z]) * t
+
+        assert layout[node].distance(crossing) > 1
+
+
+def in_rect(rect: QRectF, point: Vec2) -> bool:
+    return rect.contains(QPointF(point.x, point.y))
+
+
+def intersects(rect: QRectF, a: Vec2, b: Vec2) -> bool:
+    """Return True if the segment ab intersects the rectangle (tested from scratch)."""
+    corners = [
+        Vec2(rect.left(), rect.top()),
+        Vec2(rect.right(), rect.top()),
+        Vec2(rect.right(), rect.bottom()),
+        Vec2(rect.left(), rect.bottom()),
+    ]
+
+    return (
+        in_rect(rect, a)
+        or in_rect(rect, b)
+        or any(
+            segments_intersect(a, b, c, d)
+            for c, d in zip(corners, corners[1:] + corners[:1])
+        )
+    )
+
+
+def test_node_grid_finds_the_visible_objects():
+    random = Random(0)
+
+    for directed in (False, True):
+        graph = DrawableGraph()
+        graph.set_directed(directed)
+
+        nodes = [DrawableNode(label=str(i)) for i in range(150)]
+        for node in nodes:
+            node.set_position(Vec2(random.uniform(-60, 60), random.uniform(-60, 60)))
+            graph.add_node(node)
+
+        for _ in range(200):
+            graph.add_vertex(random.choice(nodes), random.choice(nodes))
+
+        for _ in range(40):
+            # the grid follows the nodes when they move
+            for node in random.sample(nodes, 20):
+                offset = Vec2(random.uniform(-20, 20), random.uniform(-20, 20))
+                node.set_position(node.get_position() + offset)
+
+            x, y = random.uniform(-70, 50), random.uniform(-70, 50)
+            rect = QRectF(x, y, random.uniform(1, 30), random.uniform(1, 30))
+
+            result = graph.grid.query(rect)
+            assert result is not None
+
+            found_nodes, found_vertices = set(result[0]), result[1]
+
+            assert len(found_vertices) == len(set(found_vertices))
+
+            for node in nodes:
+                if in_rect(rect, node.get_position()):
+                    assert node in found_nodes
+
+            for vertex in graph.get_vertices():
+                if intersects(rect, vertex[0].get_position(), vertex[1].get_position()):
+                    assert vertex in found_vertices
+
+        # all of the objects are drawn when the rectangle contains the whole graph
+        assert graph.grid.query(QRectF(-1000, -1000, 2000, 2000)) is None
@@ -0,0 +1,136 @@
+from grafatko.layout import *
+
+
+def structure(groups: List[int], edges: List[Tuple[int, int]]) -> Structure:
+    """Return a structure of nodes in the given components, with the given edges."""
+    count = len(groups)
+    edges = np.array(edges, dtype=np.int64).reshape(-1, 2)
+
+    groups = np.array(groups, dtype=np.int64)
+
+    return Structure(groups, edges, np.full((count, 2), np.nan), None)
+
+
+def paths(*lengths: int) -> Structure:
+    """Return a structure of separate paths of the given lengths."""
+    groups, edges = [], []
+
+    for group, length in enumerate(lengths):
+        start = len(groups)
+        groups += [group] * length
+        edges += [(i, i + 1) for i in range(start, start + length - 1)]
+
+    return structure(groups, edges)
+
+
+def lengths(positions: np.ndarray, structure: Structure) -> np.ndarray:
+    edges = structure.edges
+    return np.hypot(*(positions[edges[:, 1]] - positions[edges[:, 0]]).T)
+
+
+def closest(positions: np.ndarray) -> float:
+    """Return the smallest distance of two of the positions."""
+    distances = np.hypot(*(positions[:, None] - positions[None, :]).transpose(2, 0, 1))
+    np.fill_diagonal(distances, np.inf)
+
+    return distances.min()
+
+
+def test_coarsening_merges_adjacent_nodes():
+    path = paths(300, 100)
+    levels, parents = MultilevelLayout(ArrayEngine()).coarsen(path)
+
+    assert levels[0] is path
+    assert len(parents) == len(levels) - 1
+    assert len(levels[-1].groups) <= MultilevelLayout.minimum
+
+    for level, parent, coarser in zip(levels, parents, levels[1:]):
+        count = len(coarser.groups)
+        assert count <= MultilevelLayout.shrink * len(level.groups)
+
+        # each node of the coarser level is a single node or two adjacent ones (of the
+        # same component, which the coarser node is in too)
+        assert sorted(set(parent.tolist())) == list(range(count))
+        assert np.bincount(parent).max() <= 2
+        assert np.array_equal(coarser.groups[parent], level.groups)
+
+        adjacent = {tuple(sorted(edge)) for edge in level.edges.tolist()}
+        for node in range(count):
+            merged = np.flatnonzero(parent == node).tolist()
+            assert len(merged) == 1 or tuple(merged) in adjacent
+
+        # the vertices are merged too (without the ones within the merged nodes)
+        expected = {
+            tuple(sorted(edge))
+            for edge in parent[level.edges].tolist()
+            if edge[0] != edge[1]
+        }
+        assert {tuple(edge) for edge in coarser.edges.tolist()} == expected
+
+
+def test_small_graphs_are_not_coarsened():
+    path = paths(MultilevelLayout.minimum)
+    levels, parents = MultilevelLayout(ArrayEngine()).coarsen(path)
+
+    assert levels == [path] and parents == []
+
+    # neither are the ones that barely shrink (a star can only merge a single pair)
+    star = structure([0] * 100, [(0, i) for i in range(1, 100)])
+    levels, parents = MultilevelLayout(ArrayEngine()).coarsen(star)
+
+    assert levels == [star] and parents == []
+
+
+def test_prolongation_places_nodes_at_their_parents():
+    layout = MultilevelLayout(ArrayEngine())
+
+    coarse = np.array([[0.0, 0.0], [10.0, 0.0], [0.0, 10.0]])
+    parent = np.array([0, 1, 1, 2, 2, 0, 1, 2, 0, 1, 2, 0])
+
+    positions = layout.prolong(coarse, parent)
+    expected = coarse[parent] * 2  # four times as many nodes, twice the width
+
+    # moved apart slightly from each other
+    assert np.abs(positions - expected).max() <= 0.5
+    assert len(np.unique(positions, axis=0)) == len(parent)
+
+
+def test_layout_of_a_graph():
+    path = paths(400)
+    positions = MultilevelLayout(ArrayEngine()).layout(path)
+
+    assert positions.shape == (400, 2)
+    assert np.isfinite(positions).all()
+
+    # the adjacent nodes are about the length of a vertex apart
+    assert 3 < np.median(lengths(positions, path)) < 9
+
+    # and the nodes are spread out
+    assert closest(positions) > 1
+
+
+def test_layout_of_a_disconnected_graph():
+    forest = paths(150, 100, 1, 2)
+    positions = MultilevelLayout(ArrayEngine()).layout(forest)
+
+    assert positions.shape == (253, 2)
+    assert np.isfinite(positions).all()
+    assert 3 < np.median(lengths(positions, forest)) < 9
+
+    # the nodes of each component are spread out
+    for group in range(4):
+        assert closest(positions[forest.groups == group]) > 1
+
+
+def test_layout_of_tiny_graphs():
+    layout = MultilevelLayout(ArrayEngine())
+
+    assert layout.layout(paths()).shape == (0, 2)
+
+    for tiny in (paths(1), paths(1, 1), paths(2)):
+        positions = layout.layout(tiny)
+
+        assert positions.shape == (len(tiny.groups), 2)
+        assert np.isfinite(positions).all()
+
+    assert 5 < lengths(layout.layout(paths(2)), paths(2))[0] < 7
@@ -0,0 +1,324 @@
+from grafatko.forces import *
+
+
+def path_graph(count: int) -> Tuple[DrawableGraph, List[DrawableNode]]:
+    """Return a drawable graph that is a path of nodes placed close to each other."""
+    graph = DrawableGraph(selected_changed=lambda: None)
+    nodes = [DrawableNode(position=Vec2(i, i % 2)) for i in range(count)]
+
+    for node in nodes:
+        graph.add_node(node)
+
+    for n1, n2 in zip(nodes, nodes[1:]):
+        graph.add_vertex(n1, n2)
+
+    return graph, nodes
+
+
+def started(graph: DrawableGraph) -> Simulation:
+    """Return a simulation of the graph (run by the test instead of the worker), which
+    has the structure of the graph and will simulate a step on the next tick."""
+    simulation = Simulation(ArrayEngine())
+    simulation.synchronize(graph)
+    simulation.process_commands()
+    simulation.tick(0)  # only the time when there is something to simulate counts
+
+    return simulation
+
+
+def positions(nodes: List[DrawableNode]) -> List[Tuple[float, float]]:
+    return [tuple(node.get_position()) for node in nodes]
+
+
+def test_steps_move_the_nodes():
+    graph, nodes = path_graph(5)
+    simulation = started(graph)
+    before = positions(nodes)
+
+    assert not simulation.apply()  # nothing was published yet
+
+    assert simulation.tick(Simulation.timestep)
+    assert simulation.apply()
+    assert not simulation.apply()  # the same snapshot is only applied once
+
+    assert positions(nodes) != before
+
+
+def test_snapshots_are_double_buffered():
+    graph, _ = path_graph(5)
+    simulation = started(graph)
+
+    simulation.tick(Simulation.timestep)
+    first = simulation.front
+    published = first.copy()
+
+    simulation.tick(Simulation.timestep)
+
+    # the worker wrote the other buffer, so the first snapshot stayed the same
+    assert simulation.front is not first
+    assert simulation.back is first
+    assert not np.array_equal(simulation.front, published)
+
+    simulation.tick(Simulation.timestep)
+    assert simulation.front is first
+
+
+def test_snapshots_not_reflecting_a_move_are_dropped():
+    graph, nodes = path_graph(5)
+    simulation = started(graph)
+    simulation.tick(Simulation.timestep)
+
+    nodes[0].set_position(Vec2(100, 100))
+    simulation.move([nodes[0]])
+
+    # the published snapshot would move the node back
+    assert not simulation.apply()
+    assert nodes[0].get_position() == Vec2(100, 100)
+
+    simulation.process_commands()
+    simulation.tick(Simulation.timestep)
+
+    assert simulation.apply()
+    assert nodes[0].get_position().distance(Vec2(100, 100)) < 10
+
+
+def test_no_layout_is_lost_when_the_graph_keeps_changing():
+    graph, nodes = path_graph(5)
+    simulation = started(graph)
+
+    for i in range(10):
+        simulation.tick(Simulation.timestep)
+
+        # the graph changes before the snapshot is applied, so the snapshot is of
+        # the previous structure (of which the new node is not a part)
+        node = DrawableNode(position=Vec2(0, 0))
+        graph.add_node(node)
+        graph.add_vertex(nodes[-1], node)
+        nodes.append(node)
+
+        simulation.synchronize(graph)
+        published = simulation.front[: len(nodes) - 1].tolist()
+
+        assert simulation.apply()
+        assert positions(nodes[:-1]) == [tuple(p) for p in published]
+        assert node.get_position() == Vec2(0, 0)
+
+        # the worker continues from its own positions of the nodes it knew
+        simulation.process_commands()
+        assert simulation.positions[: len(nodes) - 1].tolist() == published
+
+    simulation.tick(Simulation.timestep)
+    assert simulation.apply()
+
+    # the new nodes were moved by the forces too
+    assert all(node.get_position() != Vec2(0, 0) for node in nodes[5:])
+
+
+def two_paths() -> Tuple[DrawableGraph, List[DrawableNode], List[DrawableNode]]:
+    """Return a graph of two separate paths of three nodes."""
+    graph = DrawableGraph(selected_changed=lambda: None)
+    first = [DrawableNode(position=Vec2(i, 0)) for i in range(3)]
+    second = [DrawableNode(position=Vec2(i, 20)) for i in range(3)]
+
+    for nodes in (first, second):
+        for node in nodes:
+            graph.add_node(node)
+
+        for n1, n2 in zip(nodes, nodes[1:]):
+            graph.add_vertex(n1, n2)
+
+    return graph, first, second
+
+
+def settle(simulation: Simulation, limit: int = 5000) -> int:
+    """Tick until all of the components are asleep, returning the number of ticks."""
+    for ticks in range(limit):
+        if not simulation.tick(Simulation.timestep):
+            return ticks
+
+    raise AssertionError("The components didn't fall asleep.")
+
+
+def test_settled_components_fall_asleep():
+    graph, first, second = two_paths()
+    simulation = started(graph)
+
+    settle(simulation)
+    simulation.apply()
+    settled = positions(first + second)
+
+    assert not simulation.awake.any()
+    assert len(simulation.active) == 0
+
+    # nothing is simulated or published anymore, so the positions stay
+    assert not simulation.tick(100 * Simulation.timestep)
+    assert not simulation.apply()
+    assert positions(first + second) == settled
+
+
+def test_dragging_wakes_only_its_component():
+    graph, first, second = two_paths()
+    simulation = started(graph)
+    settle(simulation)
+    simulation.apply()
+    settled = positions(first + second)
+
+    first[0].start_drag(first[0].get_position())
+    first[0].set_position(first[0].get_position() + Vec2(5, 5))
+    simulation.synchronize(graph)
+    simulation.process_commands()
+
+    assert simulation.awake.tolist() == [True, False]
+
+    simulation.tick(0)
+    assert simulation.tick(Simulation.timestep)
+    assert simulation.apply()
+
+    # the sleeping component kept its positions, the dragged one didn't
+    assert positions(second) == settled[3:]
+    assert positions(first)[1:] != settled[1:3]
+
+    # releasing the node wakes its component up again
+    first[0].stop_drag()
+    settle(simulation)
+    simulation.synchronize(graph)
+    simulation.process_commands()
+
+    assert simulation.awake.tolist() == [True, False]
+
+
+def test_editing_wakes_only_the_changed_component():
+    graph, first, second = two_paths()
+    simulation = started(graph)
+    settle(simulation)
+    simulation.apply()
+
+    graph.add_vertex(second[0], second[2])
+    simulation.synchronize(graph)
+    simulation.process_commands()
+
+    assert simulation.awake.tolist() == [False, True]
+
+    # moving a node (like rotating) wakes its component up too
+    first[1].set_position(Vec2(-10, -10))
+    simulation.move([first[1]])
+    simulation.process_commands()
+
+    assert simulation.awake.tolist() == [True, True]
+    assert simulation.positions[1].tolist() == [-10, -10]
+
+
+def forest(trees: int, size: int) -> DrawableGraph:
+    """Return a graph of the given number of stars of the given size, placed randomly
+    (so the nodes aren't on top of each other)."""
+    random = np.random.default_rng(2)
+    graph = DrawableGraph(selected_changed=lambda: None)
+
+    for _ in range(trees):
+        positions = random.random((size, 2)) * 50
+        nodes = [DrawableNode(position=Vec2(x, y)) for x, y in positions.tolist()]
+
+        for node in nodes:
+            graph.add_node(node)
+
+        for node in nodes[1:]:
+            graph.add_vertex(nodes[0], node)
+
+    return graph
+
+
+def test_chunks_match_a_single_step():
+    simulation = Simulation(ArrayEngine())
+    simulation.processes = 3
+    simulation.parallel_minimum = 0
+    simulation.synchronize(forest(20, 6))
+    simulation.process_commands()
+
+    assert len(simulation.chunks) == 3
+
+    positions = simulation.positions[simulation.active]
+    moving = simulation.moving[simulation.active]
+    state = simulation.state.copy()
+
+    expected = ArrayEngine().simulate(
+        positions, moving, simulation.active_structure, state
+    )
+    initial = simulation.state
+
+    # the chunks are simulated the same way as in the processes of the pool
+    set_chunk_engine(ArrayEngine())
+    chunked = np.empty_like(positions)
+    chunked_state = np.empty_like(state)
+
+    for indexes, structure, components in simulation.chunks:
+        chunked[indexes], chunked_state[components] = simulate_chunk(
+            0, positions[indexes], moving[indexes], structure, initial[components]
+        )
+
+    assert np.abs(chunked - expected).max() < 1e-9
+    assert np.array_equal(chunked_state, state)
+
+
+def test_components_are_kept_apart():
+    simulation = Simulation(ArrayEngine())
+
+    # two stars on top of each other
+    graph = forest(2, 6)
+    for i, node in enumerate(graph.get_nodes()):
+        node.set_position(Vec2(i % 6, i % 2))
+
+    simulation.synchronize(graph)
+    simulation.process_commands()
+    simulation.tick(0)
+
+    for _ in range(200):
+        simulation.tick(Simulation.timestep)
+
+    simulation.apply()
+    nodes = graph.get_nodes()
+
+    # each star is within a disc around its centroid, which don't overlap
+    stars = [nodes[:6], nodes[6:]]
+    centroids = [Vec2.average([n.get_position() for n in star]) for star in stars]
+    radii = [
+        max(n.get_position().distance(centroid) for n in star)
+        for star, centroid in zip(stars, centroids)
+    ]
+
+    assert centroids[0].distance(centroids[1]) > sum(radii)
+
+
+def run(elapsed: List[float], seed: int = 0) -> np.ndarray:
+    """Return the positions of a simulation of a forest after ticks of the given real
+    times (the nodes on top of each other, so they are nudged randomly)."""
+    graph = forest(3, 5)
+    for node in graph.get_nodes()[:4]:
+        node.set_position(Vec2(1, 1))
+
+    simulation = Simulation(ArrayEngine(seed=seed))
+    simulation.synchronize(graph)
+    simulation.process_commands()
+    simulation.tick(0)
+
+    for time in elapsed:
+        simulation.tick(time)
+
+    return simulation.positions
+
+
+def test_simulation_is_deterministic():
+    elapsed = [0.005, 0.02, 0.04, 0.001, 0.017, 0.03] * 5
+
+    assert np.array_equal(run(elapsed), run(elapsed))
+    assert not np.array_equal(run(elapsed), run(elapsed, seed=1))
+
+    # the steps are simulated at a fixed rate, regardless of the ticks
+    assert np.array_equal(
+        run([Simulation.timestep] * 4), run([Simulation.timestep / 2] * 8)
+    )
+
+
+def test_long_stalls_are_clamped():
+    # only max_lag of the stall is caught up on, the rest is dropped
+    assert np.array_equal(run([100.0]), run([Simulation.max_lag]))
+    assert not np.array_equal(run([100.0]), run([Simulation.timestep]))
@@ -0,0 +1,145 @@
+import pytest
+
+from grafatko.snapshot import *
+
+
+def drawable_graph(directed: bool) -> Tuple[DrawableGraph, List[DrawableNode]]:
+    """Return a small drawable graph with positions, colors, weights and a root."""
+    graph = DrawableGraph()
+    graph.set_directed(directed)
+    graph.set_weighted(True)
+
+    nodes = [
+        DrawableNode(label=label, position=Vec2(i, -i * 2.5))
+        for i, label in enumerate(["a", None, "ř", "d"])
+    ]
+
+    for node in nodes:
+        graph.add_node(node)
+
+    graph.add_vertex(nodes[0], nodes[1], weight=3)
+    graph.add_vertex(nodes[2], nodes[1], weight=0.5)
+    graph.add_vertex(nodes[3], nodes[0], weight=-2)
+
+    nodes[0].set_color(Color.red())
+    nodes[2].set_color(Color.blue().lighter(150))
+    nodes[3].set_color(Color(lambda _: QColor()))  # not interned, so not stored
+    graph.get_vertex(nodes[0], nodes[1]).set_color(Color.contrast(Color.green()))
+
+    graph.set_root(nodes[1])
+
+    return graph, nodes
+
+
+def save_and_load(graph: Graph, path, cls: Type[Graph] = DrawableGraph) -> Graph:
+    file = str(path / "graph.grafatko")
+    save_snapshot(graph, file)
+
+    assert is_snapshot(file)
+
+    return load_snapshot(file, cls)
+
+
+def vertex_set(graph: Graph) -> Set[Tuple[str, str, Any]]:
+    return {
+        (v[0].get_label(), v[1].get_label(), v.get_weight())
+        for v in graph.get_vertices()
+    }
+
+
+def test_snapshot_round_trip(tmp_path):
+    for directed in (False, True):
+        graph, nodes = drawable_graph(directed)
+        loaded = save_and_load(graph, tmp_path)
+        loaded_nodes = loaded.get_nodes()
+
+        assert loaded.is_directed() == directed
+        assert loaded.is_weighted()
+        assert [n.get_label() for n in loaded_nodes] == [n.get_label() for n in nodes]
+        assert vertex_set(loaded) == vertex_set(graph)
+        assert loaded.get_root() is loaded_nodes[1]
+
+        for node, loaded_node in zip(nodes, loaded_nodes):
+            assert loaded_node.get_position() == node.get_position()
+
+        assert [type(v.get_weight()) for v in loaded.get_vertices()] == [
+            type(v.get_weight()) for v in graph.get_vertices()
+        ]
+
+
+def test_snapshot_stores_the_colors(tmp_path):
+    graph, nodes = drawable_graph(False)
+    loaded = save_and_load(graph, tmp_path)
+    a, b, c, d = loaded.get_nodes()
+
+    assert a.get_color() is Color.red()
+    assert c.get_color() is Color.blue().lighter(150)
+
+    # the default colors keep sharing the default brush
+    assert b.brush is Paintable.default_brush
+    assert d.brush is Paintable.default_brush
+
+    contrast = Color.contrast(Color.green())
+    assert loaded.get_vertex(a, b).get_color() is contrast
+    assert loaded.get_vertex(b, a).get_color() is contrast
+    assert loaded.get_vertex(c, b).brush is Paintable.default_brush
+
+
+def test_snapshot_of_a_plain_graph(tmp_path):
+    graph = Graph()
+    nodes = [Node(str(i)) for i in range(5)]
+
+    for node in nodes:
+        graph.add_node(node)
+
+    for n1, n2 in zip(nodes, nodes[1:]):
+        graph.add_vertex(n1, n2)
+
+    loaded = save_and_load(graph, tmp_path, Graph)
+
+    assert not loaded.is_directed()
+    assert vertex_set(loaded) == vertex_set(graph)
+    assert len(loaded.get_components()) == 1
+
+    # an empty graph has no arrays at all
+    assert len(save_and_load(Graph(), tmp_path, Graph).get_nodes()) == 0
+
+
+def test_snapshot_loads_a_compact_graph(tmp_path):
+    for directed in (False, True):
+        graph, nodes = drawable_graph(directed)
+        compact = save_and_load(graph, tmp_path, CompactGraph)
+
+        assert compact.is_directed() == directed
+        assert compact.is_weighted()
+        assert [compact.get_label(i) for i in compact.get_nodes()] == [
+            n.get_label() for n in nodes
+        ]
+        assert compact.get_weight(0, 1) == 3
+        assert compact.get_weight(2, 1) == 0.5
+        assert compact.get_weight(1, 2) == (None if directed else 0.5)
+        assert compact.get_position(2) == nodes[2].get_position()
+        assert compact.get_color(0) is Color.red()
+        assert compact.get_color(1) is None
+        assert compact.get_vertex_color(0, 1) is Color.contrast(Color.green())
+
+
+def test_snapshot_rejects_inexact_weights(tmp_path):
+    for weight in ("heavy", 2 ** 53 + 1):
+        graph = Graph()
+        nodes = [Node(), Node()]
+
+        for node in nodes:
+            graph.add_node(node)
+
+        graph.add_vertex(nodes[0], nodes[1], weight)
+
+        with pytest.raises(ValueError):
+            save_snapshot(graph, str(tmp_path / "graph.grafatko"))
+
+
+def test_snapshot_rejects_other_files(tmp_path):
+    file = tmp_path / "graph.txt"
+    file.write_text("a b\n")
+
+    assert not is_snapshot(str(file))
@@ -0,0 +1,68 @@
+from math import pi, isclose
+
+import pytest
+
+from grafatko.utilities import *
+
+
+def test_vector_arithmetic():
+    u, v = Vec2(1, 2), Vec2(3, -4)
+
+    assert u + v == Vec2(4, -2)
+    assert u - v == Vec2(-2, 6)
+    assert -u == Vec2(-1, -2)
+    assert v / 2 == Vec2(1.5, -2)
+    assert v // 2 == Vec2(1, -2)
+
+    # the operands stay the same
+    assert u == Vec2(1, 2) and v == Vec2(3, -4)
+
+
+def test_vector_in_place_operators_modify_it():
+    u = Vec2(1, 2)
+    w = u
+
+    u += Vec2(1, 1)
+    u -= Vec2(0, 2)
+    u *= 3
+    u /= 2
+
+    assert u is w
+    assert u == Vec2(3, 1.5)
+
+
+def test_vector_multiplication():
+    u, v = Vec2(1, 2), Vec2(3, -4)
+
+    # vectors give the dot product, numbers scale the vector (from both sides)
+    assert u * v == -5
+    assert u * 2 == Vec2(2, 4)
+    assert 2.5 * u == Vec2(2.5, 5)
+
+
+def test_vector_length_and_unit():
+    v = Vec2(3, -4)
+
+    assert v.magnitude() == 5
+    assert v.unit() == Vec2(0.6, -0.8)
+    assert Vec2(1, 1).distance(Vec2(4, 5)) == 5
+
+    assert len(v) == 2
+    assert list(v) == [3, -4]
+    assert (v[0], v[-1]) == (3, -4)
+
+
+def test_vector_rotation():
+    v = Vec2(1, 0).rotated(pi / 2, Vec2(1, 1))
+
+    assert isclose(v.x, 2) and isclose(v.y, 1)
+
+
+def test_vector_index_out_of_range():
+    with pytest.raises(IndexError):
+        Vec2()[2] = 1
+
+
+def test_vector_is_the_previous_name():
+    assert Vector is Vec2
+    assert Vector(1, 2) + Vector(3, 4) == Vec2(4, 6)